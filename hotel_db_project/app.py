@@ -1,21 +1,600 @@
 # app.py — updated with centered windows, improved booking wizard, combobox for type_id,
 # delete room/client, auto show available rooms and immediate guest selection.
+import bisect
+import gzip
+import json
+import os
+import queue
+import select
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 import psycopg2
-from psycopg2 import errors
+from psycopg2 import errors, extensions
 
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 from datetime import datetime, timedelta, date
 
+import importer
+import migrate
+import querylog
+from statements import (CLIENT_SEARCH, CLIENT_SEARCH_LIMIT, GRID_PAGE_SIZE, GRIDS, STATEMENTS, grid_statements,
+                        search_params)
+
 WEEKEND_MULTIPLIER = 1.0
 
-def safe_next_id(conn, table, idcol):
-    cur = conn.cursor()
-    cur.execute(f"SELECT MAX({idcol}) FROM {table}")
-    r = cur.fetchone()
-    cur.close()
-    mx = r[0] if r and r[0] is not None else 0
-    return int(mx) + 1
+# размеры пула соединений и параметры проверки соединения при выдаче
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 6
+POOL_CHECKOUT_TIMEOUT = 10.0   # сек ожидания свободного соединения
+POOL_PING_AFTER_IDLE = 30.0    # сек простоя, после которых соединение пингуется перед выдачей
+
+QUERY_WORKERS = 3              # фоновых потоков для запросов на чтение
+QUERY_POLL_MS = 30             # период проверки готовых результатов из потока Tk
+
+INPUT_SETTLE_MS = 300          # пауза после последнего изменения ввода, после которой идёт запрос
+INPUT_RESULT_TTL = 30.0        # сек, в течение которых ответ на тот же ввод берётся из памяти
+
+NOTIFY_CHANNEL = "hotel_changes"   # канал, в который триггеры шлют изменения строк
+LISTEN_POLL_MS = 250           # как часто интерфейс забирает пришедшие уведомления
+LISTEN_RECONNECT_DELAY = 5.0   # сек между попытками восстановить слушающее соединение
+
+DIAGNOSTICS_REFRESH_MS = 2000  # период обновления окна «Диагностика запросов»
+
+STATUS_ROLLOVER_DELAY = 60     # сек после полуночи, когда обновляется снимок Room.status
+
+# ----------------- Data access -----------------
+class PoolError(Exception):
+    pass
+
+class ConnectionPool:
+    """Thread-safe pool of autocommit connections shared by all windows.
+
+    Connections idle for longer than POOL_PING_AFTER_IDLE are pinged on checkout
+    and transparently replaced if the server dropped them.
+    """
+    def __init__(self, conn_params, minconn=POOL_MIN_SIZE, maxconn=POOL_MAX_SIZE, conn=None):
+        self.conn_params = dict(conn_params)
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self._idle = []          # [(conn, last_used)]
+        self._used = set()
+        self._closed = False
+        self._cond = threading.Condition()
+        if conn is not None and not conn.closed:
+            # уже проверенное при логине соединение — не переподключаемся
+            conn.autocommit = True
+            self._idle.append((conn, time.monotonic()))
+        while len(self._idle) < self.minconn:
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=querylog.InstrumentedConnection, **self.conn_params)
+        conn.autocommit = True
+        return conn
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - last_used < POOL_PING_AFTER_IDLE:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        deadline = time.monotonic() + POOL_CHECKOUT_TIMEOUT
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("Пул соединений закрыт")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if len(self._used) < self.maxconn:
+                    conn, last_used = None, None
+                    break
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    raise PoolError("Нет свободных соединений с БД")
+                self._cond.wait(left)
+            # резервируем слот, проверку/подключение делаем без блокировки
+            slot = object()
+            self._used.add(slot)
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._used.discard(slot)
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._used.discard(slot)
+            self._used.add(conn)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                conn.autocommit = True
+            except psycopg2.Error:
+                discard = True
+        with self._cond:
+            self._used.discard(conn)
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as ex:
+            # отменённый запрос соединение не портит
+            broken = not isinstance(ex, extensions.QueryCanceledError)
+            raise
+        finally:
+            self.putconn(conn, discard=broken)
+
+    @contextmanager
+    def cursor(self):
+        with self.connection() as conn:
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    @contextmanager
+    def transaction(self):
+        """Cursor running inside a single transaction: commit on success, rollback on error."""
+        with self.connection() as conn:
+            conn.autocommit = False
+            cur = conn.cursor()
+            try:
+                yield cur
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+    def delete_many(self, table, key, ids):
+        """Delete every row whose key is in ids with one statement in one transaction; returns the count."""
+        with self.transaction() as cur:
+            # зависимые строки удаляются каскадом по внешним ключам
+            cur.execute(f"DELETE FROM {table} WHERE {key} = ANY(%s)", (list(ids),))
+            return cur.rowcount
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+class QueryTask:
+    """Handle of a query submitted to QueryExecutor; cancel() aborts it on the server."""
+    def __init__(self, fn, on_done=None, on_error=None, owner=None, screen=None):
+        self.fn = fn
+        self.on_done = on_done
+        self.on_error = on_error
+        self.owner = owner
+        self.screen = screen or querylog.screen_of(fn)
+        self.cancelled = False
+        self.done = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _attach(self, conn):
+        with self._lock:
+            if conn is not None and self.cancelled:
+                return False
+            self._conn = conn
+            return True
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled or self.done:
+                return
+            self.cancelled = True
+            # под блокировкой: соединение не успеет вернуться в пул и уйти другому запросу
+            if self._conn is not None:
+                try:
+                    self._conn.cancel()
+                except Exception:
+                    pass
+
+class QueryExecutor:
+    """Runs read queries on worker threads and hands the results back to the Tk thread.
+
+    fn(cur) is executed on a pooled connection; on_done(result) / on_error(exc) are
+    called from the Tk event loop. Tasks submitted with an owner widget are cancelled
+    when the owner (or one of its parents, via cancel_within) goes away. Statements run
+    by fn are attributed in querylog to screen (by default the name of fn).
+    """
+    def __init__(self, root, db, workers=QUERY_WORKERS):
+        self.root = root
+        self.db = db
+        self._workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query")
+        self._results = queue.Queue()
+        self._tasks = set()
+        self._watched = set()
+        self._after = None
+        self._closed = False
+
+    def submit(self, fn, on_done=None, on_error=None, owner=None, screen=None):
+        task = QueryTask(fn, on_done, on_error, owner, screen)
+        if self._closed:
+            task.cancelled = True
+            return task
+        if owner is not None:
+            self._watch(owner)
+        self._tasks.add(task)
+        self._workers.submit(self._run, task)
+        if self._after is None:
+            self._after = self.root.after(QUERY_POLL_MS, self._poll)
+        return task
+
+    def _run(self, task):
+        result = error = None
+        if not task.cancelled:
+            try:
+                with self.db.connection() as conn:
+                    if task._attach(conn):
+                        cur = conn.cursor()
+                        try:
+                            with querylog.screen(task.screen):
+                                result = task.fn(cur)
+                        finally:
+                            task._attach(None)
+                            cur.close()
+            except Exception as e:
+                error = e
+        self._results.put((task, result, error))
+
+    def _poll(self):
+        self._after = None
+        try:
+            while True:
+                try:
+                    task, result, error = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                self._tasks.discard(task)
+                task.done = True
+                if task.cancelled or self._closed:
+                    continue
+                if task.owner is not None and not task.owner.winfo_exists():
+                    continue
+                if error is None:
+                    if task.on_done:
+                        task.on_done(result)
+                elif task.on_error:
+                    task.on_error(error)
+                else:
+                    messagebox.showerror("Ошибка БД", str(error))
+        finally:
+            if self._tasks and not self._closed and self._after is None:
+                try:
+                    self._after = self.root.after(QUERY_POLL_MS, self._poll)
+                except tk.TclError:
+                    pass
+
+    def _watch(self, owner):
+        path = str(owner)
+        if path in self._watched:
+            return
+        self._watched.add(path)
+        owner.bind("<Destroy>", lambda e, p=path: self._on_destroy(e, p), add="+")
+
+    def _on_destroy(self, event, path):
+        # <Destroy> приходит и от дочерних виджетов — реагируем только на сам owner
+        if str(event.widget) != path:
+            return
+        self._watched.discard(path)
+        self.cancel_within(path)
+
+    def cancel_within(self, widget):
+        """Cancel every pending task owned by widget or any of its descendants."""
+        prefix = str(widget)
+        for task in list(self._tasks):
+            path = str(task.owner) if task.owner is not None else ""
+            if path == prefix or path.startswith(prefix + "."):
+                task.cancel()
+
+    def shutdown(self):
+        self._closed = True
+        for task in list(self._tasks):
+            task.cancel()
+        self._workers.shutdown(wait=False)
+
+class DebouncedQuery:
+    """Query driven by user input (variable traces, key presses) that waits for it to settle.
+
+    key_fn() turns the current input into the query key, None meaning the input is not
+    complete yet (on_invalid() is called instead of a query). trigger() restarts the
+    settle timer, run_now() evaluates the input at once. A request for the key already in
+    flight is coalesced, a superseded one is cancelled, and the last result is handed out
+    again while its key has not changed and it is younger than max_age. local(key) may
+    answer without the database; returning None falls back to fetch(cur, key).
+    """
+    def __init__(self, widget, executor, key_fn, fetch, on_done, on_error=None, on_invalid=None,
+                 local=None, delay=INPUT_SETTLE_MS, max_age=INPUT_RESULT_TTL, screen=None):
+        self.widget = widget
+        self.executor = executor
+        self.key_fn = key_fn
+        self.fetch = fetch
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_invalid = on_invalid
+        self.local = local
+        self.delay = delay
+        self.max_age = max_age
+        self.screen = screen or querylog.screen_of(fetch)
+        self._job = None
+        self._task = None
+        self._task_key = None
+        self._cached = None    # (key, result, monotonic time)
+
+    def trigger(self, *_):
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+        self._job = self.widget.after(self.delay, self.run_now)
+
+    def run_now(self):
+        self._cancel_job()
+        key = self.key_fn()
+        if key is None:
+            self._cancel_task()
+            if self.on_invalid:
+                self.on_invalid()
+            return
+        if self._task is not None:
+            if key == self._task_key:
+                return
+            self._cancel_task()
+        if self._cached is not None:
+            ckey, result, at = self._cached
+            if ckey == key and time.monotonic() - at < self.max_age:
+                self.on_done(result)
+                return
+        if self.local is not None:
+            result = self.local(key)
+            if result is not None:
+                self.on_done(result)
+                return
+        self._task_key = key
+        self._task = self.executor.submit(lambda cur: self.fetch(cur, key),
+                                          lambda result: self._done(key, result),
+                                          self._failed, owner=self.widget, screen=self.screen)
+
+    def invalidate(self):
+        """Forget the cached result: the data behind it has changed."""
+        self._cached = None
+
+    def cancel(self):
+        self._cancel_job()
+        self._cancel_task()
+
+    def _done(self, key, result):
+        self._task = self._task_key = None
+        self._cached = (key, result, time.monotonic())
+        self.on_done(result)
+
+    def _failed(self, exc):
+        self._task = self._task_key = None
+        if self.on_error:
+            self.on_error(exc)
+        else:
+            messagebox.showerror("Ошибка БД", str(exc))
+
+    def _cancel_job(self):
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+
+    def _cancel_task(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = self._task_key = None
+
+class ChangeListener:
+    """LISTENs for row-change notifications on its own connection.
+
+    Triggers send {"table", "op", "id"} payloads to NOTIFY_CHANNEL; a background
+    thread collects them and on_changes(list_of_payloads) is called in batches on
+    the Tk thread. The connection is re-established if the server drops it.
+    Notifications sent while no LISTEN is active are lost, so on_resync() is called
+    on the Tk thread after every successful LISTEN, the first one included.
+    """
+    def __init__(self, root, conn_params, on_changes, channel=NOTIFY_CHANNEL, on_resync=None):
+        self.root = root
+        self.conn_params = dict(conn_params)
+        self.on_changes = on_changes
+        self.on_resync = on_resync
+        self.channel = channel
+        self._inbox = queue.Queue()
+        self._stop = threading.Event()
+        self._resync = threading.Event()
+        self._conn = None
+        self._thread = threading.Thread(target=self._listen, name="listen", daemon=True)
+        self._thread.start()
+        self._after = self.root.after(LISTEN_POLL_MS, self._deliver)
+
+    def _open(self):
+        conn = psycopg2.connect(**self.conn_params)
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute(f"LISTEN {self.channel}")
+        cur.close()
+        return conn
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                self._conn = self._open()
+                self._resync.set()
+                while not self._stop.is_set():
+                    if select.select([self._conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    self._conn.poll()
+                    while self._conn.notifies:
+                        n = self._conn.notifies.pop(0)
+                        try:
+                            self._inbox.put(json.loads(n.payload))
+                        except ValueError:
+                            pass
+            except Exception:
+                # соединение потеряно — пробуем снова после паузы
+                self._stop.wait(LISTEN_RECONNECT_DELAY)
+            finally:
+                if self._conn is not None:
+                    try:
+                        self._conn.close()
+                    except Exception:
+                        pass
+                    self._conn = None
+
+    def _deliver(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._inbox.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            if batch:
+                self.on_changes(batch)
+            # после (пере)подключения уведомления могли потеряться — всё перечитывается
+            if self._resync.is_set():
+                self._resync.clear()
+                if self.on_resync:
+                    self.on_resync()
+        finally:
+            if not self._stop.is_set():
+                self._after = self.root.after(LISTEN_POLL_MS, self._deliver)
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.root.after_cancel(self._after)
+        except Exception:
+            pass
+
+class RefCache:
+    """In-process copy of the small reference tables RoomType and Service.
+
+    Every table carries a version; invalidate() bumps it (after a local write or a
+    change notification) and the next read reloads the table. Safe to read from
+    executor workers, passing their cursor.
+    """
+    QUERIES = {
+        "roomtype": "SELECT type_id, name, price, capacity FROM RoomType ORDER BY type_id",
+        "service": "SELECT service_id, name, price, description FROM Service ORDER BY service_id",
+    }
+
+    def __init__(self, db):
+        self.db = db
+        self.versions = dict.fromkeys(self.QUERIES, 0)
+        self._data = {}          # table -> (version, rows, {key: row})
+        self._lock = threading.Lock()
+
+    def invalidate(self, table):
+        with self._lock:
+            if table in self.versions:
+                self.versions[table] += 1
+
+    def _get(self, table, cur=None):
+        with self._lock:
+            version = self.versions[table]
+            cached = self._data.get(table)
+        if cached is not None and cached[0] == version:
+            return cached
+        if cur is None:
+            with self.db.cursor() as c:
+                c.execute(self.QUERIES[table])
+                rows = c.fetchall()
+        else:
+            cur.execute(self.QUERIES[table])
+            rows = cur.fetchall()
+        cached = (version, rows, {r[0]: r for r in rows})
+        with self._lock:
+            # пока читали, таблицу могли снова инвалидировать — такую копию не запоминаем
+            if self.versions[table] == version:
+                self._data[table] = cached
+        return cached
+
+    def rows(self, table, cur=None):
+        return self._get(table, cur)[1]
+
+    def index(self, table, cur=None, expect=()):
+        idx = self._get(table, cur)[2]
+        if any(k not in idx for k in expect):
+            # ссылка на строку, которой нет в копии — справочник изменился, перечитываем
+            self.invalidate(table)
+            idx = self._get(table, cur)[2]
+        return idx
+
+def search_clients(cur, text, limit=CLIENT_SEARCH_LIMIT):
+    """Top matches for a type-ahead box: passport prefix for digits, otherwise names by trigram similarity."""
+    kind, params = search_params(text, limit)
+    cur.execute(CLIENT_SEARCH[kind], params)
+    return cur.fetchall()
+
+def copy_to_csv(cur, sql, params, path):
+    """Stream COPY (sql) TO STDOUT as CSV with a header into path, gzipped if path ends with .gz."""
+    opener = gzip.open if path.lower().endswith(".gz") else open
+    # строки идут из сокета в файл порциями — память не растёт с размером отчёта
+    try:
+        with opener(path, "wt", encoding="utf-8", newline="") as f:
+            cur.copy_expert(cur.mogrify(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", params).decode(), f)
+    except BaseException:
+        # отменённая или упавшая выгрузка не оставляет обрезанный файл
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+
+def export_report(parent, executor, sql, params, name):
+    """Ask for a file and export the query there in the background (owner = parent)."""
+    path = filedialog.asksaveasfilename(parent=parent, initialfile=f"{name}.csv", defaultextension=".csv",
+                                        filetypes=[("CSV", "*.csv"), ("CSV, gzip", "*.csv.gz")])
+    if not path:
+        return None
+    return executor.submit(lambda cur: copy_to_csv(cur, sql, params, path),
+                           lambda _: messagebox.showinfo("Экспорт", f"Сохранено: {path}", parent=parent),
+                           lambda e: messagebox.showerror("Ошибка", str(e), parent=parent),
+                           owner=parent)
 
 def format_money(x):
     try:
@@ -63,6 +642,356 @@ def center_window(win, parent=None):
     except:
         pass
 
+# ----------------- Availability index -----------------
+class AvailabilityIndex:
+    """In-memory per-room index of booked [start, end) ranges.
+
+    Loaded in the background and kept current from change notifications; load() is
+    repeated whenever notifications may have been missed, and until it finishes
+    (ready is False) callers ask the database instead. Bookings of one room never overlap, so each room keeps its ranges sorted by
+    start and "is the room free for [start, end)" is a single bisect.
+    """
+    def __init__(self, executor):
+        self.executor = executor
+        self.ready = False
+        self.rooms = {}          # room_id -> (room_number, type_id)
+        self._starts = {}        # room_id -> [start, ...] по возрастанию
+        self._ranges = {}        # room_id -> [(start, end, booking_id), ...] в том же порядке
+        self._bookings = {}      # booking_id -> (room_id, start, end)
+        self._pending_rooms = set()
+        self._pending_bookings = set()
+        self._subscribers = []   # вызываются, когда известно об изменении броней
+        self._gen = 0            # номер загрузки; ответы на запросы прошлых загрузок отбрасываются
+
+    def load(self):
+        """(Re)read all rooms and bookings; until that finishes the index is not ready."""
+        def fetch(cur):
+            cur.execute("SELECT room_id, room_number, type_id FROM Room")
+            rooms = cur.fetchall()
+            cur.execute("SELECT booking_id, room_id, start_date, end_date FROM Booking")
+            return rooms, cur.fetchall()
+        self._gen += 1
+        gen = self._gen
+        self.ready = False
+        # не загрузился — окна продолжают спрашивать БД
+        self.executor.submit(fetch, lambda data: self._on_load(gen, data), lambda e: None)
+
+    def _on_load(self, gen, data):
+        if gen != self._gen:
+            return
+        rooms, bookings = data
+        self.rooms = {rid: (num, tid) for rid, num, tid in rooms}
+        self._starts, self._ranges, self._bookings = {}, {}, {}
+        for bid, rid, s, e in bookings:
+            self._add(bid, rid, s, e)
+        self.ready = True
+        self._notify()
+        # изменения, пришедшие во время загрузки
+        rooms_ids, self._pending_rooms = self._pending_rooms, set()
+        booking_ids, self._pending_bookings = self._pending_bookings, set()
+        self.refresh_rooms(rooms_ids)
+        self.refresh_bookings(booking_ids)
+
+    def _add(self, bid, rid, s, e):
+        starts = self._starts.setdefault(rid, [])
+        ranges = self._ranges.setdefault(rid, [])
+        i = bisect.bisect_right(starts, s)
+        starts.insert(i, s)
+        ranges.insert(i, (s, e, bid))
+        self._bookings[bid] = (rid, s, e)
+
+    def _remove(self, bid):
+        info = self._bookings.pop(bid, None)
+        if info is None:
+            return
+        rid, s, _ = info
+        starts, ranges = self._starts[rid], self._ranges[rid]
+        i = bisect.bisect_left(starts, s)
+        while i < len(ranges) and ranges[i][2] != bid:
+            i += 1
+        if i < len(ranges):
+            del starts[i]
+            del ranges[i]
+
+    def is_free(self, rid, start, end):
+        starts = self._starts.get(rid)
+        if not starts:
+            return True
+        # последняя бронь, начавшаяся до конца периода, — у неё и самый поздний выезд
+        i = bisect.bisect_left(starts, end) - 1
+        return i < 0 or self._ranges[rid][i][1] <= start
+
+    def subscribe(self, fn):
+        """Call fn() whenever bookings change, so cached availability answers can be dropped."""
+        self._subscribers.append(fn)
+
+    def unsubscribe(self, fn):
+        if fn in self._subscribers:
+            self._subscribers.remove(fn)
+
+    def _notify(self):
+        for fn in list(self._subscribers):
+            fn()
+
+    def free_rooms(self, start, end):
+        """[(room_id, room_number, type_id)] of rooms with no booking overlapping [start, end)."""
+        return [(rid,) + self.rooms[rid] for rid in sorted(self.rooms) if self.is_free(rid, start, end)]
+
+    def refresh_bookings(self, ids, on_rooms=None):
+        """Re-read changed bookings; on_rooms(room_ids) gets the rooms they were or are in."""
+        ids = set(ids)
+        if not ids:
+            return
+        # ответы, посчитанные до изменения, больше не верны — даже пока индекс перечитывается
+        self._notify()
+        if not self.ready:
+            self._pending_bookings |= ids
+            return
+
+        def fetch(cur):
+            cur.execute("SELECT booking_id, room_id, start_date, end_date FROM Booking WHERE booking_id = ANY(%s)",
+                        (list(ids),))
+            return cur.fetchall()
+        gen = self._gen
+
+        def apply(rows):
+            if gen != self._gen:
+                return      # индекс перечитан целиком уже после этого запроса
+            rooms = {self._bookings[bid][0] for bid in ids if bid in self._bookings}
+            for bid in ids:
+                self._remove(bid)
+            for bid, rid, s, e in rows:
+                self._add(bid, rid, s, e)
+                rooms.add(rid)
+            if on_rooms and rooms:
+                on_rooms(rooms)
+            self._notify()
+        self.executor.submit(fetch, apply, lambda e: None)
+
+    def refresh_rooms(self, ids):
+        ids = set(ids)
+        if not ids:
+            return
+        if not self.ready:
+            self._pending_rooms |= ids
+            return
+
+        def fetch(cur):
+            cur.execute("SELECT room_id, room_number, type_id FROM Room WHERE room_id = ANY(%s)", (list(ids),))
+            return cur.fetchall()
+        gen = self._gen
+
+        def apply(rows):
+            if gen != self._gen:
+                return
+            for rid in ids:
+                self.rooms.pop(rid, None)
+            for rid, num, tid in rows:
+                self.rooms[rid] = (num, tid)
+        self.executor.submit(fetch, apply, lambda e: None)
+
+# ----------------- Paged grid -----------------
+def reconcile_tree(tree, rows):
+    """Make a flat Treeview show rows (first value = key = iid) with minimal changes.
+
+    Only rows that appeared, disappeared, changed or moved are touched, so selection
+    and scroll position survive a refresh.
+    """
+    wanted = [str(r[0]) for r in rows]
+    keep = set(wanted)
+    stale = [iid for iid in tree.get_children() if iid not in keep]
+    if stale:
+        tree.delete(*stale)
+    current = tree.get_children()
+    present = set(current)
+    # порядок уже показанных строк не изменился — двигать ничего не нужно
+    in_order = [iid for iid in wanted if iid in present] == list(current)
+    for idx, (iid, r) in enumerate(zip(wanted, rows)):
+        if iid not in present:
+            tree.insert("", idx, iid=iid, values=r)
+            continue
+        if tuple(str(v) for v in tree.item(iid, "values")) != tuple(str(v) for v in r):
+            tree.item(iid, values=r)
+        if not in_order:
+            tree.move(iid, "", idx)
+
+class KeysetGrid(ttk.Frame):
+    """Treeview that pulls its rows from the database page by page as the user scrolls.
+
+    Pages are fetched by keyset (WHERE key > last ORDER BY key LIMIT n), so opening
+    or scrolling the grid costs the same regardless of table size. The first value
+    of every row is the key and is also used as the item iid. Pages are loaded on
+    the executor's worker threads, so a slow page never freezes the window.
+    row_fn(cur, rows), if given, turns fetched rows into displayed rows on the worker.
+    With a name, the grid's queries are registered in STATEMENTS as name_first,
+    name_next, ... and run as prepared statements.
+    """
+    def __init__(self, parent, executor, columns, select_sql, key, widths=None, page_size=GRID_PAGE_SIZE, height=18,
+                 row_fn=None, name=None):
+        super().__init__(parent)
+        self.executor = executor
+        self.row_fn = row_fn
+        self.select_sql = select_sql
+        self.key = key
+        self.name = name
+        self._sql = grid_statements(select_sql, key)
+        if name:
+            for kind, sql in self._sql.items():
+                STATEMENTS.add(f"{name}_{kind}", sql)
+        self.page_size = page_size
+        self.last_key = None
+        self.exhausted = False
+        self._pending = False
+        self._task = None
+        self._gen = 0            # номер перезагрузки: страницы от прежних reload() отбрасываются
+        self.keys = []           # ключи показанных строк по возрастанию
+        widths = widths or {}
+        tree = ttk.Treeview(self, columns=columns, show="headings", height=height)
+        for c in columns:
+            tree.heading(c, text=c)
+            tree.column(c, width=widths.get(c, 110), anchor="center")
+        self.vsb = ttk.Scrollbar(self, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=self._on_yscroll)
+        tree.pack(side="left", fill="both", expand=True)
+        self.vsb.pack(side="left", fill="y")
+        self.tree = tree
+
+    def _page_query(self):
+        if self.last_key is None:
+            return "first", (self.page_size,)
+        return "next", (self.last_key, self.page_size)
+
+    def _screen(self, action):
+        # в журнале запросов — какая именно таблица, а не общий KeysetGrid
+        return f"{self.name or type(self).__name__}.{action}"
+
+    def _fetch(self, cur, kind, params):
+        if self.name:
+            STATEMENTS.execute(cur, f"{self.name}_{kind}", params)
+        else:
+            cur.execute(self._sql[kind], params)
+        rows = cur.fetchall()
+        return self.row_fn(cur, rows) if self.row_fn else rows
+
+    def _on_yscroll(self, first, last):
+        self.vsb.set(first, last)
+        # долистали почти до конца — подгружаем следующую страницу
+        if float(last) >= 0.9 and not self.exhausted and not self._pending:
+            self._pending = True
+            self.after_idle(self.load_more)
+
+    def load_more(self):
+        self._pending = False
+        if self.exhausted or not self.executor:
+            return
+        if self._task is not None and not self._task.cancelled:
+            return  # страница уже грузится
+        kind, params = self._page_query()
+
+        def fetch(cur):
+            return self._fetch(cur, kind, params)
+        gen = self._gen
+        self._task = self.executor.submit(fetch, lambda rows: self._on_page(gen, rows),
+                                          self._on_error, owner=self, screen=self._screen("load_more"))
+
+    def _on_page(self, gen, rows):
+        if gen != self._gen:
+            return
+        self._task = None
+        for r in rows:
+            self._put_row(r)
+        if rows:
+            self.last_key = rows[-1][0]
+        if len(rows) < self.page_size:
+            self.exhausted = True
+
+    def _on_error(self, e):
+        self._task = None
+        messagebox.showerror("Ошибка БД", str(e))
+
+    def _put_row(self, r):
+        iid = str(r[0])
+        if self.tree.exists(iid):
+            self.tree.item(iid, values=r)
+            return
+        pos = bisect.bisect_left(self.keys, r[0])
+        self.keys.insert(pos, r[0])
+        self.tree.insert("", pos, iid=iid, values=r)
+
+    def _drop_row(self, key):
+        iid = str(key)
+        if self.tree.exists(iid):
+            self.tree.delete(iid)
+            pos = bisect.bisect_left(self.keys, key)
+            if pos < len(self.keys) and self.keys[pos] == key:
+                del self.keys[pos]
+
+    def patch(self, keys):
+        """Re-read only the given rows: update, insert or remove them in place."""
+        if not self.executor:
+            return
+        # строки дальше загруженной страницы подтянутся обычной подгрузкой
+        keys = sorted({k for k in keys if self.exhausted or (self.last_key is not None and k <= self.last_key)})
+        if not keys:
+            return
+
+        def fetch(cur):
+            return self._fetch(cur, "keys", (keys,))
+        gen = self._gen
+        # без owner: скрытая вкладка тоже должна получить изменения
+        # ошибку фонового обновления не показываем: Refresh всё равно перечитает таблицу
+        self.executor.submit(fetch, lambda rows: self._on_patch(gen, keys, rows),
+                             lambda e: None, screen=self._screen("patch"))
+
+    def _on_patch(self, gen, keys, rows):
+        if gen != self._gen or not self.winfo_exists():
+            return
+        found = {r[0]: r for r in rows}
+        for k in keys:
+            if k in found:
+                self._put_row(found[k])
+            else:
+                self._drop_row(k)
+
+    def reload(self):
+        """Re-read the rows already shown and reconcile them in place."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._gen += 1
+        if self.last_key is None:
+            self.tree.delete(*self.tree.get_children())
+            self.keys = []
+            self.exhausted = False
+            self.load_more()
+            return
+        if self.exhausted:
+            # дочитали до конца — заодно подхватываем строки, добавленные после
+            kind, params = "all", ()
+        else:
+            kind, params = "upto", (self.last_key,)
+
+        def fetch(cur):
+            return self._fetch(cur, kind, params)
+        gen = self._gen
+        self._task = self.executor.submit(fetch, lambda rows: self._on_reload(gen, rows),
+                                          self._on_error, owner=self, screen=self._screen("reload"))
+
+    def _on_reload(self, gen, rows):
+        if gen != self._gen:
+            return
+        self._task = None
+        reconcile_tree(self.tree, rows)
+        self.keys = [r[0] for r in rows]
+        if self.exhausted:
+            self.last_key = rows[-1][0] if rows else None
+
+    def resume(self):
+        """Re-request a page whose load was cancelled (e.g. when the tab was hidden)."""
+        if self._task is not None and self._task.cancelled:
+            self._task = None
+            self.load_more()
+
 # ----------------- Login Dialog -----------------
 class LoginDialog(tk.Toplevel):
     def __init__(self, parent):
@@ -97,6 +1026,7 @@ class LoginDialog(tk.Toplevel):
         ttk.Button(btn_frame, text="Cancel", command=self.on_cancel).pack(side="left", padx=6)
 
         self.result = None
+        self.conn = None
         self.protocol("WM_DELETE_WINDOW", self.on_cancel)
         self.geometry("460x260")
         self.minsize(420, 240)
@@ -107,9 +1037,11 @@ class LoginDialog(tk.Toplevel):
         params = {k: v.get().strip() for k,v in self.vars.items()}
         try:
             conn = psycopg2.connect(host=params['host'], port=params['port'],
-                                    dbname=params['dbname'], user=params['user'], password=params['password'])
+                                    dbname=params['dbname'], user=params['user'], password=params['password'],
+                                    connection_factory=querylog.InstrumentedConnection)
             conn.autocommit = True
-            conn.close()
+            # соединение не закрываем — оно станет первым в пуле приложения
+            self.conn = conn
             self.result = params
             self.destroy()
         except Exception as e:
@@ -121,20 +1053,21 @@ class LoginDialog(tk.Toplevel):
 
 # ----------------- Guest View -----------------
 class GuestView(tk.Toplevel):
-    def __init__(self, parent, conn_params):
+    def __init__(self, parent, conn_params, conn=None):
         super().__init__(parent)
         self.title("Guest — свободные номера")
         self.geometry("800x500")
         self.transient(parent)
         self.conn_params = conn_params
-        self.conn = None
+        self.db = None
         try:
-            self.conn = psycopg2.connect(**conn_params)
-            self.conn.autocommit = True
+            self.db = ConnectionPool(conn_params, minconn=1, maxconn=2, conn=conn)
         except Exception as e:
             messagebox.showerror("DB", f"Не удалось подключиться: {e}")
             self.destroy()
             return
+        self.executor = QueryExecutor(self, self.db, workers=1)
+        self._avail_task = None
 
         top = ttk.Frame(self, padding=10)
         top.pack(fill="x")
@@ -167,46 +1100,41 @@ class GuestView(tk.Toplevel):
             messagebox.showerror("Ошибка", "Введена неверная дата, формат YYYY-MM-DD")
             return
 
-        cur = self.conn.cursor()
+        # свободные на сутки [dt, dt+1)
         q = """
-            SELECT r.room_id, r.room_number, rt.name, rt.price, rt.capacity, r.status
-            FROM Room r
-            JOIN RoomType rt ON r.type_id = rt.type_id
-            WHERE r.room_id NOT IN (
-                SELECT room_id FROM Booking WHERE start_date <= %s AND end_date > %s
-            )
-            ORDER BY r.room_id;
+            SELECT room_id, room_number, type_name, price, capacity, status
+            FROM find_available_rooms(%s, %s, 1);
         """
-        try:
-            cur.execute(q, (dt, dt))
-            rows = cur.fetchall()
-            cur.close()
-        except errors.InsufficientPrivilege:
-            # у гостя нет доступа к таблице Booking — показываем все номера (без фильтрации по броням)
-            cur.close()
-            cur = self.conn.cursor()
-            cur.execute("""
-                SELECT r.room_id, r.room_number, rt.name, rt.price, rt.capacity, r.status
-                FROM Room r JOIN RoomType rt ON r.type_id = rt.type_id
-                ORDER BY r.room_id;
-            """)
-            rows = cur.fetchall()
-            cur.close()
+
+        def fetch(cur):
+            try:
+                cur.execute(q, (dt, dt + timedelta(days=1)))
+                return cur.fetchall(), False
+            except errors.InsufficientPrivilege:
+                # у гостя нет доступа к таблице Booking — показываем все номера (без фильтрации по броням)
+                cur.execute("""
+                    SELECT r.room_id, r.room_number, rt.name, rt.price, rt.capacity, r.status
+                    FROM room_occupancy r JOIN RoomType rt ON r.type_id = rt.type_id
+                    ORDER BY r.room_id;
+                """)
+                return cur.fetchall(), True
+        # новая дата — предыдущий запрос больше не нужен
+        if self._avail_task is not None:
+            self._avail_task.cancel()
+        self._avail_task = self.executor.submit(fetch, self._fill_available, owner=self)
+
+    def _fill_available(self, result):
+        rows, limited = result
+        if limited:
             messagebox.showwarning("Ограниченные права",
                                    "У вас нет доступа к данным броней — показываются все номера без учёта занятых.")
-        except Exception as e:
-            cur.close()
-            messagebox.showerror("Ошибка БД", str(e))
-            return
 
-        self.tree.delete(*self.tree.get_children())
-        for r in rows:
-            self.tree.insert("", "end", values=r)
+        reconcile_tree(self.tree, rows)
 
 
 # ----------------- Main Application (Admin/Manager) -----------------
 class MainApp(tk.Tk):
-    def __init__(self, conn_params):
+    def __init__(self, conn_params, conn=None):
         super().__init__()
         self.title("Hotel Admin — UI")
         self.geometry("1200x780")
@@ -216,8 +1144,13 @@ class MainApp(tk.Tk):
         center_window(self, None)
 
         self.conn_params = conn_params
-        self.conn = None
-        self.connect_db()
+        self.db = None
+        self.executor = None
+        self.listener = None
+        self.refs = None
+        self.avail = None
+        if not self.connect_db(conn):
+            return
         self.style = ttk.Style(self)
         try:
             self.style.theme_use('clam')
@@ -265,31 +1198,125 @@ class MainApp(tk.Tk):
         self.build_reports_frame()
 
         self.switch_to("dashboard")
+        # изменения с других рабочих мест приходят уведомлениями и точечно обновляют таблицы
+        # индекс свободных номеров загружается в on_db_resync, когда LISTEN уже включён
+        self.listener = ChangeListener(self, self.conn_params, self.on_db_changes, on_resync=self.on_db_resync)
+        self.rollover_room_status()
 
-    def connect_db(self):
+    def connect_db(self, conn=None):
+        """Set up the pool and the shared helpers; on failure report it, close the window and return False."""
         try:
-            self.conn = psycopg2.connect(**self.conn_params)
-            self.conn.autocommit = True
+            self.db = ConnectionPool(self.conn_params, conn=conn)
+            self.executor = QueryExecutor(self, self.db)
+            self.refs = RefCache(self.db)
+            self.avail = AvailabilityIndex(self.executor)
+            return True
         except Exception as e:
             messagebox.showerror("DB", f"Не удалось подключиться: {e}")
+            if self.db:
+                self.db.close()
+            self.db = None
             self.destroy()
+            return False
+
+    def delete_selected(self, tree, table, key, noun):
+        # все выделенные строки удаляются одной командой в одной транзакции
+        ids = [int(iid) for iid in tree.selection()]
+        if not ids:
+            messagebox.showwarning("Выбор", f"Выберите {noun}")
+            return False
+        user = self.conn_params.get("user","")
+        if not user.startswith("admin"):
+            messagebox.showwarning("Права", "Удалять может только администратор")
+            return False
+        what = f"{noun} {ids[0]}" if len(ids) == 1 else f"выбранные записи ({len(ids)})"
+        if not messagebox.askyesno("Confirm", f"Удалить {what}?"):
+            return False
+        try:
+            n = self.db.delete_many(table, key, ids)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+            return False
+        messagebox.showinfo("OK", f"Удалено: {n}")
+        return True
+
+    def rollover_room_status(self, new_day=False):
+        # снимок Room.status на сегодня (если нет pg_cron, его обновляет приложение);
+        # в полночь список номеров перечитывается — занятость в нём считается на текущую дату
+        def fetch(cur):
+            cur.execute("SELECT refresh_room_status()")
+            return cur.fetchone()[0]
+
+        def done(_):
+            if new_day:
+                self.refresh_rooms()
+        self.executor.submit(fetch, done, done)
+        now = datetime.now()
+        nxt = datetime.combine(now.date() + timedelta(days=1), datetime.min.time()) + timedelta(seconds=STATUS_ROLLOVER_DELAY)
+        self.after(int((nxt - now).total_seconds() * 1000), self.rollover_room_status, True)
 
     def on_exit(self):
         if messagebox.askyesno("Exit", "Закрыть приложение?"):
             try:
-                if self.conn:
-                    self.conn.close()
+                if self.listener:
+                    self.listener.stop()
+                if self.executor:
+                    self.executor.shutdown()
+                if self.db:
+                    self.db.close()
             except:
                 pass
             self.destroy()
 
     def switch_to(self, key):
         if self.current_frame:
+            # ушли с вкладки — её незавершённые запросы больше не нужны
+            if self.executor:
+                self.executor.cancel_within(self.current_frame)
             self.current_frame.pack_forget()
         frame = self.frames.get(key)
         if frame:
             frame.pack(fill="both", expand=True)
             self.current_frame = frame
+            for w in frame.winfo_children():
+                if isinstance(w, KeysetGrid):
+                    w.resume()
+
+    def on_db_changes(self, changes):
+        # какие строки каких таблиц интерфейса затронуты
+        grids = {
+            "booking": self.bookings_grid, "bookingguest": self.bookings_grid,
+            "bookingservice": self.bookings_grid,
+            "room": self.rooms_grid, "client": self.clients_grid,
+        }
+        touched = {}
+        refs_changed = set()
+        for ch in changes:
+            if ch.get("table") in RefCache.QUERIES:
+                refs_changed.add(ch["table"])
+                continue
+            grid = grids.get(ch.get("table"))
+            if grid is not None and ch.get("id") is not None:
+                touched.setdefault(grid, set()).add(ch["id"])
+        for grid, ids in touched.items():
+            grid.patch(ids)
+        # занятость номера вычисляется из броней — строки номеров их броней тоже устарели
+        self.avail.refresh_bookings((ch["id"] for ch in changes if ch.get("table") == "booking"),
+                                    on_rooms=self.rooms_grid.patch)
+        self.avail.refresh_rooms(ch["id"] for ch in changes if ch.get("table") == "room")
+        for table in refs_changed:
+            self.refs.invalidate(table)
+        if "roomtype" in refs_changed:
+            self.refresh_rooms()       # названия/цены типов показываются в списке номеров
+        if "service" in refs_changed:
+            self.refresh_services()
+
+    def on_db_resync(self):
+        # LISTEN (заново) включён: то, что менялось без него, известно только БД
+        for table in RefCache.QUERIES:
+            self.refs.invalidate(table)
+        self.avail.load()
+        self.refresh_all()
 
     # ---------- Dashboard ----------
     def build_dashboard(self):
@@ -348,20 +1375,19 @@ class MainApp(tk.Tk):
         self.frames["dashboard"] = f
 
     def refresh_stats(self):
-        try:
-            cur = self.conn.cursor()
-            cur.execute("SELECT COUNT(*) FROM Room")
-            rooms = cur.fetchone()[0]
-            cur.execute("SELECT COUNT(*) FROM Booking WHERE start_date <= current_date AND end_date > current_date")
-            occ = cur.fetchone()[0]
-            cur.execute("SELECT COUNT(*) FROM Client")
-            clients = cur.fetchone()[0]
-            cur.execute("SELECT COUNT(*) FROM Service")
-            services = cur.fetchone()[0]
-            cur.close()
+        def fetch(cur):
+            cur.execute("""
+                SELECT (SELECT COUNT(*) FROM Room),
+                       (SELECT COUNT(*) FROM Booking WHERE start_date <= current_date AND end_date > current_date),
+                       (SELECT COUNT(*) FROM Client),
+                       (SELECT COUNT(*) FROM Service)
+            """)
+            return cur.fetchone()
+
+        def show(row):
+            rooms, occ, clients, services = row
             messagebox.showinfo("Stats", f"Rooms: {rooms}\nOccupied today: {occ}\nClients: {clients}\nServices: {services}")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.executor.submit(fetch, show, lambda e: messagebox.showerror("Error", str(e)))
 
     # ---------- Rooms ----------
     def build_rooms_frame(self):
@@ -374,43 +1400,39 @@ class MainApp(tk.Tk):
         ttk.Button(top, text="Добавить номер", command=self.dialog_add_room).pack(side="left", padx=6)
         ttk.Button(top, text="Удалить номер", command=self.delete_selected_room).pack(side="left", padx=6)
         cols = ("room_id","room_number","type","status","price","capacity")
-        tree = ttk.Treeview(f, columns=cols, show="headings", height=18)
-        for c in cols:
-            tree.heading(c, text=c)
-            tree.column(c, width=110, anchor="center")
-        vsb = ttk.Scrollbar(f, orient="vertical", command=tree.yview)
-        tree.configure(yscroll=vsb.set)
-        tree.pack(side="left", fill="both", expand=True, padx=(0,0))
-        vsb.pack(side="left", fill="y")
-        self.rooms_tree = tree
+        grid = KeysetGrid(f, self.executor, cols, *GRIDS["rooms_grid"], row_fn=self._room_rows, name="rooms_grid")
+        grid.pack(fill="both", expand=True)
+        self.rooms_grid = grid
+        self.rooms_tree = grid.tree
         self.frames["rooms"] = f
         self.refresh_rooms()
 
+    def _room_rows(self, cur, rows):
+        # тип, цену и вместимость берём из кэша справочников вместо JOIN с RoomType
+        types = self.refs.index("roomtype", cur, expect={r[2] for r in rows})
+        out = []
+        for rid, num, tid, status in rows:
+            _, name, price, cap = types.get(tid, (tid, tid, None, None))
+            out.append((rid, num, name, status, price, cap))
+        return out
+
     def refresh_rooms(self):
-        if not self.conn: return
-        cur = self.conn.cursor()
-        cur.execute("""
-            SELECT r.room_id, r.room_number, rt.name, r.status, rt.price, rt.capacity
-            FROM Room r JOIN RoomType rt ON r.type_id = rt.type_id
-            ORDER BY r.room_id;
-        """)
-        rows = cur.fetchall()
-        cur.close()
-        self.rooms_tree.delete(*self.rooms_tree.get_children())
-        for r in rows:
-            self.rooms_tree.insert("", "end", values=r)
+        if not self.db: return
+        self.rooms_grid.reload()
 
     def dialog_add_room_type(self):
-        dlg = ModalAddType(self, self.conn)
+        dlg = ModalAddType(self, self.db)
         if dlg.result:
+            self.refs.invalidate("roomtype")
             self.refresh_rooms()
 
     def dialog_delete_type(self):
         # Показываем модалку со списком типов + кнопкой удалить
-        cur = self.conn.cursor()
-        cur.execute("SELECT type_id, name FROM RoomType ORDER BY type_id")
-        types = cur.fetchall()
-        cur.close()
+        try:
+            types = self.refs.rows("roomtype")
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
         if not types:
             messagebox.showinfo("Нет типов", "Типы номеров не созданы.")
             return
@@ -434,18 +1456,10 @@ class MainApp(tk.Tk):
             tid = int(sel.split("-")[0].strip())
             if not messagebox.askyesno("Confirm", f"Удалить тип {tid}? Это удалит все номера этого типа."):
                 return
-            cur2 = self.conn.cursor()
             try:
-                # удаляем сначала связанные брони/комнаты, затем сам тип
-                cur2.execute(
-                    "DELETE FROM BookingService WHERE booking_id IN (SELECT booking_id FROM Booking WHERE room_id IN (SELECT room_id FROM Room WHERE type_id=%s))",
-                    (tid,))
-                cur2.execute(
-                    "DELETE FROM BookingGuest WHERE booking_id IN (SELECT booking_id FROM Booking WHERE room_id IN (SELECT room_id FROM Room WHERE type_id=%s))",
-                    (tid,))
-                cur2.execute("DELETE FROM Booking WHERE room_id IN (SELECT room_id FROM Room WHERE type_id=%s)", (tid,))
-                cur2.execute("DELETE FROM Room WHERE type_id=%s", (tid,))
-                cur2.execute("DELETE FROM RoomType WHERE type_id=%s", (tid,))
+                # номера типа, их брони, гости и услуги броней удаляются каскадом
+                self.db.delete_many("RoomType", "type_id", [tid])
+                self.refs.invalidate("roomtype")
                 messagebox.showinfo("OK", "Тип удалён")
                 dlg.destroy()
                 self.refresh_rooms()
@@ -453,43 +1467,20 @@ class MainApp(tk.Tk):
                 self.refresh_clients()
             except Exception as e:
                 messagebox.showerror("Ошибка", str(e))
-            finally:
-                cur2.close()
 
         ttk.Button(frm, text="Удалить", command=on_del).grid(row=1, column=0, columnspan=2, pady=8)
         center_window(dlg, self)
         dlg.wait_window()
 
     def dialog_add_room(self):
-        dlg = ModalAddRoom(self, self.conn)
+        dlg = ModalAddRoom(self, self.db, refs=self.refs)
         if dlg.result:
             self.refresh_rooms()
 
     def delete_selected_room(self):
-        sel = self.rooms_tree.selection()
-        if not sel:
-            messagebox.showwarning("Выбор", "Выберите номер")
-            return
-        rid = self.rooms_tree.item(sel[0])['values'][0]
-        user = self.conn_params.get("user","")
-        if not user.startswith("admin"):
-            messagebox.showwarning("Права", "Удалять может только администратор")
-            return
-        if not messagebox.askyesno("Confirm", f"Удалить номер {rid}?"):
-            return
-        cur = self.conn.cursor()
-        try:
-            cur.execute("DELETE FROM BookingService WHERE booking_id IN (SELECT booking_id FROM Booking WHERE room_id=%s)", (rid,))
-            cur.execute("DELETE FROM BookingGuest WHERE booking_id IN (SELECT booking_id FROM Booking WHERE room_id=%s)", (rid,))
-            cur.execute("DELETE FROM Booking WHERE room_id=%s", (rid,))
-            cur.execute("DELETE FROM Room WHERE room_id=%s", (rid,))
-            messagebox.showinfo("OK", "Номер удалён")
+        if self.delete_selected(self.rooms_tree, "Room", "room_id", "номер"):
             self.refresh_rooms()
             self.refresh_bookings()
-        except Exception as e:
-            messagebox.showerror("Ошибка", str(e))
-        finally:
-            cur.close()
 
     # ---------- Clients ----------
     def build_clients_frame(self):
@@ -499,57 +1490,60 @@ class MainApp(tk.Tk):
         ttk.Button(top, text="Refresh", command=self.refresh_clients).pack(side="left")
         ttk.Button(top, text="Добавить клиента", command=self.dialog_add_client).pack(side="left", padx=6)
         ttk.Button(top, text="Удалить клиента", command=self.delete_selected_client).pack(side="left", padx=6)
+        ttk.Label(top, text="Поиск (ФИО или паспорт):").pack(side="left", padx=(18,4))
+        self.v_client_search = tk.StringVar()
+        ent = ttk.Entry(top, textvariable=self.v_client_search, width=30)
+        ent.pack(side="left")
+        # пустая строка поиска — обычная постраничная таблица
+        self.client_search = DebouncedQuery(ent, self.executor,
+                                            lambda: self.v_client_search.get().strip() or None,
+                                            lambda cur, text: search_clients(cur, text, GRID_PAGE_SIZE),
+                                            self._on_clients_found,
+                                            on_invalid=lambda: self._show_clients(self.clients_grid, self.clients_grid.tree),
+                                            screen="MainApp.search_clients")
+        ent.bind("<KeyRelease>", self.client_search.trigger)
         cols = ("client_id","full_name","passport","prepayment")
-        tree = ttk.Treeview(f, columns=cols, show="headings", height=18)
+        grid = KeysetGrid(f, self.executor, cols, *GRIDS["clients_grid"], widths={"full_name": 180},
+                          name="clients_grid")
+        grid.pack(fill="both", expand=True)
+        # результаты поиска показываются вместо постраничной таблицы
+        found = ttk.Treeview(f, columns=cols, show="headings", height=18)
         for c in cols:
-            tree.heading(c, text=c)
-            tree.column(c, width=180 if c=="full_name" else 110, anchor="center")
-        vsb = ttk.Scrollbar(f, orient="vertical", command=tree.yview)
-        tree.configure(yscroll=vsb.set)
-        tree.pack(side="left", fill="both", expand=True, padx=(0,0))
-        vsb.pack(side="left", fill="y")
-        self.clients_tree = tree
+            found.heading(c, text=c); found.column(c, width=180 if c == "full_name" else 110, anchor="center")
+        self.clients_grid = grid
+        self.clients_found = found
+        self.clients_tree = grid.tree
         self.frames["clients"] = f
         self.refresh_clients()
 
     def refresh_clients(self):
-        if not self.conn: return
-        cur = self.conn.cursor()
-        cur.execute("SELECT client_id, full_name, passport_number, prepayment FROM Client ORDER BY client_id")
-        rows = cur.fetchall()
-        cur.close()
-        self.clients_tree.delete(*self.clients_tree.get_children())
-        for r in rows:
-            self.clients_tree.insert("", "end", values=r)
+        if not self.db: return
+        self.clients_grid.reload()
+        self.client_search.invalidate()
+        if self.v_client_search.get().strip():
+            self.client_search.run_now()
+
+    def _on_clients_found(self, rows):
+        reconcile_tree(self.clients_found, rows)
+        self._show_clients(self.clients_found, self.clients_found)
+
+    def _show_clients(self, widget, tree):
+        if self.clients_tree is tree:
+            return
+        other = self.clients_found if widget is self.clients_grid else self.clients_grid
+        other.pack_forget()
+        widget.pack(fill="both", expand=True)
+        self.clients_tree = tree
 
     def dialog_add_client(self):
-        dlg = ModalAddClient(self, self.conn)
+        dlg = ModalAddClient(self, self.db)
         if dlg.result:
             self.refresh_clients()
 
     def delete_selected_client(self):
-        sel = self.clients_tree.selection()
-        if not sel:
-            messagebox.showwarning("Выбор", "Выберите клиента")
-            return
-        cid = self.clients_tree.item(sel[0])['values'][0]
-        user = self.conn_params.get("user","")
-        if not user.startswith("admin"):
-            messagebox.showwarning("Права", "Удалять может только администратор")
-            return
-        if not messagebox.askyesno("Confirm", f"Удалить клиента {cid}?"):
-            return
-        cur = self.conn.cursor()
-        try:
-            cur.execute("DELETE FROM BookingGuest WHERE client_id=%s", (cid,))
-            cur.execute("DELETE FROM Client WHERE client_id=%s", (cid,))
-            messagebox.showinfo("OK", "Клиент удалён")
+        if self.delete_selected(self.clients_tree, "Client", "client_id", "клиента"):
             self.refresh_clients()
             self.refresh_bookings()
-        except Exception as e:
-            messagebox.showerror("Ошибка", str(e))
-        finally:
-            cur.close()
 
     # ---------- Services ----------
     def build_services_frame(self):
@@ -573,42 +1567,24 @@ class MainApp(tk.Tk):
         self.refresh_services()
 
     def refresh_services(self):
-        if not self.conn: return
-        cur = self.conn.cursor()
-        cur.execute("SELECT service_id, name, price, description FROM Service ORDER BY service_id")
-        rows = cur.fetchall()
-        cur.close()
-        self.services_tree.delete(*self.services_tree.get_children())
-        for r in rows:
-            self.services_tree.insert("", "end", values=r)
+        if not self.db: return
+        # Refresh перечитывает справочник; диалоги дальше берут его из кэша
+        self.refs.invalidate("service")
+        self.executor.submit(lambda cur: self.refs.rows("service", cur), self._fill_services,
+                             owner=self.services_tree)
+
+    def _fill_services(self, rows):
+        reconcile_tree(self.services_tree, rows)
 
     def dialog_add_service(self):
-        dlg = ModalAddService(self, self.conn)
+        dlg = ModalAddService(self, self.db)
         if dlg.result:
             self.refresh_services()
 
     def dialog_delete_service(self):
-        sel = self.services_tree.selection()
-        if not sel:
-            messagebox.showwarning("Выбор", "Выберите услугу")
-            return
-        sid = self.services_tree.item(sel[0])['values'][0]
-        user = self.conn_params.get("user","")
-        if not user.startswith("admin"):
-            messagebox.showwarning("Права", "Удалять может только администратор")
-            return
-        if not messagebox.askyesno("Confirm", f"Удалить услугу {sid}?"):
-            return
-        cur = self.conn.cursor()
-        try:
-            cur.execute("DELETE FROM BookingService WHERE service_id=%s", (sid,))
-            cur.execute("DELETE FROM Service WHERE service_id=%s", (sid,))
-            messagebox.showinfo("OK", "Удалено")
+        if self.delete_selected(self.services_tree, "Service", "service_id", "услугу"):
+            self.refs.invalidate("service")
             self.refresh_services()
-        except Exception as e:
-            messagebox.showerror("Ошибка", str(e))
-        finally:
-            cur.close()
 
     # ---------- Bookings ----------
     def build_bookings_frame(self):
@@ -619,67 +1595,50 @@ class MainApp(tk.Tk):
         ttk.Button(top, text="Создать бронь (мастер)", command=self.dialog_add_booking).pack(side="left", padx=6)
         ttk.Button(top, text="Удалить бронь", command=self.delete_selected_booking).pack(side="left", padx=6)
         ttk.Button(top, text="Добавить услугу -> бронь", command=self.dialog_add_service_to_booking).pack(side="left", padx=6)
+        ttk.Button(top, text="Импорт CSV", command=self.dialog_import_csv).pack(side="left", padx=6)
+        ttk.Button(top, text="Экспорт CSV", command=self.export_bookings).pack(side="left", padx=6)
 
         cols = ("booking_id","room_number","start_date","end_date","booking_fee","guests_count")
-        tree = ttk.Treeview(f, columns=cols, show="headings", height=18)
-        for c in cols:
-            tree.heading(c, text=c)
-            tree.column(c, width=120, anchor="center")
-        tree.bind("<Double-1>", self.on_booking_double)
-        vsb = ttk.Scrollbar(f, orient="vertical", command=tree.yview)
-        tree.configure(yscroll=vsb.set)
-        tree.pack(side="left", fill="both", expand=True)
-        vsb.pack(side="left", fill="y")
-        self.bookings_tree = tree
+        grid = KeysetGrid(f, self.executor, cols, *GRIDS["bookings_grid"], widths={c: 120 for c in cols},
+                          name="bookings_grid")
+        grid.tree.bind("<Double-1>", self.on_booking_double)
+        grid.pack(fill="both", expand=True)
+        self.bookings_grid = grid
+        self.bookings_tree = grid.tree
         self.frames["bookings"] = f
         self.refresh_bookings()
 
     def refresh_bookings(self):
-        if not self.conn: return
-        cur = self.conn.cursor()
-        cur.execute("""
-            SELECT b.booking_id, r.room_number, b.start_date, b.end_date, b.booking_fee,
-                   (SELECT COUNT(*) FROM BookingGuest bg WHERE bg.booking_id = b.booking_id) as guests_count
-            FROM Booking b JOIN Room r ON b.room_id = r.room_id
-            ORDER BY b.booking_id;
-        """)
-        rows = cur.fetchall()
-        cur.close()
-        self.bookings_tree.delete(*self.bookings_tree.get_children())
-        for r in rows:
-            self.bookings_tree.insert("", "end", values=r)
+        if not self.db: return
+        self.bookings_grid.reload()
 
     def dialog_add_booking(self):
-        dlg = ModalBookingWizard(self, self.conn)
+        dlg = ModalBookingWizard(self, self.db, executor=self.executor, refs=self.refs, avail=self.avail)
         if dlg.result:
             self.refresh_bookings()
             self.refresh_rooms()
             self.refresh_clients()
 
+    def export_bookings(self):
+        # все брони с итогами; выгрузка идёт в фоне и не держит строки в памяти
+        export_report(self, self.executor, """
+            SELECT b.booking_id, r.room_number, b.start_date, b.end_date, b.guest_count,
+                   t.nights, t.room_total, t.services_total, t.booking_fee, t.prepayments_total, t.balance
+            FROM Booking b
+            JOIN Room r ON r.room_id = b.room_id
+            JOIN booking_totals t ON t.booking_id = b.booking_id
+            ORDER BY b.booking_id
+        """, None, f"bookings_{date.today()}")
+
+    def dialog_import_csv(self):
+        dlg = ModalImportCsv(self, self.db, executor=self.executor)
+        if dlg.result:
+            self.refresh_all()
+
     def delete_selected_booking(self):
-        sel = self.bookings_tree.selection()
-        if not sel:
-            messagebox.showwarning("Выбор", "Выберите бронь")
-            return
-        bid = self.bookings_tree.item(sel[0])['values'][0]
-        user = self.conn_params.get("user","")
-        if not user.startswith("admin"):
-            messagebox.showwarning("Права", "Удалять может только администратор")
-            return
-        if not messagebox.askyesno("Confirm", f"Удалить бронь {bid}?"):
-            return
-        cur = self.conn.cursor()
-        try:
-            cur.execute("DELETE FROM BookingService WHERE booking_id=%s", (bid,))
-            cur.execute("DELETE FROM BookingGuest WHERE booking_id=%s", (bid,))
-            cur.execute("DELETE FROM Booking WHERE booking_id=%s", (bid,))
-            messagebox.showinfo("OK", "Удалено")
+        if self.delete_selected(self.bookings_tree, "Booking", "booking_id", "бронь"):
             self.refresh_bookings()
             self.refresh_rooms()
-        except Exception as e:
-            messagebox.showerror("Ошибка", str(e))
-        finally:
-            cur.close()
 
     def dialog_add_service_to_booking(self):
         sel = self.bookings_tree.selection()
@@ -687,7 +1646,7 @@ class MainApp(tk.Tk):
             messagebox.showwarning("Выбор", "Выберите бронь")
             return
         bid = self.bookings_tree.item(sel[0])['values'][0]
-        dlg = ModalAddServiceToBooking(self, self.conn, bid)
+        dlg = ModalAddServiceToBooking(self, self.db, bid, refs=self.refs)
         if dlg.result:
             self.refresh_bookings()
 
@@ -695,7 +1654,7 @@ class MainApp(tk.Tk):
         sel = self.bookings_tree.selection()
         if not sel: return
         bid = self.bookings_tree.item(sel[0])['values'][0]
-        dlg = ModalBookingDetails(self, self.conn, bid)
+        dlg = ModalBookingDetails(self, self.db, bid, executor=self.executor)
 
     # ---------- Reports ----------
     def build_reports_frame(self):
@@ -704,13 +1663,17 @@ class MainApp(tk.Tk):
         top = ttk.Frame(f); top.pack(fill="x", pady=6)
         ttk.Button(top, text="Свободные номера на дату", command=self.dialog_report_free).pack(side="left", padx=6)
         ttk.Button(top, text="Отчёт по оплатам (агрег.)", command=self.dialog_report_payments).pack(side="left", padx=6)
+        ttk.Button(top, text="Диагностика запросов", command=self.dialog_diagnostics).pack(side="left", padx=6)
         self.frames["reports"] = f
 
     def dialog_report_free(self):
-        dlg = ModalReportFree(self, self.conn)
+        dlg = ModalReportFree(self, self.db, executor=self.executor, refs=self.refs, avail=self.avail)
 
     def dialog_report_payments(self):
-        dlg = ModalReportPayments(self, self.conn)
+        dlg = ModalReportPayments(self, self.db, executor=self.executor)
+
+    def dialog_diagnostics(self):
+        dlg = ModalDiagnostics(self)
 
     # ---------- Utilities ----------
     def refresh_all(self):
@@ -719,11 +1682,11 @@ class MainApp(tk.Tk):
 # ---------------- Modal dialogs (CRUD & wizard) ----------------
 
 class ModalAddType(tk.Toplevel):
-    def __init__(self, parent, conn, **kw):
+    def __init__(self, parent, db, **kw):
         super().__init__(parent)
         self.title("Добавить тип номера")
         self.transient(parent); self.grab_set()
-        self.conn = conn
+        self.db = db
         frm = ttk.Frame(self, padding=10); frm.pack(fill="both", expand=True)
         ttk.Label(frm, text="Name").grid(row=0,column=0)
         self.v_name = tk.StringVar(); ttk.Entry(frm, textvariable=self.v_name).grid(row=0,column=1)
@@ -741,33 +1704,30 @@ class ModalAddType(tk.Toplevel):
             name = self.v_name.get().strip()
             price = float(self.v_price.get())
             cap = int(self.v_cap.get())
-            tid = safe_next_id(self.conn, "RoomType", "type_id")
-            cur = self.conn.cursor()
-            cur.execute("INSERT INTO RoomType (type_id, name, price, capacity) VALUES (%s,%s,%s,%s)",
-                        (tid, name, price, cap))
-            cur.close()
+            with self.db.cursor() as cur:
+                cur.execute("INSERT INTO RoomType (name, price, capacity) VALUES (%s,%s,%s) RETURNING type_id",
+                            (name, price, cap))
+                tid = cur.fetchone()[0]
             self.result = True
+            self.created_id = tid
             self.destroy()
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
 class ModalAddRoom(tk.Toplevel):
-    def __init__(self, parent, conn, **kw):
+    def __init__(self, parent, db, refs=None, **kw):
         super().__init__(parent)
         self.title("Добавить номер")
         self.transient(parent); self.grab_set()
-        self.conn = conn
+        self.db = db
         frm = ttk.Frame(self, padding=10); frm.pack(fill="both", expand=True)
         ttk.Label(frm, text="Room Number").grid(row=0,column=0)
         self.v_num = tk.StringVar(); ttk.Entry(frm, textvariable=self.v_num).grid(row=0,column=1)
 
         ttk.Label(frm, text="Type (select)").grid(row=1,column=0)
         self.type_var = tk.StringVar()
-        # fetch types
-        cur = self.conn.cursor()
-        cur.execute("SELECT type_id, name FROM RoomType ORDER BY type_id")
-        types = cur.fetchall()
-        cur.close()
+        # типы — из кэша справочников
+        types = (refs or RefCache(db)).rows("roomtype")
         opts = [f"{t[0]} - {t[1]}" for t in types]
         cmb = ttk.Combobox(frm, values=opts, textvariable=self.type_var, width=30)
         cmb.grid(row=1, column=1)
@@ -784,22 +1744,22 @@ class ModalAddRoom(tk.Toplevel):
                 messagebox.showerror("Ошибка", "Выберите type")
                 return
             tid = int(sel.split("-")[0].strip())
-            rid = safe_next_id(self.conn, "Room", "room_id")
-            cur = self.conn.cursor()
-            cur.execute("INSERT INTO Room (room_id, type_id, room_number, status, week_day_rate) VALUES (%s,%s,%s,%s,%s)",
-                        (rid, tid, rnum, 'свободен', 100))
-            cur.close()
+            with self.db.cursor() as cur:
+                cur.execute("INSERT INTO Room (type_id, room_number, status, week_day_rate) VALUES (%s,%s,%s,%s) RETURNING room_id",
+                            (tid, rnum, 'свободен', 100))
+                rid = cur.fetchone()[0]
             self.result = True
+            self.created_id = rid
             self.destroy()
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
 class ModalAddClient(tk.Toplevel):
-    def __init__(self, parent, conn, **kw):
+    def __init__(self, parent, db, **kw):
         super().__init__(parent)
         self.title("Добавить клиента")
         self.transient(parent); self.grab_set()
-        self.conn = conn
+        self.db = db
         frm = ttk.Frame(self, padding=10); frm.pack(fill="both", expand=True)
         ttk.Label(frm, text="ФИО").grid(row=0,column=0)
         self.v_name = tk.StringVar(); ttk.Entry(frm, textvariable=self.v_name).grid(row=0,column=1)
@@ -817,11 +1777,10 @@ class ModalAddClient(tk.Toplevel):
             name = self.v_name.get().strip()
             passport = self.v_pass.get().strip()
             prepay = float(self.v_prep.get())
-            cid = safe_next_id(self.conn, "Client", "client_id")
-            cur = self.conn.cursor()
-            cur.execute("INSERT INTO Client (client_id, full_name, passport_number, prepayment) VALUES (%s,%s,%s,%s)",
-                        (cid, name, passport, prepay))
-            cur.close()
+            with self.db.cursor() as cur:
+                cur.execute("INSERT INTO Client (full_name, passport_number, prepayment) VALUES (%s,%s,%s) RETURNING client_id",
+                            (name, passport, prepay))
+                cid = cur.fetchone()[0]
             self.result = True
             self.created_id = cid
             self.destroy()
@@ -829,11 +1788,11 @@ class ModalAddClient(tk.Toplevel):
             messagebox.showerror("Ошибка", str(e))
 
 class ModalAddService(tk.Toplevel):
-    def __init__(self, parent, conn, **kw):
+    def __init__(self, parent, db, **kw):
         super().__init__(parent)
         self.title("Добавить услугу")
         self.transient(parent); self.grab_set()
-        self.conn = conn
+        self.db = db
         frm = ttk.Frame(self, padding=10); frm.pack(fill="both", expand=True)
         ttk.Label(frm, text="Name").grid(row=0,column=0)
         self.v_name = tk.StringVar(); ttk.Entry(frm, textvariable=self.v_name).grid(row=0,column=1)
@@ -851,24 +1810,29 @@ class ModalAddService(tk.Toplevel):
             name = self.v_name.get().strip()
             price = float(self.v_price.get())
             desc = self.v_desc.get().strip()
-            sid = safe_next_id(self.conn, "Service", "service_id")
-            cur = self.conn.cursor()
-            cur.execute("INSERT INTO Service (service_id, name, price, description) VALUES (%s,%s,%s,%s)",
-                        (sid, name, price, desc))
-            cur.close()
+            with self.db.cursor() as cur:
+                cur.execute("INSERT INTO Service (name, price, description) VALUES (%s,%s,%s) RETURNING service_id",
+                            (name, price, desc))
+                sid = cur.fetchone()[0]
             self.result = True
+            self.created_id = sid
             self.destroy()
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
 class ModalBookingWizard(tk.Toplevel):
-    def __init__(self, parent, conn, **kw):
+    def __init__(self, parent, db, executor=None, refs=None, avail=None, **kw):
         super().__init__(parent)
         self.title("Мастер создания брони")
         self.transient(parent); self.grab_set()
         self.geometry("900x640")
         self.minsize(760, 520)
-        self.conn = conn
+        self.db = db
+        self.executor = executor or QueryExecutor(self, db, workers=1)
+        self.refs = refs or RefCache(db)
+        self.avail = avail
+        self._clients = None      # первые клиенты для пустых слотов, грузятся в фоне
+        self._guest_queries = []  # слот -> поиск клиента по вводу
         self.parent = parent
         frm = ttk.Frame(self, padding=10); frm.pack(fill="both", expand=True)
         ttk.Label(frm, text="Кол-во гостей").grid(row=0,column=0)
@@ -881,43 +1845,69 @@ class ModalBookingWizard(tk.Toplevel):
         self.v_start = tk.StringVar(value=str(date.today())); ttk.Entry(frm, textvariable=self.v_start, width=12).grid(row=2,column=1)
         ttk.Label(frm, text="End YYYY-MM-DD").grid(row=2,column=2)
         self.v_end = tk.StringVar(value=str(date.today()+timedelta(days=1))); ttk.Entry(frm, textvariable=self.v_end, width=12).grid(row=2,column=3)
+        ttk.Label(frm, text="Choose room:").grid(row=4,column=0)
+        self.v_room = tk.StringVar(); self.cmb_room = ttk.Combobox(frm, textvariable=self.v_room, width=50); self.cmb_room.grid(row=4,column=1,columnspan=3)
+        # свободные номера пересчитываются, когда ввод дат успокоился, и только если период
+        # или число гостей действительно изменились
+        self.avail_query = DebouncedQuery(self, self.executor, self._avail_key, self._fetch_rooms,
+                                          self._fill_rooms, on_invalid=self._clear_rooms,
+                                          local=self._local_rooms)
         # auto refresh available rooms when dates change
         try:
-            self.v_start.trace_add('write', lambda *_: self.show_available())
-            self.v_end.trace_add('write', lambda *_: self.show_available())
+            self.v_start.trace_add('write', self.avail_query.trigger)
+            self.v_end.trace_add('write', self.avail_query.trigger)
         except AttributeError:
             # fallback for older tkinter
             pass
-        ttk.Label(frm, text="Choose room:").grid(row=4,column=0)
-        self.v_room = tk.StringVar(); self.cmb_room = ttk.Combobox(frm, textvariable=self.v_room, width=50); self.cmb_room.grid(row=4,column=1,columnspan=3)
+        if self.avail is not None:
+            self.avail.subscribe(self.on_bookings_changed)
+            self.bind("<Destroy>", self._on_destroy, add="+")
         ttk.Button(frm, text="Create booking", command=self.create_booking).grid(row=5,column=0, columnspan=4, pady=8)
         self.result = False
         center_window(self, parent)
         self.init_guests()
-        self.show_available()
         self.wait_window()
 
+    def on_bookings_changed(self):
+        # кто-то забронировал или снял бронь — прежний список свободных номеров устарел
+        self.avail_query.invalidate()
+        self.avail_query.trigger()
+
+    def _on_destroy(self, event):
+        if event.widget is self:
+            self.avail.unsubscribe(self.on_bookings_changed)
+
     def init_guests(self):
         # пересоздаём область гостей и массив фиксированной длины
         for w in self.guest_area.winfo_children():
             w.destroy()
 
         n = max(1, int(self.v_num.get()))
+        for q in self._guest_queries:
+            q.cancel()
+        self._guest_queries = []
         self.temp_guest_ids = [None] * n  # фиксированная длина, индекс => слот
         self.guest_comboboxes = []
 
-        ttk.Label(self.guest_area, text=f"Выберите {n} гостей: выберите из списка — гостя закрепит слот").grid(row=0,
+        ttk.Label(self.guest_area, text=f"Выберите {n} гостей: начните вводить ФИО или паспорт и выберите из списка").grid(row=0,
                                                                                                                column=0,
                                                                                                                columnspan=4,
                                                                                                                sticky="w")
-        clients = self.fetch_clients_for_cmb()
+        clients = self._clients or []
 
         for i in range(n):
             row = i + 1
             ttk.Label(self.guest_area, text=f"Гость {row}").grid(row=row, column=0, padx=2)
             var = tk.StringVar()
-            cmb = ttk.Combobox(self.guest_area, values=clients, textvariable=var, width=50, state="readonly")
+            cmb = ttk.Combobox(self.guest_area, values=clients, textvariable=var, width=50)
             cmb.grid(row=row, column=1, padx=4)
+            # ввод — поиск по индексам Client, в списке только лучшие совпадения
+            q = DebouncedQuery(cmb, self.executor,
+                               lambda c=cmb: None if str(c['state']) == "disabled" else c.get(),
+                               self.fetch_clients_for_cmb,
+                               lambda lines, c=cmb: self._set_guest_matches(c, lines))
+            self._guest_queries.append(q)
+            cmb.bind("<KeyRelease>", lambda e, q=q: self.on_guest_typed(e, q))
 
             # запрет прокрутки колесом (чтобы не менять случайно)
             cmb.bind("<MouseWheel>", lambda e: "break")
@@ -930,6 +1920,26 @@ class ModalBookingWizard(tk.Toplevel):
 
         self.lbl_added = ttk.Label(self.guest_area, text=str(self.temp_guest_ids))
         self.lbl_added.grid(row=n + 1, column=0, columnspan=3, sticky="w")
+        # число гостей изменилось — меняется и список подходящих по вместимости номеров
+        if hasattr(self, "cmb_room"):
+            self.show_available()
+        # пока список клиентов обновляется, показываем прошлый
+        self.executor.submit(self.fetch_clients_for_cmb, self._set_clients, owner=self)
+
+    def _set_clients(self, lines):
+        self._clients = lines
+        for cmb in self.guest_comboboxes:
+            if cmb.winfo_exists():
+                cmb['values'] = lines
+
+    def on_guest_typed(self, event, query):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        query.trigger()
+
+    def _set_guest_matches(self, cmb, lines):
+        if cmb.winfo_exists():
+            cmb['values'] = lines
 
     def on_guest_selected(self, var, cmb_widget, idx):
         sel = var.get().strip()
@@ -938,7 +1948,7 @@ class ModalBookingWizard(tk.Toplevel):
 
         # создание нового гостя
         if sel.startswith("<создать"):
-            dlg = ModalAddClient(self, self.conn)
+            dlg = ModalAddClient(self, self.db)
             if not getattr(dlg, "result", False) or not hasattr(dlg, "created_id"):
                 # отмена — сбросим выбор
                 var.set("")
@@ -982,44 +1992,64 @@ class ModalBookingWizard(tk.Toplevel):
             w.destroy()
         self.init_guests()
 
-    def fetch_clients_for_cmb(self):
-        cur = self.conn.cursor()
-        cur.execute("SELECT client_id, full_name, passport_number FROM Client ORDER BY client_id")
-        rows = cur.fetchall(); cur.close()
+    def fetch_clients_for_cmb(self, cur, text=""):
+        rows = search_clients(cur, text)
         lines = [f"{r[0]} - {r[1]} ({r[2]})" for r in rows]
         lines.insert(0,"<создать нового гостя>")
         return lines
 
     def show_available(self):
         # Пополнение списка доступных комнат и показываем вместимость
+        self.avail_query.run_now()
+
+    def _avail_key(self):
+        # (start, end, гостей) — пока даты не дописаны, ключа нет
         try:
             start = datetime.strptime(self.v_start.get(), "%Y-%m-%d").date()
             end = datetime.strptime(self.v_end.get(), "%Y-%m-%d").date()
-            if start >= end:
-                self.cmb_room['values'] = []
-                self.cmb_room.set("")
-                return
-        except Exception:
-            self.cmb_room['values'] = []
-            self.cmb_room.set("")
-            return
+        except ValueError:
+            return None
+        if start >= end:
+            return None
+        return start, end, self._guests_needed()
+
+    def _local_rooms(self, key):
+        if self.avail is None or not self.avail.ready:
+            return None
+        # индекс занятости в памяти — без запроса к БД на каждое изменение даты
+        start, end, _ = key
+        try:
+            return self._resolve_types(self.avail.free_rooms(start, end))
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+            return []
 
-        cur = self.conn.cursor()
-        q = """
-            SELECT r.room_id, r.room_number, rt.name, rt.price, rt.capacity
-            FROM Room r JOIN RoomType rt ON r.type_id = rt.type_id
-            WHERE r.room_id NOT IN (
-                SELECT room_id FROM Booking WHERE start_date <= %s AND end_date > %s
-            ) ORDER BY r.room_id;
-        """
-        cur.execute(q, (start, start))
-        rows = cur.fetchall()
-        cur.close()
+    def _fetch_rooms(self, cur, key):
+        # свободные на весь период и вмещающие всех гостей
+        STATEMENTS.execute(cur, "free_rooms", key)
+        return cur.fetchall()
+
+    def _clear_rooms(self):
+        self.cmb_room['values'] = []
+        self.cmb_room.set("")
+
+    def _guests_needed(self):
+        return max(1, len(self.temp_guest_ids))
+
+    def _resolve_types(self, rows, cur=None):
+        # (room_id, room_number, type_id) -> (room_id, room_number, type, price, capacity)
+        types = self.refs.index("roomtype", cur, expect={r[2] for r in rows})
+        need = self._guests_needed()
+        return [(rid, num) + tuple(types[tid][1:]) for rid, num, tid in rows
+                if tid in types and types[tid][3] >= need]
 
+    def _fill_rooms(self, rows):
         vals = [f"{r[0]} - {r[1]} ({r[2]}) cap={r[4]} price={format_money(r[3])}" for r in rows]
         self.cmb_room['values'] = vals
         if vals:
-            self.cmb_room.current(0)
+            # тот же период снова — выбранный номер остаётся выбранным
+            if self.v_room.get() not in vals:
+                self.cmb_room.current(0)
         else:
             self.cmb_room.set("Нет доступных")
 
@@ -1054,32 +2084,34 @@ class ModalBookingWizard(tk.Toplevel):
             messagebox.showerror("Ошибка", str(e))
             return
 
-        cur = self.conn.cursor()
         try:
-            bid = safe_next_id(self.conn, "Booking", "booking_id")
-            cur.execute("INSERT INTO Booking (booking_id, room_id, start_date, end_date, booking_fee) VALUES (%s,%s,%s,%s,%s)",
-                        (bid, room_id, start, end, None))
-            for cid in self.temp_guest_ids:
-                cbid = safe_next_id(self.conn, "BookingGuest", "client_b_id")
-                cur.execute("INSERT INTO BookingGuest (client_b_id, booking_id, client_id) VALUES (%s,%s,%s)",
-                            (cbid, bid, cid))
+            # бронь и все гости — одна транзакция: при ошибке не остаётся брони без гостей
+            with self.db.transaction() as cur:
+                STATEMENTS.execute(cur, "create_booking", (room_id, start, end, None))
+                bid = cur.fetchone()[0]
+                # все гости одним INSERT, в порядке слотов
+                STATEMENTS.execute(cur, "add_booking_guests", (bid, list(self.temp_guest_ids)))
             messagebox.showinfo("OK", f"Бронь создана id={bid}")
             self.result = True
             self.destroy()
+        except errors.ExclusionViolation:
+            # ограничение booking_no_overlap: номер успели занять на эти даты
+            messagebox.showerror("Номер занят", "Номер уже забронирован на часть выбранного периода — выберите другой.")
+            # тот же период и те же гости — без сброса вернулся бы прежний список с занятым номером
+            self.avail_query.invalidate()
+            self.show_available()
         except Exception as e:
             messagebox.showerror("Ошибка БД при создании брони", str(e))
-        finally:
-            cur.close()
 
 class ModalAddServiceToBooking(tk.Toplevel):
-    def __init__(self, parent, conn, booking_id, **kw):
+    def __init__(self, parent, db, booking_id, refs=None, **kw):
         super().__init__(parent)
         self.title(f"Добавить услугу в бронь {booking_id}")
         self.transient(parent); self.grab_set()
-        self.conn = conn; self.bid = booking_id
+        self.db = db; self.bid = booking_id
         frm = ttk.Frame(self, padding=10); frm.pack(fill="both", expand=True)
         ttk.Label(frm, text="Service").grid(row=0,column=0)
-        cur = conn.cursor(); cur.execute("SELECT service_id, name, price FROM Service ORDER BY service_id"); services = cur.fetchall(); cur.close()
+        services = (refs or RefCache(db)).rows("service")
         self.services = services
         if not services:
             messagebox.showinfo("Нет услуг", "Добавь услуги на вкладке Services")
@@ -1100,53 +2132,58 @@ class ModalAddServiceToBooking(tk.Toplevel):
             messagebox.showwarning("Выбор", "Выберите услугу"); return
         sid = int(sel.split("-")[0].strip())
         q = max(1, int(self.qty.get()))
-        cur = self.conn.cursor()
         try:
-            for _ in range(q):
-                sbid = safe_next_id(self.conn, "BookingService", "service_b_id")
-                cur.execute("INSERT INTO BookingService (service_b_id, booking_id, service_id) VALUES (%s,%s,%s)", (sbid, self.bid, sid))
+            # одна строка на услугу в брони: повторное добавление увеличивает количество,
+            # цена фиксируется триггером при первом добавлении
+            with self.db.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO BookingService (booking_id, service_id, quantity) VALUES (%s,%s,%s)
+                    ON CONFLICT (booking_id, service_id)
+                    DO UPDATE SET quantity = BookingService.quantity + EXCLUDED.quantity
+                """, (self.bid, sid, q))
             messagebox.showinfo("OK", "Добавлено")
             self.result = True
             self.destroy()
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
-        finally:
-            cur.close()
 
 class ModalBookingDetails(tk.Toplevel):
-    def __init__(self, parent, conn, booking_id, **kw):
+    def __init__(self, parent, db, booking_id, executor=None, **kw):
         super().__init__(parent)
         self.title(f"Details for Booking {booking_id}")
         self.transient(parent); self.grab_set()
-        self.conn = conn; self.bid = booking_id
-        frm = ttk.Frame(self, padding=10); frm.pack(fill="both", expand=True)
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT b.booking_id, r.room_number, b.start_date, b.end_date, b.booking_fee, rt.price
-            FROM Booking b JOIN Room r ON b.room_id=r.room_id JOIN RoomType rt ON r.type_id=rt.type_id
-            WHERE b.booking_id=%s
-        """, (booking_id,))
+        self.db = db; self.bid = booking_id
+        self.parent = parent
+        self.executor = executor or QueryExecutor(self, db, workers=1)
+        self.frm = ttk.Frame(self, padding=10); self.frm.pack(fill="both", expand=True)
+        self.lbl_loading = ttk.Label(self.frm, text="Загрузка...")
+        self.lbl_loading.pack(anchor="w")
+        self.executor.submit(self.load, self.render, self.on_load_error, owner=self)
+        center_window(self, parent)
+
+    def load(self, cur):
+        # тексты запросов — в statements.HOT_STATEMENTS, на соединении они уже подготовлены
+        STATEMENTS.execute(cur, "booking_head", (self.bid,))
         head = cur.fetchone()
-        cur.execute("""SELECT c.client_id, c.full_name, c.passport_number, c.prepayment FROM BookingGuest bg JOIN Client c ON bg.client_id=c.client_id WHERE bg.booking_id=%s ORDER BY c.client_id""", (booking_id,))
+        STATEMENTS.execute(cur, "booking_guests", (self.bid,))
         guests = cur.fetchall()
-        cur.execute("""
-            SELECT s.service_id, s.name, s.price, COUNT(bs.service_b_id) as qty
-            FROM BookingService bs JOIN Service s ON bs.service_id = s.service_id
-            WHERE bs.booking_id=%s
-            GROUP BY s.service_id, s.name, s.price
-            ORDER BY s.service_id
-        """, (booking_id,))
+        STATEMENTS.execute(cur, "booking_services", (self.bid,))
         services = cur.fetchall()
-        cur.close()
+        return head, guests, services
+
+    def on_load_error(self, e):
+        messagebox.showerror("Ошибка БД", str(e))
+        self.destroy()
+
+    def render(self, data):
+        head, guests, services = data
+        frm = self.frm
+        self.lbl_loading.destroy()
         if not head:
             messagebox.showerror("Not found", "Booking not found"); self.destroy(); return
-        bid, room_num, sdate, edate, bfee, price = head
-        nights = (edate - sdate).days
-        room_total = nights * float(price)
-        services_total = sum([float(s[2]) * int(s[3]) for s in services]) if services else 0.0
-        total = room_total + float(bfee or 0.0) + services_total
-        prepayments = sum([float(g[3] or 0.0) for g in guests]) if guests else 0.0
-        diff = round(prepayments - total, 2)
+        # итоги ведутся триггерами в booking_totals, здесь только отображаем
+        bid, room_num, sdate, edate, nights, room_total, services_total, bfee, prepayments, diff = head
+        total = room_total + bfee + services_total
         if abs(diff) <= 1.0:
             note = "OK"
         elif diff > 1.0:
@@ -1171,24 +2208,29 @@ class ModalBookingDetails(tk.Toplevel):
             sid, name, price_s, qty = s
             ts.insert("", "end", values=(sid,name,format_money(price_s),qty,format_money(float(price_s)*int(qty))))
         ttk.Button(frm, text="Close", command=self.destroy).pack(pady=8)
-        center_window(self, parent)
+        center_window(self, self.parent)
 
 class ModalReportFree(tk.Toplevel):
-    def __init__(self, parent, conn, **kw):
+    def __init__(self, parent, db, executor=None, refs=None, avail=None, **kw):
         super().__init__(parent)
         self.title("Отчёт: свободные номера")
         self.transient(parent); self.grab_set()
-        self.conn = conn
+        self.db = db
+        self.executor = executor or QueryExecutor(self, db, workers=1)
+        self.refs = refs or RefCache(db)
+        self.avail = avail
+        self._task = None
         frm = ttk.Frame(self, padding=10); frm.pack(fill="both", expand=True)
         ttk.Label(frm, text="Date YYYY-MM-DD").grid(row=0,column=0)
         self.v_date = tk.StringVar(value=str(date.today()))
         ttk.Entry(frm, textvariable=self.v_date).grid(row=0,column=1)
         ttk.Button(frm, text="Show", command=self.show).grid(row=0,column=2, padx=6)
+        ttk.Button(frm, text="Экспорт CSV", command=self.export).grid(row=0,column=3, padx=6)
         cols = ("room_id","room_number","type","price")
         self.tree = ttk.Treeview(frm, columns=cols, show="headings", height=16)
         for c in cols:
             self.tree.heading(c, text=c); self.tree.column(c, width=140, anchor="center")
-        self.tree.grid(row=1, column=0, columnspan=3, pady=8, sticky="nsew")
+        self.tree.grid(row=1, column=0, columnspan=4, pady=8, sticky="nsew")
         frm.rowconfigure(1, weight=1)
         center_window(self, parent)
         self.show()
@@ -1198,66 +2240,271 @@ class ModalReportFree(tk.Toplevel):
             dt = datetime.strptime(self.v_date.get(), "%Y-%m-%d").date()
         except:
             messagebox.showerror("Ошибка", "Неверная дата"); return
-        cur = self.conn.cursor()
-        cur.execute("""
-            SELECT r.room_id, r.room_number, rt.name, rt.price
-            FROM Room r JOIN RoomType rt ON r.type_id = rt.type_id
-            WHERE r.room_id NOT IN (SELECT room_id FROM Booking WHERE start_date <= %s AND end_date > %s)
-            ORDER BY r.room_id
-        """, (dt,dt))
-        rows = cur.fetchall(); cur.close()
-        self.tree.delete(*self.tree.get_children())
-        for r in rows: self.tree.insert("", "end", values=r)
+
+        def resolve(rows):
+            types = self.refs.index("roomtype", expect={r[2] for r in rows})
+            return [(rid, num, types[tid][1], types[tid][2]) for rid, num, tid in rows if tid in types]
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.avail is not None and self.avail.ready:
+            try:
+                self._fill(resolve(self.avail.free_rooms(dt, dt + timedelta(days=1))))
+            except Exception as e:
+                messagebox.showerror("Ошибка", str(e))
+            return
+
+        def fetch(cur):
+            cur.execute("""
+                SELECT room_id, room_number, type_name, price
+                FROM find_available_rooms(%s, %s)
+            """, (dt, dt + timedelta(days=1)))
+            return cur.fetchall()
+        self._task = self.executor.submit(fetch, self._fill, owner=self)
+
+    def _fill(self, rows):
+        reconcile_tree(self.tree, rows)
+
+    def export(self):
+        try:
+            dt = datetime.strptime(self.v_date.get(), "%Y-%m-%d").date()
+        except ValueError:
+            messagebox.showerror("Ошибка", "Неверная дата"); return
+        export_report(self, self.executor, """
+            SELECT room_id, room_number, type_name, price, capacity
+            FROM find_available_rooms(%s, %s)
+        """, (dt, dt + timedelta(days=1)), f"free_rooms_{dt}")
 
 class ModalReportPayments(tk.Toplevel):
-    def __init__(self, parent, conn, **kw):
+    def __init__(self, parent, db, executor=None, **kw):
         super().__init__(parent)
         self.title("Отчёт: расчёты по оплате (агрег.)")
         self.transient(parent); self.grab_set()
-        self.conn = conn
+        self.db = db
+        self.executor = executor or QueryExecutor(self, db, workers=1)
+        self._task = None
         frm = ttk.Frame(self, padding=10); frm.pack(fill="both", expand=True)
+        top = ttk.Frame(frm); top.pack(fill="x", pady=(0,6))
+        ttk.Label(top, text="С (YYYY-MM-DD)").pack(side="left")
+        self.v_from = tk.StringVar(); ttk.Entry(top, textvariable=self.v_from, width=12).pack(side="left", padx=4)
+        ttk.Label(top, text="По").pack(side="left")
+        self.v_to = tk.StringVar(); ttk.Entry(top, textvariable=self.v_to, width=12).pack(side="left", padx=4)
+        ttk.Button(top, text="Show", command=self.fill).pack(side="left", padx=6)
+        ttk.Button(top, text="Экспорт CSV", command=self.export).pack(side="left", padx=6)
+        ttk.Label(top, text="(пусто — все брони)").pack(side="left")
         self.txt = tk.Text(frm, width=120, height=30)
         self.txt.pack(fill="both", expand=True)
         center_window(self, parent)
         self.fill()
 
+    def period(self):
+        try:
+            d_from = datetime.strptime(self.v_from.get().strip(), "%Y-%m-%d").date() if self.v_from.get().strip() else None
+            d_to = datetime.strptime(self.v_to.get().strip(), "%Y-%m-%d").date() if self.v_to.get().strip() else None
+        except ValueError:
+            messagebox.showerror("Ошибка", "Неверная дата"); return None
+        return d_from, d_to
+
+    def export(self):
+        period = self.period()
+        if period is None:
+            return
+        # списки гостей и услуг выгружаются текстом: "id | имя | ..." через "; "
+        export_report(self, self.executor, """
+            SELECT t.booking_id, t.nights, t.room_total, t.services_total, t.booking_fee,
+                   t.room_total + t.booking_fee + t.services_total AS total, t.prepayments_total, t.balance,
+                   (SELECT string_agg(concat_ws(' | ', g.value->>0, g.value->>1, g.value->>2), '; ') FROM json_array_elements(t.guests) g) AS guests,
+                   (SELECT string_agg(concat_ws(' | ', s.value->>0, s.value->>1, s.value->>2, s.value->>3), '; ') FROM json_array_elements(t.services) s) AS services
+            FROM calc_booking_totals_range(%s, %s) t
+            ORDER BY t.booking_id
+        """, period, "payments_" + "_".join(str(d or "all") for d in period))
+
     def fill(self):
-        cur = self.conn.cursor()
-        cur.execute("SELECT b.booking_id FROM Booking b ORDER BY b.booking_id")
-        bids = [r[0] for r in cur.fetchall()]
+        period = self.period()
+        if period is None:
+            return
+        d_from, d_to = period
+        # итоги, гости и услуги всех броней — одним запросом
+        def fetch(cur):
+            STATEMENTS.execute(cur, "payments_report", (d_from, d_to))
+            return cur.fetchall()
+        if self._task is not None:
+            self._task.cancel()
+        self.txt.delete("1.0", "end")
+        self.txt.insert("1.0", "Загрузка...")
+        self._task = self.executor.submit(fetch, self._render, owner=self)
+
+    def _render(self, rows):
         lines = []
-        for bid in bids:
-            cur.execute("SELECT nights, room_total, services_total, booking_fee, prepayments_total, balance FROM calc_booking_totals(%s)", (bid,))
-            res = cur.fetchone()
-            if not res: continue
-            nights, room_total, services_total, booking_fee, prepayments_total, balance = res
+        for bid, nights, room_total, services_total, booking_fee, prepayments_total, balance, guests, servs in rows:
             total = room_total + (booking_fee or 0) + (services_total or 0)
             note = "OK" if abs(balance) <= 1.0 else ("Переплата" if balance>1.0 else "Недооплата")
             lines.append(f"Booking {bid}: nights={nights} room={format_money(room_total)} services={format_money(services_total)} fee={format_money(booking_fee)} total={format_money(total)} prepayments={format_money(prepayments_total)} => {note}")
-            cur.execute("""SELECT c.client_id, c.full_name, c.prepayment FROM BookingGuest bg JOIN Client c ON bg.client_id=c.client_id WHERE bg.booking_id=%s ORDER BY c.client_id""",(bid,))
-            guests = cur.fetchall()
             for g in guests:
                 lines.append(f"  {g[0]} | {g[1]} | prepay={format_money(g[2])}")
-            cur.execute("""
-                SELECT s.service_id, s.name, s.price, COUNT(bs.service_b_id) as qty
-                FROM BookingService bs JOIN Service s ON bs.service_id=s.service_id
-                WHERE bs.booking_id=%s GROUP BY s.service_id, s.name, s.price
-            """,(bid,))
-            servs = cur.fetchall()
             if servs:
                 lines.append("  Services:")
                 for s in servs:
                     lines.append(f"    {s[0]} | {s[1]} | price={format_money(s[2])} | qty={s[3]} | sum={format_money(float(s[2])*int(s[3]))}")
             lines.append("-"*100)
-        cur.close()
         self.txt.delete("1.0", "end")
         self.txt.insert("1.0", "\n".join(lines))
 
+class ModalImportCsv(tk.Toplevel):
+    """Bulk import of clients, rooms and bookings from CSV files (see importer.py)."""
+    def __init__(self, parent, db, executor=None, **kw):
+        super().__init__(parent)
+        self.title("Импорт из CSV")
+        self.transient(parent); self.grab_set()
+        self.db = db
+        self.executor = executor or QueryExecutor(self, db, workers=1)
+        self.result = False
+        self.errors = []
+        self.files = {}
+        frm = ttk.Frame(self, padding=10); frm.pack(fill="both", expand=True)
+        self.paths = {}
+        for i, (kind, label) in enumerate((("clients", "Клиенты"), ("rooms", "Номера"), ("bookings", "Брони"))):
+            ttk.Label(frm, text=label).grid(row=i, column=0, sticky="w")
+            var = tk.StringVar()
+            ttk.Entry(frm, textvariable=var, width=60).grid(row=i, column=1, padx=4, pady=2)
+            ttk.Button(frm, text="...", width=3, command=lambda v=var: self.pick(v)).grid(row=i, column=2)
+            self.paths[kind] = var
+        self.v_strict = tk.BooleanVar(value=False)
+        ttk.Checkbutton(frm, text="При любой ошибке ничего не загружать", variable=self.v_strict).grid(row=3, column=0, columnspan=3, sticky="w", pady=4)
+        btns = ttk.Frame(frm); btns.grid(row=4, column=0, columnspan=3, sticky="w")
+        self.btn_run = ttk.Button(btns, text="Импортировать", command=self.run)
+        self.btn_run.pack(side="left")
+        self.btn_report = ttk.Button(btns, text="Сохранить отчёт", command=self.save_report, state="disabled")
+        self.btn_report.pack(side="left", padx=6)
+        self.lbl_status = ttk.Label(frm, text="")
+        self.lbl_status.grid(row=5, column=0, columnspan=3, sticky="w", pady=4)
+        cols = importer.REPORT_COLUMNS
+        self.tree = ttk.Treeview(frm, columns=cols, show="headings", height=12)
+        for c, w in zip(cols, (120, 60, 120, 360)):
+            self.tree.heading(c, text=c); self.tree.column(c, width=w, anchor="w")
+        self.tree.grid(row=6, column=0, columnspan=3, sticky="nsew")
+        center_window(self, parent)
+        self.wait_window()
+
+    def pick(self, var):
+        path = filedialog.askopenfilename(parent=self, filetypes=[("CSV", "*.csv"), ("Все файлы", "*.*")])
+        if path:
+            var.set(path)
+
+    def run(self):
+        files = {k: v.get().strip() for k, v in self.paths.items() if v.get().strip()}
+        if not files:
+            messagebox.showwarning("Выбор", "Укажите хотя бы один файл", parent=self)
+            return
+        strict = self.v_strict.get()
+        self.files = files
+        self.btn_run.configure(state="disabled")
+        self.lbl_status.configure(text="Загрузка...")
+        # весь импорт — одна транзакция на соединении из пула; закрытие окна отменяет его
+        self.executor.submit(lambda cur: importer.import_csv(cur.connection, files, strict=strict),
+                             self.on_done, self.on_error, owner=self)
+
+    def on_done(self, res):
+        loaded, errors = res
+        self.btn_run.configure(state="normal")
+        self.result = self.result or any(loaded.values())
+        self.errors = errors
+        status = ", ".join(f"{k}: {n}" for k, n in loaded.items()) or "ничего не загружено"
+        self.lbl_status.configure(text=f"Загружено — {status}; строк с ошибками: {len({(k, l) for k, l, _, _ in errors})}")
+        self.tree.delete(*self.tree.get_children())
+        for kind, line, field, message in errors:
+            self.tree.insert("", "end", values=(os.path.basename(self.files.get(kind, kind)), line, field, message))
+        self.btn_report.configure(state="normal" if errors else "disabled")
+
+    def on_error(self, e):
+        self.btn_run.configure(state="normal")
+        self.lbl_status.configure(text="")
+        messagebox.showerror("Ошибка", str(e), parent=self)
+
+    def save_report(self):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+        if not path:
+            return
+        try:
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                importer.write_report(self.errors, f, self.files)
+        except OSError as e:
+            messagebox.showerror("Ошибка", str(e), parent=self)
+
+class ModalDiagnostics(tk.Toplevel):
+    """Per-screen query timings collected by querylog, refreshed while the window is open."""
+    COLUMNS = ("screen", "statement", "calls", "rows", "errors", "total_ms", "p50", "p95", "p99", "max")
+
+    def __init__(self, parent, stats=None, **kw):
+        super().__init__(parent)
+        self.title("Диагностика запросов")
+        self.transient(parent)
+        self.geometry("1100x520")
+        # окно не модальное: статистика копится, пока с приложением работают
+        self.stats = stats or querylog.STATS
+        self._after = None
+        frm = ttk.Frame(self, padding=10); frm.pack(fill="both", expand=True)
+        top = ttk.Frame(frm); top.pack(fill="x", pady=(0,6))
+        ttk.Label(top, text="Медленный запрос, мс").pack(side="left")
+        self.v_threshold = tk.StringVar(value=f"{self.stats.threshold_ms:g}")
+        ttk.Entry(top, textvariable=self.v_threshold, width=8).pack(side="left", padx=4)
+        ttk.Button(top, text="Применить", command=self.apply_threshold).pack(side="left", padx=6)
+        ttk.Button(top, text="Сбросить", command=self.reset).pack(side="left", padx=6)
+        log = os.path.abspath(self.stats.log_path) if self.stats.log_path else "не ведётся"
+        ttk.Label(top, text=f"Журнал: {log}").pack(side="left", padx=12)
+        self.tree = ttk.Treeview(frm, columns=self.COLUMNS, show="headings", height=20)
+        for c in self.COLUMNS:
+            self.tree.heading(c, text=c)
+            self.tree.column(c, width={"screen": 200, "statement": 380}.get(c, 60),
+                             anchor="w" if c in ("screen", "statement") else "e")
+        self.tree.pack(fill="both", expand=True)
+        ttk.Label(frm, text="Время в мс; перцентили по последним замерам каждой пары экран/запрос.").pack(anchor="w", pady=(4,0))
+        self.bind("<Destroy>", self._on_destroy)
+        center_window(self, parent)
+        self.refresh()
+
+    def refresh(self):
+        self._after = None
+        rows = self.stats.snapshot()
+        self.tree.delete(*self.tree.get_children())
+        for r in rows:
+            self.tree.insert("", "end", values=tuple(r[c] for c in self.COLUMNS))
+        self._after = self.after(DIAGNOSTICS_REFRESH_MS, self.refresh)
+
+    def apply_threshold(self):
+        try:
+            ms = float(self.v_threshold.get().replace(",", "."))
+            if ms < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Ошибка", "Порог — неотрицательное число миллисекунд", parent=self)
+            return
+        self.stats.threshold_ms = ms
+
+    def reset(self):
+        self.stats.reset()
+        self.tree.delete(*self.tree.get_children())
+
+    def _on_destroy(self, event):
+        if event.widget is self and self._after is not None:
+            self.after_cancel(self._after)
+            self._after = None
+
 # ----------------- App entry -----------------
 def is_guest_user(user):
     user = (user or "").lower()
     return user.startswith("guest") or user == "guest_user"
 
+def run_migrations(conn):
+    # новые миграции схемы применяются при входе администратора
+    try:
+        applied = migrate.migrate(conn)
+    except Exception as e:
+        messagebox.showwarning("Миграции", f"Схема БД не обновлена: {e}")
+        return
+    if applied:
+        messagebox.showinfo("Миграции", "Применены миграции:\n" + "\n".join(f"{v:03d} {n}" for v, n in applied))
+
 def main():
     root = tk.Tk()
     root.update_idletasks()
@@ -1268,15 +2515,19 @@ def main():
         except: pass
         return
     params = login.result
+    if params.get("user","").startswith("admin"):
+        run_migrations(login.conn)
     try: root.destroy()
     except: pass
     if is_guest_user(params.get("user","")):
         guest_root = tk.Tk()
         guest_root.withdraw()
-        gv = GuestView(guest_root, params)
+        gv = GuestView(guest_root, params, conn=login.conn)
         guest_root.mainloop()
     else:
-        app = MainApp(params)
+        app = MainApp(params, conn=login.conn)
+        if app.db is None:
+            return      # подключиться не удалось, окно уже закрыто
         app.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,119 @@
+# booking_overlap.py — сравнение скорости вставки броней: старый триггер с COUNT(*)
+# (fn_check_booking_overlap) против ограничения EXCLUDE USING gist.
+#
+# Всё создаётся во временной схеме bench_overlap и удаляется после прогона,
+# рабочие таблицы не затрагиваются. Нужен btree_gist (миграция 007).
+#
+#   python bench/booking_overlap.py --dsn "host=localhost dbname=AD_hotel user=admin_user password=admin123"
+import argparse
+import json
+import time
+
+import psycopg2
+
+SCHEMA = "bench_overlap"
+
+VARIANTS = {
+    # как было: BEFORE-триггер считает пересечения без индекса
+    "trigger": """
+        CREATE TABLE booking_trigger (
+            booking_id integer GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            room_id integer NOT NULL,
+            start_date date NOT NULL,
+            end_date date NOT NULL
+        );
+        CREATE FUNCTION check_overlap() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            cnt INT;
+        BEGIN
+            SELECT COUNT(*) INTO cnt
+            FROM booking_trigger b
+            WHERE b.room_id = NEW.room_id
+              AND b.booking_id <> COALESCE(NEW.booking_id, -1)
+              AND (NEW.start_date < b.end_date AND NEW.end_date > b.start_date);
+            IF cnt > 0 THEN
+                RAISE EXCEPTION 'overlap';
+            END IF;
+            RETURN NEW;
+        END;
+        $$;
+        CREATE TRIGGER trg_check_overlap BEFORE INSERT OR UPDATE ON booking_trigger
+            FOR EACH ROW EXECUTE FUNCTION check_overlap();
+    """,
+    # как стало: ограничение booking_no_overlap
+    "exclude": """
+        CREATE TABLE booking_exclude (
+            booking_id integer GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            room_id integer NOT NULL,
+            start_date date NOT NULL,
+            end_date date NOT NULL,
+            EXCLUDE USING gist (room_id WITH =, daterange(start_date, end_date) WITH &&)
+        );
+    """,
+}
+
+def seed(cur, table, rooms, bookings):
+    # непересекающиеся брони: k-я бронь номера k % rooms, по 2 ночи через каждые 3 дня
+    cur.execute(f"""
+        ALTER TABLE {table} DISABLE TRIGGER USER;
+        INSERT INTO {table} (room_id, start_date, end_date)
+        SELECT k %% %s + 1, DATE '2000-01-01' + (k / %s) * 3, DATE '2000-01-01' + (k / %s) * 3 + 2
+        FROM generate_series(0, %s - 1) k;
+        ALTER TABLE {table} ENABLE TRIGGER USER;
+        ANALYZE {table};
+    """, (rooms, rooms, rooms, bookings))
+
+def run_inserts(cur, table, rooms, bookings, inserts):
+    # новые брони после уже существующих — каждая своей транзакцией, как из мастера
+    first_day = (bookings // rooms + 1) * 3
+    started = time.perf_counter()
+    for k in range(inserts):
+        day = first_day + (k // rooms) * 3
+        cur.execute(f"""
+            INSERT INTO {table} (room_id, start_date, end_date)
+            VALUES (%s, DATE '2000-01-01' + %s, DATE '2000-01-01' + %s)
+        """, (k % rooms + 1, day, day + 2))
+    return time.perf_counter() - started
+
+def main():
+    ap = argparse.ArgumentParser(description="Booking insert throughput: overlap trigger vs EXCLUDE constraint")
+    ap.add_argument("--dsn", default="host=localhost dbname=AD_hotel user=admin_user password=admin123")
+    ap.add_argument("--rooms", type=int, default=500)
+    ap.add_argument("--bookings", type=int, default=100000, help="броней в таблице до замера")
+    ap.add_argument("--inserts", type=int, default=2000, help="замеряемых вставок")
+    ap.add_argument("--json", action="store_true", help="вывод в JSON")
+    args = ap.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    results = {}
+    try:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+        cur.execute(f"SET search_path TO {SCHEMA}, public")
+        for name, ddl in VARIANTS.items():
+            table = f"booking_{name}"
+            cur.execute(ddl)
+            seed(cur, table, args.rooms, args.bookings)
+            elapsed = run_inserts(cur, table, args.rooms, args.bookings, args.inserts)
+            results[name] = {
+                "seconds": round(elapsed, 3),
+                "inserts_per_sec": round(args.inserts / elapsed, 1),
+                "ms_per_insert": round(elapsed * 1000 / args.inserts, 3),
+            }
+    finally:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+    report = {"rooms": args.rooms, "bookings": args.bookings, "inserts": args.inserts, "results": results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.bookings} броней в {args.rooms} номерах, {args.inserts} вставок:")
+    for name, r in results.items():
+        print(f"  {name:8} {r['inserts_per_sec']:>10} вставок/с  {r['ms_per_insert']:>8} мс/вставка")
+    if "trigger" in results and "exclude" in results:
+        print(f"  ускорение: x{results['trigger']['seconds'] / results['exclude']['seconds']:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# prepared_statements.py — сколько экономят подготовленные запросы (statements.py) на
+# отчёте по оплатам и на деталях брони: обычный cursor.execute текста против
+# PREPARE один раз + EXECUTE по имени на каждом вызове.
+#
+# Для каждого случая меряется время вызова с клиента и время планирования на сервере
+# (Planning Time из EXPLAIN ANALYZE). Данные не меняются, нужна заполненная база.
+#
+#   python bench/prepared_statements.py --dsn "host=localhost dbname=AD_hotel user=admin_user password=admin123"
+import argparse
+import json
+import os
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from statements import HOT_STATEMENTS, PreparedStatements
+
+# случай -> запросы одного вызова экрана
+CASES = {
+    "payments_report": ["payments_report"],
+    "booking_details": ["booking_head", "booking_guests", "booking_services"],
+}
+
+def sample_params(cur, days, bookings):
+    # период отчёта — последние days дней данных, брони — с наибольшим числом гостей и услуг
+    cur.execute("SELECT max(end_date) FROM Booking")
+    last = cur.fetchone()[0]
+    if last is None:
+        raise SystemExit("в таблице Booking нет данных")
+    cur.execute("""
+        SELECT b.booking_id FROM Booking b
+        ORDER BY b.guest_count + (SELECT count(*) FROM BookingService bs WHERE bs.booking_id = b.booking_id) DESC,
+                 b.booking_id
+        LIMIT %s
+    """, (bookings,))
+    ids = [r[0] for r in cur.fetchall()]
+    cur.execute("SELECT %s::date - %s, %s::date", (last, days, last))
+    period = cur.fetchone()
+    return {
+        "payments_report": [period],
+        "booking_details": [(bid,) for bid in ids],
+    }
+
+def run(conn, registry, names, params, calls):
+    cur = conn.cursor()
+    started = time.perf_counter()
+    for k in range(calls):
+        p = params[k % len(params)]
+        for name in names:
+            if registry is None:
+                cur.execute(HOT_STATEMENTS[name], p)
+            else:
+                registry.execute(cur, name, p)
+            cur.fetchall()
+    elapsed = time.perf_counter() - started
+    cur.close()
+    return elapsed
+
+def planning_ms(conn, names, params, samples):
+    # средний Planning Time одного вызова: у подготовленного запроса план берётся из кэша
+    cur = conn.cursor()
+    registry = PreparedStatements(HOT_STATEMENTS)
+    total = {"plain": 0.0, "prepared": 0.0}
+    for name in names:
+        call = registry.prepare(cur, name)
+        # первые пять выполнений сервер планирует заново, потом решает, брать ли общий план
+        for k in range(5):
+            cur.execute(call, params[k % len(params)])
+        for k in range(samples):
+            p = params[k % len(params)]
+            cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + HOT_STATEMENTS[name], p)
+            total["plain"] += cur.fetchone()[0][0]["Planning Time"]
+            cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + call, p)
+            total["prepared"] += cur.fetchone()[0][0]["Planning Time"]
+    cur.execute("DEALLOCATE ALL")
+    cur.close()
+    return {mode: round(ms / (samples * len(names)), 3) for mode, ms in total.items()}
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-call cost of hot queries: plain execute vs prepared statements")
+    ap.add_argument("--dsn", default="host=localhost dbname=AD_hotel user=admin_user password=admin123")
+    ap.add_argument("--calls", type=int, default=500, help="замеряемых вызовов на случай")
+    ap.add_argument("--days", type=int, default=30, help="длина периода отчёта по оплатам")
+    ap.add_argument("--bookings", type=int, default=50, help="сколько разных броней открывать в деталях")
+    ap.add_argument("--samples", type=int, default=20, help="EXPLAIN ANALYZE на запрос для Planning Time")
+    ap.add_argument("--json", action="store_true", help="вывод в JSON")
+    args = ap.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    results = {}
+    try:
+        params = sample_params(conn.cursor(), args.days, args.bookings)
+        for case, names in CASES.items():
+            # прогрев: кэш каталога и страниц таблиц одинаков для обоих вариантов
+            run(conn, None, names, params[case], min(args.calls, 20))
+            plain = run(conn, None, names, params[case], args.calls)
+            # первый вызов на соединении включает PREPARE — как в приложении
+            prepared = run(conn, PreparedStatements(HOT_STATEMENTS), names, params[case], args.calls)
+            conn.cursor().execute("DEALLOCATE ALL")
+            results[case] = {
+                "plain_ms_per_call": round(plain * 1000 / args.calls, 3),
+                "prepared_ms_per_call": round(prepared * 1000 / args.calls, 3),
+                "planning_ms": planning_ms(conn, names, params[case], args.samples),
+            }
+    finally:
+        conn.close()
+
+    report = {"calls": args.calls, "days": args.days, "bookings": args.bookings, "results": results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.calls} вызовов на случай:")
+    for case, r in results.items():
+        saved = r["plain_ms_per_call"] - r["prepared_ms_per_call"]
+        print(f"  {case:16} обычный {r['plain_ms_per_call']:>8} мс  подготовленный {r['prepared_ms_per_call']:>8} мс"
+              f"  экономия {saved:.3f} мс/вызов")
+        print(f"  {'':16} планирование: {r['planning_ms']['plain']} мс -> {r['planning_ms']['prepared']} мс")
+
+if __name__ == "__main__":
+    main()
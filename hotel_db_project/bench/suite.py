@@ -0,0 +1,291 @@
+# suite.py — воспроизводимый замер экранов приложения на сгенерированных данных.
+#
+# Рабочая база не трогается: создаётся её копия (CREATE DATABASE ... TEMPLATE, к исходной
+# базе в этот момент никто не должен быть подключён), таблицы в копии очищаются и заново
+# заполняются в заданном масштабе, после прогона копия удаляется. Замеряются те же
+# запросы, что выполняют экраны app.py: тексты берутся из statements.py, которым пользуется
+# и само приложение, и выполняются подготовленными, как в приложении:
+#
+#   refresh_rooms / refresh_clients / refresh_bookings   первая страница таблицы
+#   client_search      поиск клиента по части ФИО и по началу паспорта
+#   availability       свободные номера на случайный период (мастер брони)
+#   booking_details    три запроса ModalBookingDetails.load
+#   payments_report    ModalReportPayments.fill за --report-days дней
+#   create_booking     бронь и гости одной транзакцией, как ModalBookingWizard.create_booking
+#
+# Результат — JSON (--output). С --baseline медианы сравниваются с эталоном, и при
+# замедлении больше допуска скрипт завершается с кодом 1:
+#
+#   python bench/suite.py --rooms 500 --clients 20000 --bookings 100000 --output bench/baseline.json
+#   python bench/suite.py --rooms 500 --clients 20000 --bookings 100000 --baseline bench/baseline.json
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import psycopg2
+from psycopg2 import errors, extensions, sql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from statements import CLIENT_SEARCH, CLIENT_SEARCH_LIMIT, GRID_PAGE_SIZE, STATEMENTS, search_params
+
+DEFAULT_DSN = "host=localhost port=5432 dbname=AD_hotel user=admin_user password=admin123"
+
+CASES = ("refresh_rooms", "refresh_clients", "refresh_bookings", "client_search", "availability",
+         "booking_details", "payments_report", "create_booking")
+
+SURNAMES = ["Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Васильев", "Соколов",
+            "Михайлов", "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов"]
+
+def create_bench_db(dsn, name):
+    source = extensions.parse_dsn(dsn).get("dbname")
+    if not source or source == name:
+        raise SystemExit("--bench-db должна отличаться от базы в --dsn")
+    conn = psycopg2.connect(dsn, dbname="postgres")
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(name)))
+            cur.execute(sql.SQL("CREATE DATABASE {} TEMPLATE {}").format(sql.Identifier(name), sql.Identifier(source)))
+    except errors.ObjectInUse:
+        raise SystemExit(f"к базе {source} есть подключения — закройте приложение и повторите")
+    finally:
+        conn.close()
+
+def drop_bench_db(dsn, name):
+    conn = psycopg2.connect(dsn, dbname="postgres")
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(name)))
+    finally:
+        conn.close()
+
+def seed(conn, args, base):
+    # k-я бронь — номер k % rooms, по 2 ночи через каждые 3 дня начиная с base: брони
+    # не пересекаются и ложатся вокруг сегодняшнего дня; цены и итоги считают триггеры
+    with conn.cursor() as cur:
+        cur.execute("""
+            TRUNCATE BookingService, BookingGuest, booking_totals, Booking, Room, RoomType, Client, Service
+            RESTART IDENTITY CASCADE;
+            INSERT INTO RoomType (name, price, capacity)
+            SELECT 'Тип ' || k, 2000 + k * 500, k %% 4 + 1 FROM generate_series(1, %(types)s) k;
+            INSERT INTO Room (type_id, room_number, status, week_day_rate)
+            SELECT k %% %(types)s + 1, lpad(k::text, 5, '0'), 'свободен', 100 FROM generate_series(1, %(rooms)s) k;
+            INSERT INTO Client (full_name, passport_number, prepayment)
+            SELECT (%(surnames)s::text[])[k %% array_length(%(surnames)s::text[], 1) + 1] || ' ' || k,
+                   lpad(k::text, 10, '0'), (k %% 50) * 100
+            FROM generate_series(1, %(clients)s) k;
+            INSERT INTO Service (name, price, description)
+            SELECT 'Услуга ' || k, 100 * k, 'описание ' || k FROM generate_series(1, %(services)s) k;
+            INSERT INTO Booking (room_id, start_date, end_date, booking_fee)
+            SELECT k %% %(rooms)s + 1, %(base)s::date + (k / %(rooms)s) * 3, %(base)s::date + (k / %(rooms)s) * 3 + 2, NULL
+            FROM generate_series(0, %(bookings)s - 1) k;
+            -- от 1 до 3 разных гостей, но не больше вместимости номера
+            INSERT INTO BookingGuest (booking_id, client_id)
+            SELECT b.booking_id, (b.booking_id * 7 + g * (%(clients)s / 3 + 1)) %% %(clients)s + 1
+            FROM Booking b JOIN Room r ON r.room_id = b.room_id JOIN RoomType rt ON rt.type_id = r.type_id,
+                 generate_series(0, least(rt.capacity, b.booking_id %% 3 + 1) - 1) g;
+            -- услуги у каждой второй брони
+            INSERT INTO BookingService (booking_id, service_id, quantity)
+            SELECT b.booking_id, (b.booking_id + j) %% %(services)s + 1, j + 1
+            FROM Booking b, generate_series(0, least(%(services)s, 2) - 1) j
+            WHERE b.booking_id %% 2 = 0;
+            ANALYZE;
+        """, dict(types=args.types, rooms=args.rooms, clients=args.clients, services=args.services,
+                  bookings=args.bookings, base=base, surnames=SURNAMES))
+    conn.commit()
+
+class Screens:
+    """One call of every timed screen against the seeded database."""
+    def __init__(self, conn, args, base, span, prepared=True):
+        self.conn = conn
+        self.args = args
+        self.base = base
+        self.span = span
+        self.rng = random.Random(args.seed)
+        self.prepared = prepared
+        self.cur = conn.cursor()
+        self.cur.execute("""
+            SELECT r.room_id, rt.capacity FROM Room r JOIN RoomType rt ON rt.type_id = r.type_id ORDER BY r.room_id
+        """)
+        self.capacity = self.cur.fetchall()
+        self.next_day = span + 3      # новые брони — после всех сгенерированных
+        self.created = 0
+
+    def execute(self, name, params):
+        if self.prepared:
+            STATEMENTS.execute(self.cur, name, params)
+        else:
+            STATEMENTS.execute_plain(self.cur, name, params)
+
+    def run(self, name, params):
+        self.execute(name, params)
+        return self.cur.fetchall()
+
+    def refresh_rooms(self):
+        self.run("rooms_grid_first", (GRID_PAGE_SIZE,))
+
+    def refresh_clients(self):
+        self.run("clients_grid_first", (GRID_PAGE_SIZE,))
+
+    def refresh_bookings(self):
+        self.run("bookings_grid_first", (GRID_PAGE_SIZE,))
+
+    def client_search(self):
+        # как search_clients в app.py: по очереди часть фамилии и начало номера паспорта
+        if self.rng.random() < 0.5:
+            text = self.rng.choice(SURNAMES)[:self.rng.randint(3, 5)].lower()
+        else:
+            text = str(self.rng.randint(1, self.args.clients)).zfill(10)[:self.rng.randint(4, 7)]
+        kind, params = search_params(text, CLIENT_SEARCH_LIMIT)
+        self.cur.execute(CLIENT_SEARCH[kind], params)
+        self.cur.fetchall()
+
+    def availability(self):
+        start = self.base + timedelta(days=self.rng.randrange(max(1, self.span)))
+        end = start + timedelta(days=self.rng.randint(1, 7))
+        self.run("free_rooms", (start, end, self.rng.randint(1, 3)))
+
+    def booking_details(self):
+        bid = self.rng.randint(1, self.args.bookings)
+        self.run("booking_head", (bid,))
+        self.run("booking_guests", (bid,))
+        self.run("booking_services", (bid,))
+
+    def payments_report(self):
+        mid = self.base + timedelta(days=self.span // 2)
+        half = timedelta(days=self.args.report_days // 2)
+        self.run("payments_report", (mid - half, mid + half))
+
+    def create_booking(self):
+        room_id, capacity = self.capacity[self.created % len(self.capacity)]
+        start = self.base + timedelta(days=self.next_day + (self.created // len(self.capacity)) * 3)
+        guests = self.rng.sample(range(1, self.args.clients + 1), self.rng.randint(1, capacity))
+        self.created += 1
+        self.conn.autocommit = False
+        try:
+            bid = self.run("create_booking", (room_id, start, start + timedelta(days=2), None))[0][0]
+            self.execute("add_booking_guests", (bid, guests))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self.conn.autocommit = True
+
+def measure(fn, warmup, repeat):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "calls": repeat,
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[max(0, math.ceil(0.95 * len(samples)) - 1)], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "min_ms": round(samples[0], 3),
+    }
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    """[(case, baseline p50, current p50, ratio, regressed?)] for cases present in both."""
+    rows = []
+    for case, r in report["results"].items():
+        b = baseline.get("results", {}).get(case)
+        if not b:
+            continue
+        before, after = b["p50_ms"], r["p50_ms"]
+        ratio = after / before if before else float("inf")
+        # на быстрых запросах доли миллисекунды — шум, а не регрессия
+        regressed = ratio > 1 + tolerance and after - before > min_delta_ms
+        rows.append((case, before, after, ratio, regressed))
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark app screens on a seeded copy of the database")
+    ap.add_argument("--dsn", default=os.environ.get("HOTEL_DSN", DEFAULT_DSN), help="исходная база (шаблон схемы)")
+    ap.add_argument("--bench-db", default="AD_hotel_bench", help="имя временной копии")
+    ap.add_argument("--keep", action="store_true", help="не удалять копию после прогона")
+    ap.add_argument("--types", type=int, default=5)
+    ap.add_argument("--rooms", type=int, default=200)
+    ap.add_argument("--clients", type=int, default=5000)
+    ap.add_argument("--bookings", type=int, default=20000)
+    ap.add_argument("--services", type=int, default=20)
+    ap.add_argument("--report-days", type=int, default=30, help="период отчёта по оплатам")
+    ap.add_argument("--repeat", type=int, default=200, help="замеряемых вызовов на экран")
+    ap.add_argument("--warmup", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=1, help="зерно случайных периодов и броней")
+    ap.add_argument("--no-prepare", action="store_true", help="обычный execute вместо подготовленных запросов")
+    ap.add_argument("--only", nargs="+", choices=CASES, help="замерить только эти экраны")
+    ap.add_argument("--output", help="куда записать результаты (JSON)")
+    ap.add_argument("--baseline", help="эталонный файл результатов для сравнения")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="допустимое замедление медианы, доля")
+    ap.add_argument("--min-delta-ms", type=float, default=0.5, help="меньшее замедление не считается регрессией")
+    args = ap.parse_args()
+    if args.clients < 4 or args.rooms < 1 or args.types < 1 or args.services < 1 or args.bookings < 1:
+        ap.error("нужны хотя бы 1 тип, номер, услуга, бронь и 4 клиента")
+
+    span = math.ceil(args.bookings / args.rooms) * 3
+    base = date.today() - timedelta(days=span // 2)
+    create_bench_db(args.dsn, args.bench_db)
+    try:
+        conn = psycopg2.connect(args.dsn, dbname=args.bench_db)
+        try:
+            started = time.perf_counter()
+            seed(conn, args, base)
+            seed_seconds = time.perf_counter() - started
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SHOW server_version")
+                server = cur.fetchone()[0]
+            screens = Screens(conn, args, base, span, prepared=not args.no_prepare)
+            results = {}
+            for case in args.only or CASES:
+                results[case] = measure(getattr(screens, case), args.warmup, args.repeat)
+        finally:
+            conn.close()
+    finally:
+        if not args.keep:
+            drop_bench_db(args.dsn, args.bench_db)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "server_version": server,
+        "scale": {k: getattr(args, k) for k in ("types", "rooms", "clients", "bookings", "services")},
+        "repeat": args.repeat,
+        "prepared": not args.no_prepare,
+        "seed_seconds": round(seed_seconds, 1),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+
+    print(f"масштаб {report['scale']}, заполнение {report['seed_seconds']} с, {args.repeat} вызовов на экран:")
+    for case, r in results.items():
+        print(f"  {case:18} p50 {r['p50_ms']:>9} мс  p95 {r['p95_ms']:>9} мс  min {r['min_ms']:>9} мс")
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("scale") != report["scale"] or baseline.get("prepared") != report["prepared"]:
+        print("внимание: эталон снят в другом масштабе или режиме — сравнение ориентировочное")
+    failed = 0
+    print(f"сравнение с {args.baseline} (допуск +{args.tolerance:.0%}):")
+    for case, before, after, ratio, regressed in compare(report, baseline, args.tolerance, args.min_delta_ms):
+        print(f"  {'FAIL' if regressed else 'OK  '} {case:18} {before:>9} -> {after:>9} мс  x{ratio:.2f}")
+        failed += regressed
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,296 @@
+# importer.py — массовая загрузка клиентов, номеров и броней из CSV.
+# Файл потоком идёт через COPY ... FROM STDIN во временную таблицу, проверяется там целиком
+# (паспорта — по домену dm_passport, пересечения броней — одним запросом на весь файл),
+# и всё прошедшее проверку переносится в рабочие таблицы одной транзакцией. Строки с
+# ошибками не загружаются и попадают в отчёт: файл, номер строки, поле, причина.
+#
+#   python importer.py --clients clients.csv --rooms rooms.csv --bookings bookings.csv
+#   python importer.py --bookings bookings.csv --report errors.csv --strict
+#
+# Первая строка файла — заголовок, порядок столбцов любой:
+#   clients:  full_name, passport_number[, prepayment]
+#   rooms:    room_number, type[, week_day_rate]             type — id или название типа
+#   bookings: room_number, start_date, end_date, guests[, booking_fee]
+#             guests — паспорта гостей через ';' (клиенты из базы или из этого же импорта),
+#             пустой booking_fee считает триггер trg_set_booking_fee
+# Файлы загружаются в порядке clients, rooms, bookings, так что брони могут ссылаться
+# на клиентов и номера из того же запуска.
+import argparse
+import csv
+import os
+import sys
+
+import psycopg2
+
+DEFAULT_DSN = "host=localhost port=5432 dbname=AD_hotel user=admin_user password=admin123"
+
+REPORT_COLUMNS = ("file", "line", "field", "message")
+
+class CsvImportError(Exception):
+    pass
+
+def _ok(kind, alias="s"):
+    # строка ещё без ошибок
+    return f"NOT EXISTS (SELECT 1 FROM import_errors e WHERE e.kind = '{kind}' AND e.line = {alias}.line)"
+
+def _dup(table, expr):
+    # все вхождения значения, кроме первого по файлу
+    return f"""s.line IN (SELECT line FROM (SELECT line, row_number() OVER (PARTITION BY {expr} ORDER BY line) AS rn
+                                          FROM {table} WHERE {expr} <> '') d WHERE d.rn > 1)"""
+
+# line — номер строки в файле (заголовок — строка 1); COPY пишет строки по порядку
+KINDS = {
+    "clients": {
+        "columns": ("full_name", "passport_number", "prepayment"),
+        "required": ("full_name", "passport_number"),
+        "stage": """
+            CREATE TEMP TABLE import_clients (
+                line integer GENERATED ALWAYS AS IDENTITY (START WITH 2),
+                full_name text, passport_number text, prepayment text
+            ) ON COMMIT DROP
+        """,
+        "prepare": [],
+        "checks": [
+            ("full_name", "пустое ФИО", "COALESCE(btrim(s.full_name), '') = ''"),
+            ("full_name", "ФИО длиннее 100 символов", "length(btrim(s.full_name)) > 100"),
+            ("passport_number", "паспорт не соответствует формату dm_passport",
+             "NOT COALESCE(pg_input_is_valid(btrim(s.passport_number), 'dm_passport'), false)"),
+            ("prepayment", "предоплата — не число",
+             "NULLIF(btrim(s.prepayment), '') IS NOT NULL AND NOT pg_input_is_valid(btrim(s.prepayment), 'numeric(10,2)')"),
+            ("passport_number", "паспорт повторяется в файле", _dup("import_clients", "btrim(passport_number)")),
+            ("passport_number", "клиент с таким паспортом уже есть",
+             "EXISTS (SELECT 1 FROM Client c WHERE c.passport_number = btrim(s.passport_number))"),
+        ],
+        "merge": [f"""
+            INSERT INTO Client (full_name, passport_number, prepayment)
+            SELECT btrim(s.full_name), btrim(s.passport_number), COALESCE(NULLIF(btrim(s.prepayment), '')::numeric(10,2), 0)
+            FROM import_clients s WHERE {_ok("clients")}
+            ORDER BY s.line
+        """],
+    },
+    "rooms": {
+        "columns": ("room_number", "type", "week_day_rate"),
+        "required": ("room_number", "type"),
+        "stage": """
+            CREATE TEMP TABLE import_rooms (
+                line integer GENERATED ALWAYS AS IDENTITY (START WITH 2),
+                room_number text, type text, week_day_rate text,
+                type_id integer
+            ) ON COMMIT DROP
+        """,
+        "prepare": ["""
+            UPDATE import_rooms s SET type_id = rt.type_id
+            FROM RoomType rt
+            WHERE rt.type_id::text = btrim(s.type) OR lower(rt.name) = lower(btrim(s.type))
+        """],
+        "checks": [
+            ("room_number", "пустой номер комнаты", "COALESCE(btrim(s.room_number), '') = ''"),
+            ("room_number", "номер комнаты длиннее 10 символов", "length(btrim(s.room_number)) > 10"),
+            ("type", "тип номера не найден", "s.type_id IS NULL"),
+            ("week_day_rate", "ставка — не целое число",
+             "NULLIF(btrim(s.week_day_rate), '') IS NOT NULL AND NOT pg_input_is_valid(btrim(s.week_day_rate), 'integer')"),
+            ("room_number", "номер комнаты повторяется в файле", _dup("import_rooms", "btrim(room_number)")),
+            ("room_number", "номер комнаты уже есть",
+             "EXISTS (SELECT 1 FROM Room r WHERE r.room_number = btrim(s.room_number))"),
+        ],
+        "merge": [f"""
+            INSERT INTO Room (type_id, room_number, status, week_day_rate)
+            SELECT s.type_id, btrim(s.room_number), 'свободен', COALESCE(NULLIF(btrim(s.week_day_rate), '')::integer, 100)
+            FROM import_rooms s WHERE {_ok("rooms")}
+            ORDER BY s.line
+        """],
+    },
+    "bookings": {
+        "columns": ("room_number", "start_date", "end_date", "guests", "booking_fee"),
+        "required": ("room_number", "start_date", "end_date", "guests"),
+        "stage": """
+            CREATE TEMP TABLE import_bookings (
+                line integer GENERATED ALWAYS AS IDENTITY (START WITH 2),
+                room_number text, start_date text, end_date text, guests text, booking_fee text,
+                room_id integer, capacity integer, d_start date, d_end date, booking_id integer
+            ) ON COMMIT DROP;
+            CREATE TEMP TABLE import_booking_guests (
+                line integer, ord bigint, passport text, client_id integer
+            ) ON COMMIT DROP
+        """,
+        "prepare": [
+            """UPDATE import_bookings s SET room_id = r.room_id, capacity = rt.capacity
+               FROM Room r JOIN RoomType rt ON rt.type_id = r.type_id
+               WHERE r.room_number = btrim(s.room_number)""",
+            "UPDATE import_bookings SET d_start = btrim(start_date)::date WHERE pg_input_is_valid(btrim(start_date), 'date')",
+            "UPDATE import_bookings SET d_end = btrim(end_date)::date WHERE pg_input_is_valid(btrim(end_date), 'date')",
+            """INSERT INTO import_booking_guests (line, ord, passport)
+               SELECT s.line, g.ord, btrim(g.p)
+               FROM import_bookings s, unnest(string_to_array(s.guests, ';')) WITH ORDINALITY AS g(p, ord)
+               WHERE btrim(g.p) <> ''""",
+            """UPDATE import_booking_guests g SET client_id = c.client_id
+               FROM Client c WHERE c.passport_number = g.passport""",
+        ],
+        "checks": [
+            ("room_number", "номер комнаты не найден", "s.room_id IS NULL"),
+            ("start_date", "неверная дата заезда (YYYY-MM-DD)", "s.d_start IS NULL"),
+            ("end_date", "неверная дата выезда (YYYY-MM-DD)", "s.d_end IS NULL"),
+            ("end_date", "выезд не позже заезда", "s.d_start >= s.d_end"),
+            ("booking_fee", "сбор — не число",
+             "NULLIF(btrim(s.booking_fee), '') IS NOT NULL AND NOT pg_input_is_valid(btrim(s.booking_fee), 'numeric(10,2)')"),
+            ("guests", "не указаны гости", "NOT EXISTS (SELECT 1 FROM import_booking_guests g WHERE g.line = s.line)"),
+            ("guests", "гость не найден по паспорту",
+             "EXISTS (SELECT 1 FROM import_booking_guests g WHERE g.line = s.line AND g.client_id IS NULL)"),
+            ("guests", "гость указан дважды",
+             "EXISTS (SELECT 1 FROM import_booking_guests g WHERE g.line = s.line GROUP BY g.passport HAVING COUNT(*) > 1)"),
+            ("guests", "гостей больше вместимости номера",
+             "(SELECT COUNT(*) FROM import_booking_guests g WHERE g.line = s.line) > s.capacity"),
+            # пересечения — только среди строк без других ошибок, по индексу booking_no_overlap
+            ("start_date", "пересекается с существующей бронью номера",
+             f"""{_ok("bookings")} AND EXISTS (SELECT 1 FROM Booking b WHERE b.room_id = s.room_id
+                                             AND daterange(b.start_date, b.end_date) && daterange(s.d_start, s.d_end))"""),
+            # бронь пересекается с более ранними по заезду, если заезд раньше самого позднего их выезда
+            ("start_date", "пересекается с другой бронью этого номера в файле",
+             f"""s.line IN (SELECT line FROM (
+                     SELECT v.line, v.d_start, max(v.d_end) OVER (PARTITION BY v.room_id ORDER BY v.d_start, v.line
+                                                        ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) AS prev_end
+                     FROM import_bookings v WHERE {_ok("bookings", "v")}) d
+                 WHERE d.prev_end > d.d_start)"""),
+        ],
+        "merge": [
+            # id броней выдаём заранее, чтобы сразу связать с ними гостей
+            f"""UPDATE import_bookings s SET booking_id = nextval(pg_get_serial_sequence('public.booking', 'booking_id'))
+                WHERE {_ok("bookings")}""",
+            """INSERT INTO Booking (booking_id, room_id, start_date, end_date, booking_fee)
+               SELECT s.booking_id, s.room_id, s.d_start, s.d_end, NULLIF(btrim(s.booking_fee), '')::numeric(10,2)
+               FROM import_bookings s WHERE s.booking_id IS NOT NULL
+               ORDER BY s.line""",
+            """INSERT INTO BookingGuest (booking_id, client_id)
+               SELECT s.booking_id, g.client_id
+               FROM import_bookings s JOIN import_booking_guests g ON g.line = s.line
+               WHERE s.booking_id IS NOT NULL
+               ORDER BY s.line, g.ord""",
+        ],
+    },
+}
+
+def read_header(f, delimiter=","):
+    """Column names from the first line of f; f is left positioned on the first data line."""
+    line = f.readline()
+    header = next(csv.reader([line], delimiter=delimiter), [])
+    return [h.strip().lower() for h in header]
+
+def _stage(cur, kind, f, delimiter):
+    spec = KINDS[kind]
+    header = read_header(f, delimiter)
+    unknown = [h for h in header if h not in spec["columns"]]
+    missing = [c for c in spec["required"] if c not in header]
+    if unknown or missing or len(set(header)) != len(header):
+        raise CsvImportError(f"{kind}: неверный заголовок {header}; нужны столбцы {', '.join(spec['required'])}"
+                             + (f", можно ещё {', '.join(c for c in spec['columns'] if c not in spec['required'])}"
+                                if len(spec["required"]) < len(spec["columns"]) else ""))
+    cur.execute(spec["stage"])
+    cur.copy_expert(cur.mogrify(f"COPY import_{kind} ({', '.join(header)}) FROM STDIN WITH (FORMAT csv, DELIMITER %s)",
+                                (delimiter,)).decode(), f)
+    for sql in spec["prepare"]:
+        cur.execute(sql)
+    for field, message, where in spec["checks"]:
+        cur.execute(f"""
+            INSERT INTO import_errors (kind, line, field, message)
+            SELECT %s, s.line, %s, %s FROM import_{kind} s WHERE {where}
+        """, (kind, field, message))
+
+def _merge(cur, kind):
+    cur.execute(f"SELECT COUNT(*) FROM import_{kind} s WHERE {_ok(kind)}")
+    n = cur.fetchone()[0]
+    for sql in KINDS[kind]["merge"]:
+        cur.execute(sql)
+    return n
+
+def import_csv(conn, files, strict=False, delimiter=",", log=None):
+    """Load CSV files ({kind: path or text file}) in one transaction.
+
+    Returns (loaded {kind: rows}, errors [(kind, line, field, message)]). Rows with errors
+    are skipped; with strict=True any error rolls back the whole import.
+    """
+    unknown = set(files) - set(KINDS)
+    if unknown:
+        raise CsvImportError(f"Неизвестный вид данных: {', '.join(sorted(unknown))}")
+    autocommit = conn.autocommit
+    conn.autocommit = False
+    loaded = {}
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TEMP TABLE import_errors (kind text, line integer, field text, message text) ON COMMIT DROP
+            """)
+            # по очереди: брони проверяются уже с клиентами и номерами из этого импорта
+            for kind in KINDS:
+                if kind not in files:
+                    continue
+                src = files[kind]
+                if log:
+                    log(f"{kind}: загрузка")
+                if isinstance(src, str):
+                    with open(src, encoding="utf-8-sig", newline="") as f:
+                        _stage(cur, kind, f, delimiter)
+                else:
+                    _stage(cur, kind, src, delimiter)
+                # и при strict переносим: следующие файлы проверяются с уже загруженными строками
+                loaded[kind] = _merge(cur, kind)
+                if log:
+                    log(f"{kind}: загружено {loaded[kind]}")
+            cur.execute("SELECT kind, line, field, message FROM import_errors ORDER BY array_position(%s, kind), line, field",
+                        (list(KINDS),))
+            errors = cur.fetchall()
+        if strict and errors:
+            conn.rollback()
+            loaded = {}
+        else:
+            conn.commit()
+        return loaded, errors
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = autocommit
+
+def write_report(errors, f, files=None):
+    """Write the row-level error report as CSV; kinds are shown as file names if files is given."""
+    w = csv.writer(f)
+    w.writerow(REPORT_COLUMNS)
+    for kind, line, field, message in errors:
+        src = (files or {}).get(kind, kind)
+        w.writerow((os.path.basename(src) if isinstance(src, str) else kind, line, field, message))
+
+def main():
+    ap = argparse.ArgumentParser(description="Bulk import of clients, rooms and bookings from CSV")
+    ap.add_argument("--dsn", default=os.environ.get("HOTEL_DSN", DEFAULT_DSN))
+    for kind in KINDS:
+        ap.add_argument(f"--{kind}", metavar="CSV", help=f"файл с {kind}")
+    ap.add_argument("--delimiter", default=",")
+    ap.add_argument("--strict", action="store_true", help="при любой ошибке ничего не загружать")
+    ap.add_argument("--report", metavar="CSV", help="куда записать отчёт об ошибках (по умолчанию — на экран)")
+    args = ap.parse_args()
+    files = {kind: getattr(args, kind) for kind in KINDS if getattr(args, kind)}
+    if not files:
+        ap.error("укажите хотя бы один из --" + ", --".join(KINDS))
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        loaded, errors = import_csv(conn, files, strict=args.strict, delimiter=args.delimiter, log=print)
+    except (CsvImportError, psycopg2.Error) as e:
+        print(e)
+        return 1
+    finally:
+        conn.close()
+
+    for kind in files:
+        print(f"{kind}: загружено {loaded.get(kind, 0)}")
+    if errors:
+        print(f"ошибок: {len(errors)}" + (" — ничего не загружено (--strict)" if args.strict else ""))
+        if args.report:
+            with open(args.report, "w", encoding="utf-8", newline="") as f:
+                write_report(errors, f, files)
+            print(f"отчёт: {args.report}")
+        else:
+            write_report(errors, sys.stdout, files)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -17,6 +17,34 @@ SET xmloption = content;
 SET client_min_messages = warning;
 SET row_security = off;
 
+--
+-- Name: btree_gist; Type: EXTENSION; Schema: -; Owner: -
+--
+
+CREATE EXTENSION IF NOT EXISTS btree_gist WITH SCHEMA public;
+
+
+--
+-- Name: EXTENSION btree_gist; Type: COMMENT; Schema: -; Owner: 
+--
+
+COMMENT ON EXTENSION btree_gist IS 'support for indexing common datatypes in GiST';
+
+
+--
+-- Name: pg_trgm; Type: EXTENSION; Schema: -; Owner: -
+--
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public;
+
+
+--
+-- Name: EXTENSION pg_trgm; Type: COMMENT; Schema: -; Owner: 
+--
+
+COMMENT ON EXTENSION pg_trgm IS 'text similarity measurement and index searching based on trigrams';
+
+
 --
 -- Name: dm_nonnegative_decimal; Type: DOMAIN; Schema: public; Owner: postgres
 --
@@ -42,30 +70,56 @@ ALTER DOMAIN public.dm_passport OWNER TO postgres;
 --
 
 CREATE FUNCTION public.calc_booking_totals(booking_id_param integer) RETURNS TABLE(nights integer, room_total numeric, services_total numeric, booking_fee numeric, prepayments_total numeric, balance numeric)
-    LANGUAGE plpgsql
-    AS $$
-DECLARE
-    price DECIMAL;
-BEGIN
-    SELECT rt.price INTO price
-    FROM Booking b JOIN Room r ON b.room_id = r.room_id JOIN RoomType rt ON r.type_id = rt.type_id
-    WHERE b.booking_id = booking_id_param;
-
-    SELECT (b.end_date - b.start_date)::int, (b.end_date - b.start_date) * price,
-           COALESCE((SELECT SUM(s.price) FROM BookingService bs JOIN Service s ON bs.service_id = s.service_id WHERE bs.booking_id = booking_id_param),0),
-           b.booking_fee,
-           COALESCE((SELECT SUM(c.prepayment) FROM BookingGuest bg JOIN Client c ON bg.client_id = c.client_id WHERE bg.booking_id = booking_id_param),0)
-    INTO nights, room_total, services_total, booking_fee, prepayments_total
-    FROM Booking b WHERE b.booking_id = booking_id_param;
-
-    balance := prepayments_total - (room_total + COALESCE(booking_fee,0) + services_total);
-    RETURN NEXT;
-END;
+    LANGUAGE sql STABLE
+    AS $$
+    -- итоги ведутся триггерами в booking_totals — здесь только чтение по ключу
+    SELECT t.nights, t.room_total, t.services_total, t.booking_fee, t.prepayments_total, t.balance
+    FROM booking_totals t
+    WHERE t.booking_id = booking_id_param;
 $$;
 
 
 ALTER FUNCTION public.calc_booking_totals(booking_id_param integer) OWNER TO postgres;
 
+--
+-- Name: calc_booking_totals_range(date, date); Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.calc_booking_totals_range(date_from date DEFAULT NULL::date, date_to date DEFAULT NULL::date) RETURNS TABLE(booking_id integer, nights integer, room_total numeric, services_total numeric, booking_fee numeric, prepayments_total numeric, balance numeric, guests json, services json)
+    LANGUAGE sql STABLE
+    AS $$
+    -- итоги всех броней, пересекающих [date_from, date_to) (NULL — без ограничения), из booking_totals
+    -- вместе со списками гостей и услуг: один запрос на весь отчёт
+    WITH b AS (
+        SELECT t.booking_id, t.nights, t.room_total, t.services_total, t.booking_fee, t.prepayments_total, t.balance
+        FROM Booking b
+        JOIN booking_totals t ON t.booking_id = b.booking_id
+        WHERE (date_from IS NULL OR b.end_date > date_from)
+          AND (date_to IS NULL OR b.start_date < date_to)
+    ), g AS (
+        SELECT bg.booking_id,
+               json_agg(json_build_array(c.client_id, c.full_name, c.prepayment) ORDER BY c.client_id) AS guests
+        FROM BookingGuest bg JOIN Client c ON bg.client_id = c.client_id
+        WHERE bg.booking_id IN (SELECT booking_id FROM b)
+        GROUP BY bg.booking_id
+    ), s AS (
+        SELECT bs.booking_id,
+               json_agg(json_build_array(sv.service_id, sv.name, bs.unit_price, bs.quantity) ORDER BY sv.service_id) AS services
+        FROM BookingService bs JOIN Service sv ON bs.service_id = sv.service_id
+        WHERE bs.booking_id IN (SELECT booking_id FROM b)
+        GROUP BY bs.booking_id
+    )
+    SELECT b.booking_id, b.nights, b.room_total, b.services_total, b.booking_fee, b.prepayments_total, b.balance,
+           COALESCE(g.guests, '[]'::json), COALESCE(s.services, '[]'::json)
+    FROM b
+    LEFT JOIN g ON g.booking_id = b.booking_id
+    LEFT JOIN s ON s.booking_id = b.booking_id
+    ORDER BY b.booking_id;
+$$;
+
+
+ALTER FUNCTION public.calc_booking_totals_range(date_from date, date_to date) OWNER TO postgres;
+
 --
 -- Name: check_booking_dates(); Type: FUNCTION; Schema: public; Owner: postgres
 --
@@ -85,41 +139,66 @@ $$;
 ALTER FUNCTION public.check_booking_dates() OWNER TO postgres;
 
 --
--- Name: check_room_capacity(); Type: FUNCTION; Schema: public; Owner: postgres
+-- Name: find_available_rooms(date, date, integer); Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.find_available_rooms(p_start date, p_end date, p_guests integer DEFAULT 1) RETURNS TABLE(room_id integer, room_number character varying, type_name character varying, price numeric, capacity integer, status character varying)
+    LANGUAGE sql STABLE SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+    -- номера, свободные на весь период [p_start, p_end) и вмещающие p_guests гостей;
+    -- пересечение периодов ищется по GiST-индексу ограничения booking_no_overlap.
+    -- SECURITY DEFINER: гость видит занятость, не имея доступа к таблице Booking
+    SELECT r.room_id, r.room_number, rt.name, rt.price, rt.capacity, r.status
+    FROM room_occupancy r
+    JOIN RoomType rt ON r.type_id = rt.type_id
+    WHERE rt.capacity >= p_guests
+      AND NOT EXISTS (
+          SELECT 1 FROM Booking b
+          WHERE b.room_id = r.room_id
+            AND daterange(b.start_date, b.end_date) && daterange(p_start, p_end)
+      )
+    ORDER BY r.room_id
+$$;
+
+
+ALTER FUNCTION public.find_available_rooms(p_start date, p_end date, p_guests integer) OWNER TO postgres;
+
+--
+-- Name: fn_booking_guest_count(); Type: FUNCTION; Schema: public; Owner: postgres
 --
 
-CREATE FUNCTION public.check_room_capacity() RETURNS trigger
-    LANGUAGE plpgsql
-    AS $$
-DECLARE
-    room_capacity INT;
-    guest_count INT;
-BEGIN
-    -- Получаем вместимость номера через Booking
-    SELECT rt.capacity INTO room_capacity
-    FROM Booking b
-    JOIN Room r ON b.room_id = r.room_id
-    JOIN RoomType rt ON r.type_id = rt.type_id
-    WHERE b.booking_id = NEW.booking_id;
-
-    -- Считаем количество гостей в бронировании
-    SELECT COUNT(*) INTO guest_count
-    FROM BookingGuest
-    WHERE booking_id = NEW.booking_id;
-
-    -- Проверка вместимости
-    IF guest_count > room_capacity THEN
-        RAISE EXCEPTION
-            'Превышена вместимость номера. Гостей: %, вместимость: %',
-            guest_count, room_capacity;
-    END IF;
-
-    RETURN NEW;
-END;
+CREATE FUNCTION public.fn_booking_guest_count() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+DECLARE
+    cnt INT;
+    room_cap INT;
+BEGIN
+    -- счётчик гостей брони; UPDATE блокирует строку брони, так что параллельные
+    -- вставки гостей в одну бронь не обойдут проверку вместимости
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE Booking SET guest_count = guest_count - 1 WHERE booking_id = OLD.booking_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE Booking SET guest_count = guest_count + 1 WHERE booking_id = NEW.booking_id
+        RETURNING guest_count, (SELECT rt.capacity FROM Room r JOIN RoomType rt ON r.type_id = rt.type_id
+                                WHERE r.room_id = Booking.room_id)
+        INTO cnt, room_cap;
+        IF room_cap IS NULL THEN
+            RAISE EXCEPTION 'Не найдена броь или номер для booking_id=%', NEW.booking_id;
+        END IF;
+        IF cnt > room_cap THEN
+            RAISE EXCEPTION 'Превышена вместимость номера: гостей=% (вместимость=%)', cnt, room_cap;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
 $$;
 
 
-ALTER FUNCTION public.check_room_capacity() OWNER TO postgres;
+ALTER FUNCTION public.fn_booking_guest_count() OWNER TO postgres;
 
 --
 -- Name: fn_calc_booking_fee(); Type: FUNCTION; Schema: public; Owner: postgres
@@ -173,99 +252,200 @@ $$;
 ALTER FUNCTION public.fn_check_booking_dates() OWNER TO postgres;
 
 --
--- Name: fn_check_booking_overlap(); Type: FUNCTION; Schema: public; Owner: postgres
+-- Name: fn_notify_change(); Type: FUNCTION; Schema: public; Owner: postgres
 --
 
-CREATE FUNCTION public.fn_check_booking_overlap() RETURNS trigger
+CREATE FUNCTION public.fn_notify_change() RETURNS trigger
     LANGUAGE plpgsql
-    AS $$
-DECLARE
-    cnt INT;
-BEGIN
-    SELECT COUNT(*) INTO cnt
-    FROM Booking b
-    WHERE b.room_id = NEW.room_id
-      AND b.booking_id <> COALESCE(NEW.booking_id, -1)
-      AND (NEW.start_date < b.end_date AND NEW.end_date > b.start_date);
-
-    IF cnt > 0 THEN
-        RAISE EXCEPTION 'Комната % уже забронирована на указанный период (найдено % перекрывающих записей)', NEW.room_id, cnt;
-    END IF;
-    RETURN NEW;
-END;
+    AS $$
+DECLARE
+    new_id text;
+    old_id text;
+BEGIN
+    -- TG_ARGV[0] — столбец, id из которого уходит в уведомление
+    -- (для гостей и услуг брони — booking_id: в интерфейсе меняется строка брони)
+    IF TG_OP <> 'DELETE' THEN
+        new_id := to_jsonb(NEW) ->> TG_ARGV[0];
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        old_id := to_jsonb(OLD) ->> TG_ARGV[0];
+    END IF;
+    IF new_id IS NOT NULL THEN
+        PERFORM pg_notify('hotel_changes', jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', new_id::int)::text);
+    END IF;
+    IF old_id IS NOT NULL AND old_id IS DISTINCT FROM new_id THEN
+        PERFORM pg_notify('hotel_changes', jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', old_id::int)::text);
+    END IF;
+    RETURN NULL;
+END;
 $$;
 
 
-ALTER FUNCTION public.fn_check_booking_overlap() OWNER TO postgres;
+ALTER FUNCTION public.fn_notify_change() OWNER TO postgres;
 
 --
--- Name: fn_check_room_capacity(); Type: FUNCTION; Schema: public; Owner: postgres
+-- Name: fn_set_service_unit_price(); Type: FUNCTION; Schema: public; Owner: postgres
 --
 
-CREATE FUNCTION public.fn_check_room_capacity() RETURNS trigger
+CREATE FUNCTION public.fn_set_service_unit_price() RETURNS trigger
     LANGUAGE plpgsql
-    AS $$
-DECLARE
-    room_cap INT;
-    guests_after INT;
-BEGIN
-    -- узнаём вместимость через Booking->Room->RoomType
-    SELECT rt.capacity INTO room_cap
-    FROM Booking b
-    JOIN Room r ON b.room_id = r.room_id
-    JOIN RoomType rt ON r.type_id = rt.type_id
-    WHERE b.booking_id = NEW.booking_id;
-
-    IF room_cap IS NULL THEN
-        RAISE EXCEPTION 'Не найдена броь или номер для booking_id=%', NEW.booking_id;
-    END IF;
-
-    SELECT COUNT(*) INTO guests_after FROM BookingGuest WHERE booking_id = NEW.booking_id;
-    IF TG_OP = 'INSERT' THEN
-        guests_after := guests_after + 1; -- учитываем добавляемого гостя
-    END IF;
-
-    IF guests_after > room_cap THEN
-        RAISE EXCEPTION 'Превышена вместимость номера: гостей=% (вместимость=%)', guests_after, room_cap;
-    END IF;
-
-    RETURN NEW;
-END;
+    AS $$
+BEGIN
+    -- фиксируем цену услуги на момент добавления в бронь
+    SELECT s.price INTO NEW.unit_price FROM Service s WHERE s.service_id = NEW.service_id;
+    IF NEW.unit_price IS NULL THEN
+        RAISE EXCEPTION 'Service id % not found for price snapshot', NEW.service_id;
+    END IF;
+    RETURN NEW;
+END;
 $$;
 
 
-ALTER FUNCTION public.fn_check_room_capacity() OWNER TO postgres;
+ALTER FUNCTION public.fn_set_service_unit_price() OWNER TO postgres;
 
 --
--- Name: fn_update_room_status(integer); Type: FUNCTION; Schema: public; Owner: postgres
+-- Name: fn_totals_on_booking(); Type: FUNCTION; Schema: public; Owner: postgres
 --
 
-CREATE FUNCTION public.fn_update_room_status(book_id integer) RETURNS void
-    LANGUAGE plpgsql
-    AS $$
-DECLARE
-    rid INT;
-    has_active INT;
-BEGIN
-    SELECT room_id INTO rid FROM Booking WHERE booking_id = book_id;
-    IF rid IS NULL THEN
-        RETURN;
-    END IF;
-
-    SELECT COUNT(*) INTO has_active
-    FROM Booking b
-    WHERE b.room_id = rid AND b.start_date <= current_date AND b.end_date > current_date;
-
-    IF has_active > 0 THEN
-        UPDATE Room SET status = 'занят' WHERE room_id = rid;
-    ELSE
-        UPDATE Room SET status = 'свободен' WHERE room_id = rid;
-    END IF;
-END;
+CREATE FUNCTION public.fn_totals_on_booking() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+BEGIN
+    -- ночи, проживание и сбор брони; суммы услуг и предоплат ведут триггеры
+    -- bookingservice и bookingguest
+    INSERT INTO booking_totals (booking_id, nights, room_total, booking_fee)
+    SELECT NEW.booking_id, NEW.end_date - NEW.start_date, (NEW.end_date - NEW.start_date) * rt.price, NEW.booking_fee
+    FROM Room r JOIN RoomType rt ON rt.type_id = r.type_id
+    WHERE r.room_id = NEW.room_id
+    ON CONFLICT (booking_id) DO UPDATE
+        SET nights = EXCLUDED.nights, room_total = EXCLUDED.room_total, booking_fee = EXCLUDED.booking_fee;
+    RETURN NULL;
+END;
+$$;
+
+
+ALTER FUNCTION public.fn_totals_on_booking() OWNER TO postgres;
+
+--
+-- Name: fn_totals_on_bookingguest(); Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.fn_totals_on_bookingguest() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+BEGIN
+    -- предоплаты гостей брони пересчитываются по её составу: при каскадном удалении
+    -- клиента его строка в Client уже недоступна, разницу не вычислить
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE booking_totals
+        SET prepayments_total = COALESCE((SELECT SUM(c.prepayment) FROM BookingGuest bg
+                                          JOIN Client c ON c.client_id = bg.client_id
+                                          WHERE bg.booking_id = OLD.booking_id), 0)
+        WHERE booking_id = OLD.booking_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE booking_totals
+        SET prepayments_total = COALESCE((SELECT SUM(c.prepayment) FROM BookingGuest bg
+                                          JOIN Client c ON c.client_id = bg.client_id
+                                          WHERE bg.booking_id = NEW.booking_id), 0)
+        WHERE booking_id = NEW.booking_id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+
+ALTER FUNCTION public.fn_totals_on_bookingguest() OWNER TO postgres;
+
+--
+-- Name: fn_totals_on_bookingservice(); Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.fn_totals_on_bookingservice() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE booking_totals SET services_total = services_total - OLD.quantity * OLD.unit_price
+        WHERE booking_id = OLD.booking_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE booking_totals SET services_total = services_total + NEW.quantity * NEW.unit_price
+        WHERE booking_id = NEW.booking_id;
+    END IF;
+    RETURN NULL;
+END;
 $$;
 
 
-ALTER FUNCTION public.fn_update_room_status(book_id integer) OWNER TO postgres;
+ALTER FUNCTION public.fn_totals_on_bookingservice() OWNER TO postgres;
+
+--
+-- Name: fn_totals_on_client(); Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.fn_totals_on_client() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+BEGIN
+    -- изменилась предоплата — сдвигаем итоги всех броней клиента на разницу
+    IF NEW.prepayment IS DISTINCT FROM OLD.prepayment THEN
+        UPDATE booking_totals t
+        SET prepayments_total = t.prepayments_total + (COALESCE(NEW.prepayment, 0) - COALESCE(OLD.prepayment, 0)) * g.n
+        FROM (SELECT booking_id, COUNT(*) AS n FROM BookingGuest WHERE client_id = NEW.client_id GROUP BY booking_id) g
+        WHERE t.booking_id = g.booking_id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+
+ALTER FUNCTION public.fn_totals_on_client() OWNER TO postgres;
+
+--
+-- Name: fn_totals_on_room(); Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.fn_totals_on_room() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+BEGIN
+    -- номер сменил тип — проживание по его броням считается по новой цене
+    UPDATE booking_totals t
+    SET room_total = t.nights * rt.price
+    FROM Booking b, RoomType rt
+    WHERE b.room_id = NEW.room_id AND t.booking_id = b.booking_id AND rt.type_id = NEW.type_id;
+    RETURN NULL;
+END;
+$$;
+
+
+ALTER FUNCTION public.fn_totals_on_room() OWNER TO postgres;
+
+--
+-- Name: fn_totals_on_roomtype(); Type: FUNCTION; Schema: public; Owner: postgres
+--
+
+CREATE FUNCTION public.fn_totals_on_roomtype() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+BEGIN
+    UPDATE booking_totals t
+    SET room_total = t.nights * NEW.price
+    FROM Booking b JOIN Room r ON r.room_id = b.room_id
+    WHERE r.type_id = NEW.type_id AND t.booking_id = b.booking_id;
+    RETURN NULL;
+END;
+$$;
+
+
+ALTER FUNCTION public.fn_totals_on_roomtype() OWNER TO postgres;
 
 --
 -- Name: get_booking_guests(integer); Type: FUNCTION; Schema: public; Owner: postgres
@@ -311,42 +491,26 @@ $$;
 ALTER FUNCTION public.get_current_client_id() OWNER TO postgres;
 
 --
--- Name: tg_update_room_status_on_booking(); Type: FUNCTION; Schema: public; Owner: postgres
---
-
-CREATE FUNCTION public.tg_update_room_status_on_booking() RETURNS trigger
-    LANGUAGE plpgsql
-    AS $$
-BEGIN
-    PERFORM fn_update_room_status(COALESCE(NEW.booking_id, OLD.booking_id));
-    RETURN COALESCE(NEW, OLD);
-END;
-$$;
-
-
-ALTER FUNCTION public.tg_update_room_status_on_booking() OWNER TO postgres;
-
---
--- Name: update_room_status_on_booking(); Type: FUNCTION; Schema: public; Owner: postgres
+-- Name: refresh_room_status(); Type: FUNCTION; Schema: public; Owner: postgres
 --
 
-CREATE FUNCTION public.update_room_status_on_booking() RETURNS trigger
-    LANGUAGE plpgsql
-    AS $$
-BEGIN
-    -- При создании бронирования меняем статус номера на "занят"
-    IF TG_OP = 'INSERT' THEN
-        UPDATE Room SET status = 'занят' WHERE room_id = NEW.room_id;
-    -- При удалении бронирования меняем статус обратно на "свободен"
-    ELSIF TG_OP = 'DELETE' THEN
-        UPDATE Room SET status = 'свободен' WHERE room_id = OLD.room_id;
-    END IF;
-    RETURN NEW;
-END;
+CREATE FUNCTION public.refresh_room_status() RETURNS integer
+    LANGUAGE sql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+    -- снимок занятости на сегодня в Room.status; запускается при смене дня
+    -- (pg_cron или приложение) и трогает только изменившиеся строки
+    WITH upd AS (
+        UPDATE Room r SET status = o.status
+        FROM room_occupancy o
+        WHERE o.room_id = r.room_id AND r.status IS DISTINCT FROM o.status
+        RETURNING 1
+    )
+    SELECT COUNT(*)::integer FROM upd;
 $$;
 
 
-ALTER FUNCTION public.update_room_status_on_booking() OWNER TO postgres;
+ALTER FUNCTION public.refresh_room_status() OWNER TO postgres;
 
 SET default_tablespace = '';
 
@@ -364,12 +528,43 @@ CREATE TABLE public.booking (
     booking_fee numeric(10,2) NOT NULL,
     valid_from timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
     valid_to timestamp without time zone,
+    guest_count integer DEFAULT 0 NOT NULL,
     CONSTRAINT chk_dates CHECK ((start_date < end_date))
 );
 
 
 ALTER TABLE public.booking OWNER TO postgres;
 
+--
+-- Name: booking_booking_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+ALTER TABLE public.booking ALTER COLUMN booking_id ADD GENERATED BY DEFAULT AS IDENTITY (
+    SEQUENCE NAME public.booking_booking_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1
+);
+
+--
+-- Name: booking_totals; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.booking_totals (
+    booking_id integer NOT NULL,
+    nights integer NOT NULL,
+    room_total numeric(12,2) NOT NULL,
+    services_total numeric(12,2) DEFAULT 0 NOT NULL,
+    booking_fee numeric(10,2) NOT NULL,
+    prepayments_total numeric(12,2) DEFAULT 0 NOT NULL,
+    balance numeric(12,2) GENERATED ALWAYS AS ((prepayments_total - ((room_total + booking_fee) + services_total))) STORED
+);
+
+
+ALTER TABLE public.booking_totals OWNER TO postgres;
+
 --
 -- Name: bookingguest; Type: TABLE; Schema: public; Owner: postgres
 --
@@ -383,6 +578,19 @@ CREATE TABLE public.bookingguest (
 
 ALTER TABLE public.bookingguest OWNER TO postgres;
 
+--
+-- Name: bookingguest_client_b_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+ALTER TABLE public.bookingguest ALTER COLUMN client_b_id ADD GENERATED BY DEFAULT AS IDENTITY (
+    SEQUENCE NAME public.bookingguest_client_b_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1
+);
+
 --
 -- Name: bookingservice; Type: TABLE; Schema: public; Owner: postgres
 --
@@ -390,12 +598,28 @@ ALTER TABLE public.bookingguest OWNER TO postgres;
 CREATE TABLE public.bookingservice (
     service_b_id integer NOT NULL,
     booking_id integer NOT NULL,
-    service_id integer NOT NULL
+    service_id integer NOT NULL,
+    quantity integer DEFAULT 1 NOT NULL,
+    unit_price numeric(10,2) NOT NULL,
+    CONSTRAINT chk_quantity CHECK ((quantity > 0))
 );
 
 
 ALTER TABLE public.bookingservice OWNER TO postgres;
 
+--
+-- Name: bookingservice_service_b_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+ALTER TABLE public.bookingservice ALTER COLUMN service_b_id ADD GENERATED BY DEFAULT AS IDENTITY (
+    SEQUENCE NAME public.bookingservice_service_b_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1
+);
+
 --
 -- Name: client; Type: TABLE; Schema: public; Owner: postgres
 --
@@ -410,6 +634,19 @@ CREATE TABLE public.client (
 
 ALTER TABLE public.client OWNER TO postgres;
 
+--
+-- Name: client_client_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+ALTER TABLE public.client ALTER COLUMN client_id ADD GENERATED BY DEFAULT AS IDENTITY (
+    SEQUENCE NAME public.client_client_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1
+);
+
 --
 -- Name: guest_own_data; Type: VIEW; Schema: public; Owner: postgres
 --
@@ -440,6 +677,38 @@ CREATE TABLE public.room (
 
 ALTER TABLE public.room OWNER TO postgres;
 
+--
+-- Name: room_occupancy; Type: VIEW; Schema: public; Owner: postgres
+--
+
+CREATE VIEW public.room_occupancy AS
+ SELECT r.room_id,
+    r.room_number,
+    r.type_id,
+        CASE
+            WHEN (EXISTS ( SELECT 1
+               FROM public.booking b
+              WHERE ((b.room_id = r.room_id) AND (daterange(b.start_date, b.end_date) @> CURRENT_DATE)))) THEN 'занят'::character varying
+            ELSE 'свободен'::character varying
+        END AS status
+   FROM public.room r;
+
+
+ALTER VIEW public.room_occupancy OWNER TO postgres;
+
+--
+-- Name: room_room_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+ALTER TABLE public.room ALTER COLUMN room_id ADD GENERATED BY DEFAULT AS IDENTITY (
+    SEQUENCE NAME public.room_room_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1
+);
+
 --
 -- Name: roomtype; Type: TABLE; Schema: public; Owner: postgres
 --
@@ -454,6 +723,19 @@ CREATE TABLE public.roomtype (
 
 ALTER TABLE public.roomtype OWNER TO postgres;
 
+--
+-- Name: roomtype_type_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+ALTER TABLE public.roomtype ALTER COLUMN type_id ADD GENERATED BY DEFAULT AS IDENTITY (
+    SEQUENCE NAME public.roomtype_type_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1
+);
+
 --
 -- Name: my_bookings; Type: VIEW; Schema: public; Owner: postgres
 --
@@ -477,6 +759,19 @@ CREATE VIEW public.my_bookings AS
 
 ALTER VIEW public.my_bookings OWNER TO postgres;
 
+--
+-- Name: schema_migrations; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.schema_migrations (
+    version integer NOT NULL,
+    name character varying(100) NOT NULL,
+    applied_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+
+ALTER TABLE public.schema_migrations OWNER TO postgres;
+
 --
 -- Name: service; Type: TABLE; Schema: public; Owner: postgres
 --
@@ -491,25 +786,58 @@ CREATE TABLE public.service (
 
 ALTER TABLE public.service OWNER TO postgres;
 
+--
+-- Name: service_service_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+ALTER TABLE public.service ALTER COLUMN service_id ADD GENERATED BY DEFAULT AS IDENTITY (
+    SEQUENCE NAME public.service_service_id_seq
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1
+);
+
 --
 -- Data for Name: booking; Type: TABLE DATA; Schema: public; Owner: postgres
 --
 
-COPY public.booking (booking_id, room_id, start_date, end_date, booking_fee, valid_from, valid_to) FROM stdin;
-1	1	2025-12-18	2025-12-26	1000.00	2025-12-18 21:03:17.650193	\N
-2	1	2026-12-18	2026-12-26	1000.00	2025-12-18 21:04:13.86376	\N
-3	1	2025-12-18	2025-12-26	1000.00	2025-12-18 21:17:59.023944	\N
-4	7	2025-12-18	2025-12-19	4000.00	2025-12-18 21:49:55.364916	\N
-5	8	2025-12-23	2025-12-26	3888.50	2025-12-23 18:21:37.575533	\N
-6	5	2025-12-23	2025-12-26	1000.00	2025-12-23 18:24:52.227479	\N
-7	3	2025-12-23	2025-12-24	2000.00	2025-12-23 19:13:59.848061	\N
-8	4	2025-12-23	2025-12-26	12000.00	2025-12-23 19:37:25.773907	\N
-9	7	2025-12-23	2025-12-24	4000.00	2025-12-23 19:41:43.235289	\N
-10	2	2025-12-23	2025-12-24	1000.00	2025-12-23 19:47:54.883452	\N
-11	6	2025-12-23	2025-12-24	2000.00	2025-12-23 19:48:04.403192	\N
-12	1	2025-12-26	2025-12-28	2000.00	2025-12-23 20:31:52.835119	\N
-13	8	2025-12-27	2025-12-29	7777.00	2025-12-23 20:33:16.936085	\N
-14	6	2025-12-27	2025-12-29	4000.00	2025-12-23 20:34:33.87235	\N
+COPY public.booking (booking_id, room_id, start_date, end_date, booking_fee, valid_from, valid_to, guest_count) FROM stdin;
+2	1	2026-12-18	2026-12-26	1000.00	2025-12-18 21:04:13.86376	\N	0
+3	1	2025-12-18	2025-12-26	1000.00	2025-12-18 21:17:59.023944	\N	1
+4	7	2025-12-18	2025-12-19	4000.00	2025-12-18 21:49:55.364916	\N	2
+5	8	2025-12-23	2025-12-26	3888.50	2025-12-23 18:21:37.575533	\N	2
+6	5	2025-12-23	2025-12-26	1000.00	2025-12-23 18:24:52.227479	\N	1
+7	3	2025-12-23	2025-12-24	2000.00	2025-12-23 19:13:59.848061	\N	3
+8	4	2025-12-23	2025-12-26	12000.00	2025-12-23 19:37:25.773907	\N	2
+9	7	2025-12-23	2025-12-24	4000.00	2025-12-23 19:41:43.235289	\N	1
+10	2	2025-12-23	2025-12-24	1000.00	2025-12-23 19:47:54.883452	\N	2
+11	6	2025-12-23	2025-12-24	2000.00	2025-12-23 19:48:04.403192	\N	3
+12	1	2025-12-26	2025-12-28	2000.00	2025-12-23 20:31:52.835119	\N	2
+13	8	2025-12-27	2025-12-29	7777.00	2025-12-23 20:33:16.936085	\N	1
+14	6	2025-12-27	2025-12-29	4000.00	2025-12-23 20:34:33.87235	\N	1
+\.
+
+
+--
+-- Data for Name: booking_totals; Type: TABLE DATA; Schema: public; Owner: postgres
+--
+
+COPY public.booking_totals (booking_id, nights, room_total, services_total, booking_fee, prepayments_total) FROM stdin;
+2	8	16000.00	0.00	1000.00	0.00
+3	8	16000.00	0.00	1000.00	1000000.00
+4	1	8000.00	9999.00	4000.00	1000000.00
+5	3	23331.00	666.00	3888.50	2611.00
+6	3	6000.00	0.00	1000.00	666.00
+7	1	4000.00	0.00	2000.00	15000.00
+8	3	24000.00	0.00	12000.00	5666.00
+9	1	8000.00	0.00	4000.00	3000.00
+10	1	2000.00	0.00	1000.00	8000.00
+11	1	4000.00	9000.00	2000.00	15000.00
+12	2	4000.00	0.00	2000.00	9500.00
+13	2	15554.00	0.00	7777.00	7000.00
+14	2	8000.00	0.00	4000.00	7000.00
 \.
 
 
@@ -546,34 +874,11 @@ COPY public.bookingguest (client_b_id, booking_id, client_id) FROM stdin;
 -- Data for Name: bookingservice; Type: TABLE DATA; Schema: public; Owner: postgres
 --
 
-COPY public.bookingservice (service_b_id, booking_id, service_id) FROM stdin;
-1	4	5
-2	4	5
-3	4	5
-4	5	6
-5	11	4
-6	11	4
-7	11	4
-8	11	4
-9	11	4
-10	11	4
-11	11	4
-12	11	4
-13	11	4
-14	11	4
-15	11	4
-16	11	4
-17	11	4
-18	11	4
-19	11	4
-20	11	4
-21	11	4
-22	11	4
-23	11	4
-24	11	4
-25	11	2
-26	11	2
-27	11	2
+COPY public.bookingservice (service_b_id, booking_id, service_id, quantity, unit_price) FROM stdin;
+1	4	5	3	3333.00
+4	5	6	1	666.00
+5	11	4	20	300.00
+25	11	2	3	1000.00
 \.
 
 
@@ -625,6 +930,27 @@ COPY public.roomtype (type_id, name, price, capacity) FROM stdin;
 \.
 
 
+--
+-- Data for Name: schema_migrations; Type: TABLE DATA; Schema: public; Owner: postgres
+--
+
+COPY public.schema_migrations (version, name, applied_at) FROM stdin;
+1	identity_ids	2026-10-18 12:00:00
+2	bookingservice_quantity	2026-10-18 12:00:00
+3	booking_totals_range	2026-10-18 12:00:00
+4	notify_changes	2026-10-18 12:00:00
+5	notify_reference_tables	2026-10-18 12:00:00
+6	find_available_rooms	2026-10-18 12:00:00
+7	booking_no_overlap	2026-10-18 12:00:00
+8	fk_date_indexes	2026-10-18 12:00:00
+9	booking_totals	2026-10-18 12:00:00
+10	booking_guest_count	2026-10-18 12:00:00
+11	room_occupancy	2026-10-18 12:00:00
+12	cascade_deletes	2026-10-18 12:00:00
+13	client_search	2026-10-18 12:00:00
+\.
+
+
 --
 -- Data for Name: service; Type: TABLE DATA; Schema: public; Owner: postgres
 --
@@ -639,6 +965,63 @@ COPY public.service (service_id, name, price, description) FROM stdin;
 \.
 
 
+--
+-- Name: booking_booking_id_seq; Type: SEQUENCE SET; Schema: public; Owner: postgres
+--
+
+SELECT pg_catalog.setval('public.booking_booking_id_seq', 14, true);
+
+
+--
+-- Name: bookingguest_client_b_id_seq; Type: SEQUENCE SET; Schema: public; Owner: postgres
+--
+
+SELECT pg_catalog.setval('public.bookingguest_client_b_id_seq', 23, true);
+
+
+--
+-- Name: bookingservice_service_b_id_seq; Type: SEQUENCE SET; Schema: public; Owner: postgres
+--
+
+SELECT pg_catalog.setval('public.bookingservice_service_b_id_seq', 27, true);
+
+
+--
+-- Name: client_client_id_seq; Type: SEQUENCE SET; Schema: public; Owner: postgres
+--
+
+SELECT pg_catalog.setval('public.client_client_id_seq', 10, true);
+
+
+--
+-- Name: room_room_id_seq; Type: SEQUENCE SET; Schema: public; Owner: postgres
+--
+
+SELECT pg_catalog.setval('public.room_room_id_seq', 8, true);
+
+
+--
+-- Name: roomtype_type_id_seq; Type: SEQUENCE SET; Schema: public; Owner: postgres
+--
+
+SELECT pg_catalog.setval('public.roomtype_type_id_seq', 6, true);
+
+
+--
+-- Name: service_service_id_seq; Type: SEQUENCE SET; Schema: public; Owner: postgres
+--
+
+SELECT pg_catalog.setval('public.service_service_id_seq', 6, true);
+
+
+--
+-- Name: booking booking_no_overlap; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.booking
+    ADD CONSTRAINT booking_no_overlap EXCLUDE USING gist (room_id WITH =, daterange(start_date, end_date) WITH &&);
+
+
 --
 -- Name: booking booking_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -647,6 +1030,14 @@ ALTER TABLE ONLY public.booking
     ADD CONSTRAINT booking_pkey PRIMARY KEY (booking_id);
 
 
+--
+-- Name: booking_totals booking_totals_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.booking_totals
+    ADD CONSTRAINT booking_totals_pkey PRIMARY KEY (booking_id);
+
+
 --
 -- Name: bookingguest bookingguest_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -655,6 +1046,14 @@ ALTER TABLE ONLY public.bookingguest
     ADD CONSTRAINT bookingguest_pkey PRIMARY KEY (client_b_id);
 
 
+--
+-- Name: bookingservice bookingservice_booking_service_key; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.bookingservice
+    ADD CONSTRAINT bookingservice_booking_service_key UNIQUE (booking_id, service_id);
+
+
 --
 -- Name: bookingservice bookingservice_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -703,6 +1102,14 @@ ALTER TABLE ONLY public.roomtype
     ADD CONSTRAINT roomtype_pkey PRIMARY KEY (type_id);
 
 
+--
+-- Name: schema_migrations schema_migrations_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.schema_migrations
+    ADD CONSTRAINT schema_migrations_pkey PRIMARY KEY (version);
+
+
 --
 -- Name: service service_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -712,17 +1119,101 @@ ALTER TABLE ONLY public.service
 
 
 --
--- Name: booking trg_check_booking_dates; Type: TRIGGER; Schema: public; Owner: postgres
+-- Name: idx_booking_dates; Type: INDEX; Schema: public; Owner: postgres
 --
 
-CREATE TRIGGER trg_check_booking_dates BEFORE INSERT OR UPDATE ON public.booking FOR EACH ROW EXECUTE FUNCTION public.check_booking_dates();
+CREATE INDEX idx_booking_dates ON public.booking USING btree (start_date, end_date);
+
+
+--
+-- Name: idx_bookingguest_booking; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_bookingguest_booking ON public.bookingguest USING btree (booking_id, client_id);
+
+
+--
+-- Name: idx_bookingguest_client; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_bookingguest_client ON public.bookingguest USING btree (client_id);
+
+
+--
+-- Name: idx_bookingservice_service; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_bookingservice_service ON public.bookingservice USING btree (service_id);
+
+
+--
+-- Name: idx_client_full_name_trgm; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_client_full_name_trgm ON public.client USING gist (full_name public.gist_trgm_ops);
+
+
+--
+-- Name: idx_client_passport_prefix; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_client_passport_prefix ON public.client USING btree (passport_number text_pattern_ops);
+
+
+--
+-- Name: idx_room_type; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX idx_room_type ON public.room USING btree (type_id);
+
+
+--
+-- Name: booking trg_booking_totals; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_booking_totals AFTER INSERT OR UPDATE OF room_id, start_date, end_date, booking_fee ON public.booking FOR EACH ROW EXECUTE FUNCTION public.fn_totals_on_booking();
+
+
+--
+-- Name: bookingguest trg_booking_totals; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_booking_totals AFTER INSERT OR DELETE OR UPDATE OF booking_id, client_id ON public.bookingguest FOR EACH ROW EXECUTE FUNCTION public.fn_totals_on_bookingguest();
+
+
+--
+-- Name: bookingservice trg_booking_totals; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_booking_totals AFTER INSERT OR DELETE OR UPDATE OF booking_id, quantity, unit_price ON public.bookingservice FOR EACH ROW EXECUTE FUNCTION public.fn_totals_on_bookingservice();
+
+
+--
+-- Name: client trg_booking_totals; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_booking_totals AFTER UPDATE OF prepayment ON public.client FOR EACH ROW EXECUTE FUNCTION public.fn_totals_on_client();
+
+
+--
+-- Name: room trg_booking_totals; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_booking_totals AFTER UPDATE OF type_id ON public.room FOR EACH ROW EXECUTE FUNCTION public.fn_totals_on_room();
 
 
 --
--- Name: bookingguest trg_check_capacity; Type: TRIGGER; Schema: public; Owner: postgres
+-- Name: roomtype trg_booking_totals; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_booking_totals AFTER UPDATE OF price ON public.roomtype FOR EACH ROW EXECUTE FUNCTION public.fn_totals_on_roomtype();
+
+
+--
+-- Name: booking trg_check_booking_dates; Type: TRIGGER; Schema: public; Owner: postgres
 --
 
-CREATE TRIGGER trg_check_capacity BEFORE INSERT OR UPDATE ON public.bookingguest FOR EACH ROW EXECUTE FUNCTION public.fn_check_room_capacity();
+CREATE TRIGGER trg_check_booking_dates BEFORE INSERT OR UPDATE ON public.booking FOR EACH ROW EXECUTE FUNCTION public.check_booking_dates();
 
 
 --
@@ -733,17 +1224,59 @@ CREATE TRIGGER trg_check_dates BEFORE INSERT OR UPDATE ON public.booking FOR EAC
 
 
 --
--- Name: booking trg_check_overlap; Type: TRIGGER; Schema: public; Owner: postgres
+-- Name: bookingguest trg_guest_count; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_guest_count AFTER INSERT OR DELETE OR UPDATE OF booking_id ON public.bookingguest FOR EACH ROW EXECUTE FUNCTION public.fn_booking_guest_count();
+
+
+--
+-- Name: booking trg_notify_change; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.booking FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('booking_id');
+
+
+--
+-- Name: bookingguest trg_notify_change; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.bookingguest FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('booking_id');
+
+
+--
+-- Name: bookingservice trg_notify_change; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.bookingservice FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('booking_id');
+
+
+--
+-- Name: client trg_notify_change; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.client FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('client_id');
+
+
+--
+-- Name: room trg_notify_change; Type: TRIGGER; Schema: public; Owner: postgres
 --
 
-CREATE TRIGGER trg_check_overlap BEFORE INSERT OR UPDATE ON public.booking FOR EACH ROW EXECUTE FUNCTION public.fn_check_booking_overlap();
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.room FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('room_id');
 
 
 --
--- Name: bookingguest trg_check_room_capacity; Type: TRIGGER; Schema: public; Owner: postgres
+-- Name: roomtype trg_notify_change; Type: TRIGGER; Schema: public; Owner: postgres
 --
 
-CREATE TRIGGER trg_check_room_capacity AFTER INSERT OR UPDATE ON public.bookingguest FOR EACH ROW EXECUTE FUNCTION public.check_room_capacity();
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.roomtype FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('type_id');
+
+
+--
+-- Name: service trg_notify_change; Type: TRIGGER; Schema: public; Owner: postgres
+--
+
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.service FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('service_id');
 
 
 --
@@ -754,10 +1287,10 @@ CREATE TRIGGER trg_set_booking_fee BEFORE INSERT OR UPDATE ON public.booking FOR
 
 
 --
--- Name: booking trg_update_room_status; Type: TRIGGER; Schema: public; Owner: postgres
+-- Name: bookingservice trg_set_service_unit_price; Type: TRIGGER; Schema: public; Owner: postgres
 --
 
-CREATE TRIGGER trg_update_room_status AFTER INSERT OR DELETE ON public.booking FOR EACH ROW EXECUTE FUNCTION public.update_room_status_on_booking();
+CREATE TRIGGER trg_set_service_unit_price BEFORE INSERT ON public.bookingservice FOR EACH ROW WHEN ((new.unit_price IS NULL)) EXECUTE FUNCTION public.fn_set_service_unit_price();
 
 
 --
@@ -765,7 +1298,15 @@ CREATE TRIGGER trg_update_room_status AFTER INSERT OR DELETE ON public.booking F
 --
 
 ALTER TABLE ONLY public.booking
-    ADD CONSTRAINT booking_room_id_fkey FOREIGN KEY (room_id) REFERENCES public.room(room_id);
+    ADD CONSTRAINT booking_room_id_fkey FOREIGN KEY (room_id) REFERENCES public.room(room_id) ON DELETE CASCADE;
+
+
+--
+-- Name: booking_totals booking_totals_booking_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.booking_totals
+    ADD CONSTRAINT booking_totals_booking_id_fkey FOREIGN KEY (booking_id) REFERENCES public.booking(booking_id) ON UPDATE CASCADE ON DELETE CASCADE;
 
 
 --
@@ -773,7 +1314,7 @@ ALTER TABLE ONLY public.booking
 --
 
 ALTER TABLE ONLY public.bookingguest
-    ADD CONSTRAINT bookingguest_booking_id_fkey FOREIGN KEY (booking_id) REFERENCES public.booking(booking_id);
+    ADD CONSTRAINT bookingguest_booking_id_fkey FOREIGN KEY (booking_id) REFERENCES public.booking(booking_id) ON DELETE CASCADE;
 
 
 --
@@ -781,7 +1322,7 @@ ALTER TABLE ONLY public.bookingguest
 --
 
 ALTER TABLE ONLY public.bookingguest
-    ADD CONSTRAINT bookingguest_client_id_fkey FOREIGN KEY (client_id) REFERENCES public.client(client_id);
+    ADD CONSTRAINT bookingguest_client_id_fkey FOREIGN KEY (client_id) REFERENCES public.client(client_id) ON DELETE CASCADE;
 
 
 --
@@ -789,7 +1330,7 @@ ALTER TABLE ONLY public.bookingguest
 --
 
 ALTER TABLE ONLY public.bookingservice
-    ADD CONSTRAINT bookingservice_booking_id_fkey FOREIGN KEY (booking_id) REFERENCES public.booking(booking_id);
+    ADD CONSTRAINT bookingservice_booking_id_fkey FOREIGN KEY (booking_id) REFERENCES public.booking(booking_id) ON DELETE CASCADE;
 
 
 --
@@ -797,7 +1338,7 @@ ALTER TABLE ONLY public.bookingservice
 --
 
 ALTER TABLE ONLY public.bookingservice
-    ADD CONSTRAINT bookingservice_service_id_fkey FOREIGN KEY (service_id) REFERENCES public.service(service_id);
+    ADD CONSTRAINT bookingservice_service_id_fkey FOREIGN KEY (service_id) REFERENCES public.service(service_id) ON DELETE CASCADE;
 
 
 --
@@ -805,7 +1346,7 @@ ALTER TABLE ONLY public.bookingservice
 --
 
 ALTER TABLE ONLY public.room
-    ADD CONSTRAINT room_type_id_fkey FOREIGN KEY (type_id) REFERENCES public.roomtype(type_id);
+    ADD CONSTRAINT room_type_id_fkey FOREIGN KEY (type_id) REFERENCES public.roomtype(type_id) ON DELETE CASCADE;
 
 
 --
@@ -815,6 +1356,13 @@ ALTER TABLE ONLY public.room
 GRANT ALL ON FUNCTION public.calc_booking_totals(booking_id_param integer) TO manager_role;
 
 
+--
+-- Name: FUNCTION calc_booking_totals_range(date_from date, date_to date); Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT ALL ON FUNCTION public.calc_booking_totals_range(date_from date, date_to date) TO manager_role;
+
+
 --
 -- Name: FUNCTION check_booking_dates(); Type: ACL; Schema: public; Owner: postgres
 --
@@ -823,10 +1371,12 @@ GRANT ALL ON FUNCTION public.check_booking_dates() TO admin_role;
 
 
 --
--- Name: FUNCTION check_room_capacity(); Type: ACL; Schema: public; Owner: postgres
+-- Name: FUNCTION find_available_rooms(p_start date, p_end date, p_guests integer); Type: ACL; Schema: public; Owner: postgres
 --
 
-GRANT ALL ON FUNCTION public.check_room_capacity() TO admin_role;
+GRANT ALL ON FUNCTION public.find_available_rooms(p_start date, p_end date, p_guests integer) TO admin_role;
+GRANT ALL ON FUNCTION public.find_available_rooms(p_start date, p_end date, p_guests integer) TO manager_role;
+GRANT ALL ON FUNCTION public.find_available_rooms(p_start date, p_end date, p_guests integer) TO guest_role;
 
 
 --
@@ -838,10 +1388,11 @@ GRANT ALL ON FUNCTION public.get_booking_guests(booking_id_param integer) TO man
 
 
 --
--- Name: FUNCTION update_room_status_on_booking(); Type: ACL; Schema: public; Owner: postgres
+-- Name: FUNCTION refresh_room_status(); Type: ACL; Schema: public; Owner: postgres
 --
 
-GRANT ALL ON FUNCTION public.update_room_status_on_booking() TO admin_role;
+GRANT ALL ON FUNCTION public.refresh_room_status() TO admin_role;
+GRANT ALL ON FUNCTION public.refresh_room_status() TO manager_role;
 
 
 --
@@ -853,6 +1404,14 @@ GRANT SELECT,INSERT,UPDATE ON TABLE public.booking TO manager_role;
 GRANT INSERT ON TABLE public.booking TO guest_role;
 
 
+--
+-- Name: TABLE booking_totals; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT ALL ON TABLE public.booking_totals TO admin_role;
+GRANT SELECT ON TABLE public.booking_totals TO manager_role;
+
+
 --
 -- Name: TABLE bookingguest; Type: ACL; Schema: public; Owner: postgres
 --
@@ -896,6 +1455,15 @@ GRANT SELECT,INSERT,UPDATE ON TABLE public.room TO manager_role;
 GRANT SELECT ON TABLE public.room TO guest_role;
 
 
+--
+-- Name: TABLE room_occupancy; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT ALL ON TABLE public.room_occupancy TO admin_role;
+GRANT SELECT ON TABLE public.room_occupancy TO manager_role;
+GRANT SELECT ON TABLE public.room_occupancy TO guest_role;
+
+
 --
 -- Name: TABLE roomtype; Type: ACL; Schema: public; Owner: postgres
 --
@@ -913,6 +1481,13 @@ GRANT SELECT ON TABLE public.my_bookings TO guest_role;
 GRANT ALL ON TABLE public.my_bookings TO admin_role;
 
 
+--
+-- Name: TABLE schema_migrations; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT ALL ON TABLE public.schema_migrations TO admin_role;
+
+
 --
 -- Name: TABLE service; Type: ACL; Schema: public; Owner: postgres
 --
@@ -922,6 +1497,63 @@ GRANT SELECT ON TABLE public.service TO manager_role;
 GRANT SELECT ON TABLE public.service TO guest_role;
 
 
+--
+-- Name: SEQUENCE booking_booking_id_seq; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT ALL ON SEQUENCE public.booking_booking_id_seq TO admin_role;
+GRANT USAGE ON SEQUENCE public.booking_booking_id_seq TO manager_role;
+GRANT USAGE ON SEQUENCE public.booking_booking_id_seq TO guest_role;
+
+
+--
+-- Name: SEQUENCE bookingguest_client_b_id_seq; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT ALL ON SEQUENCE public.bookingguest_client_b_id_seq TO admin_role;
+GRANT USAGE ON SEQUENCE public.bookingguest_client_b_id_seq TO manager_role;
+GRANT USAGE ON SEQUENCE public.bookingguest_client_b_id_seq TO guest_role;
+
+
+--
+-- Name: SEQUENCE bookingservice_service_b_id_seq; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT ALL ON SEQUENCE public.bookingservice_service_b_id_seq TO admin_role;
+GRANT USAGE ON SEQUENCE public.bookingservice_service_b_id_seq TO manager_role;
+
+
+--
+-- Name: SEQUENCE client_client_id_seq; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT ALL ON SEQUENCE public.client_client_id_seq TO admin_role;
+GRANT USAGE ON SEQUENCE public.client_client_id_seq TO manager_role;
+GRANT USAGE ON SEQUENCE public.client_client_id_seq TO guest_role;
+
+
+--
+-- Name: SEQUENCE room_room_id_seq; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT ALL ON SEQUENCE public.room_room_id_seq TO admin_role;
+GRANT USAGE ON SEQUENCE public.room_room_id_seq TO manager_role;
+
+
+--
+-- Name: SEQUENCE roomtype_type_id_seq; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT ALL ON SEQUENCE public.roomtype_type_id_seq TO admin_role;
+
+
+--
+-- Name: SEQUENCE service_service_id_seq; Type: ACL; Schema: public; Owner: postgres
+--
+
+GRANT ALL ON SEQUENCE public.service_service_id_seq TO admin_role;
+
+
 --
 -- PostgreSQL database dump complete
 --
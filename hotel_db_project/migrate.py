@@ -0,0 +1,233 @@
+# migrate.py — версионные миграции схемы.
+# Файлы migrations/NNN_name.sql применяются по возрастанию номера, применённые версии
+# записываются в public.schema_migrations. Запускается приложением при входе администратора
+# или вручную:
+#
+#   python migrate.py                 применить новые миграции и проверить индексы (EXPLAIN)
+#   python migrate.py --status        показать применённые и ожидающие версии
+#   python migrate.py --verify        только проверить индексы
+#
+# Проверка индексов: OK — планировщик выбирает индекс сам; FORCED — индекс подходит
+# запросу, но выбирается только при enable_seqscan = off (обычно на маленьких таблицах);
+# FAIL — запрос не может использовать индекс вовсе, только это считается ошибкой.
+#
+# Файл с пометкой "-- migrate: no-transaction" выполняется вне транзакции по одному
+# оператору (нужно для CREATE INDEX CONCURRENTLY); операторы в нём разделяются ';'
+# в конце строки, тел функций ($$ ... $$) в таких файлах быть не должно.
+import argparse
+import os
+import re
+
+import psycopg2
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+NO_TRANSACTION_MARK = "-- migrate: no-transaction"
+LOCK_KEY = 7240311    # ключ advisory-блокировки: два процесса не применяют миграции одновременно
+CONCURRENT_INDEX_RE = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(?:\w+\.)?(\w+)", re.I)
+
+DEFAULT_DSN = "host=localhost port=5432 dbname=AD_hotel user=admin_user password=admin123"
+
+# горячие запросы приложения и индекс, которым каждый из них должен обслуживаться
+HOT_QUERIES = [
+    ("гости брони (детали, удаление брони)", "SELECT client_id FROM BookingGuest WHERE booking_id = 1",
+     "idx_bookingguest_booking"),
+    ("брони клиента (удаление клиента)", "SELECT booking_id FROM BookingGuest WHERE client_id = 1",
+     "idx_bookingguest_client"),
+    ("услуги брони", "SELECT service_id, quantity FROM BookingService WHERE booking_id = 1",
+     "bookingservice_booking_service_key"),
+    ("брони с услугой (удаление услуги)", "SELECT booking_id FROM BookingService WHERE service_id = 1",
+     "idx_bookingservice_service"),
+    ("брони номера (удаление номера)", "SELECT booking_id FROM Booking WHERE room_id = 1",
+     "booking_no_overlap"),
+    ("номера типа (удаление типа)", "SELECT room_id FROM Room WHERE type_id = 1",
+     "idx_room_type"),
+    ("поиск клиента по ФИО", "SELECT client_id FROM Client WHERE full_name ILIKE '%ива%' ORDER BY full_name <-> 'ива' LIMIT 20",
+     "idx_client_full_name_trgm"),
+    ("поиск клиента по паспорту", "SELECT client_id FROM Client WHERE passport_number LIKE '1234%' LIMIT 20",
+     "idx_client_passport_prefix"),
+    ("брони за период (отчёт по оплатам)",
+     "SELECT booking_id FROM Booking WHERE end_date > DATE '2025-12-01' AND start_date < DATE '2025-12-31'",
+     "idx_booking_dates"),
+]
+
+class MigrationError(Exception):
+    pass
+
+def discover(path=MIGRATIONS_DIR):
+    """[(version, name, file path)] sorted by version."""
+    found = []
+    for fn in os.listdir(path):
+        m = re.match(r"^(\d+)_(\w+)\.sql$", fn)
+        if m:
+            found.append((int(m.group(1)), m.group(2), os.path.join(path, fn)))
+    return sorted(found)
+
+def ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.schema_migrations (
+            version integer PRIMARY KEY,
+            name character varying(100) NOT NULL,
+            applied_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP NOT NULL
+        )
+    """)
+
+def applied_versions(cur):
+    cur.execute("SELECT version FROM public.schema_migrations")
+    return {r[0] for r in cur.fetchall()}
+
+def split_statements(sql):
+    stmts, buf = [], []
+    for line in sql.splitlines():
+        buf.append(line)
+        if line.rstrip().endswith(";"):
+            stmts.append("\n".join(buf).strip())
+            buf = []
+    # хвост из одних комментариев выполнять не нужно
+    if any(l.strip() and not l.strip().startswith("--") for l in buf):
+        stmts.append("\n".join(buf).strip())
+    return stmts
+
+def drop_invalid_indexes(cur, sql):
+    # индексы, брошенные прерванным CREATE INDEX CONCURRENTLY, не используются,
+    # а IF NOT EXISTS не дал бы их пересоздать. Удаляются только индексы этой миграции,
+    # и только если их не строит сейчас другой сеанс (до конца сборки индекс тоже invalid)
+    names = [n.lower() for n in CONCURRENT_INDEX_RE.findall(sql)]
+    if not names:
+        return
+    cur.execute("""
+        SELECT format('%%I.%%I', n.nspname, c.relname)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE NOT i.indisvalid AND n.nspname = 'public' AND c.relname = ANY(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_stat_progress_create_index p WHERE p.index_relid = i.indexrelid)
+    """, (names,))
+    for (name,) in cur.fetchall():
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+def migrate(conn, log=None):
+    """Apply pending migrations; returns [(version, name)] of the ones applied."""
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+    applied = []
+    try:
+        ensure_table(cur)
+        done = applied_versions(cur)
+        for version, name, path in discover():
+            if version in done:
+                continue
+            with open(path, encoding="utf-8") as f:
+                sql = f.read()
+            if log:
+                log(f"{version:03d} {name}")
+            try:
+                if NO_TRANSACTION_MARK in sql:
+                    drop_invalid_indexes(cur, sql)
+                    for stmt in split_statements(sql):
+                        cur.execute(stmt)
+                    cur.execute("INSERT INTO public.schema_migrations (version, name) VALUES (%s, %s)",
+                                (version, name))
+                else:
+                    conn.autocommit = False
+                    try:
+                        cur.execute(sql)
+                        cur.execute("INSERT INTO public.schema_migrations (version, name) VALUES (%s, %s)",
+                                    (version, name))
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                    finally:
+                        conn.autocommit = True
+            except psycopg2.Error as e:
+                raise MigrationError(f"Миграция {version:03d}_{name} не применена: {e}") from e
+            applied.append((version, name))
+        return applied
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+        cur.close()
+
+def status(conn):
+    """[(version, name, applied?)] for every migration file."""
+    with conn.cursor() as cur:
+        ensure_table(cur)
+        done = applied_versions(cur)
+    return [(version, name, version in done) for version, name, _ in discover()]
+
+def _index_names(plan):
+    names = set()
+    if isinstance(plan, dict):
+        if "Index Name" in plan:
+            names.add(plan["Index Name"])
+        for v in plan.values():
+            names |= _index_names(v)
+    elif isinstance(plan, list):
+        for v in plan:
+            names |= _index_names(v)
+    return names
+
+def verify(conn, queries=HOT_QUERIES):
+    """EXPLAIN every hot query; returns [(label, expected index, status, indexes in plan)].
+
+    status is "used" when the planner picks the index with default settings, "forced"
+    when it does so only with sequential scans disabled (the index is usable, but on
+    the current data a seq scan looks cheaper) and "missing" otherwise. The indexes
+    listed are those of the default plan.
+    """
+    def plan_indexes(cur, sql):
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+        return _index_names(cur.fetchone()[0])
+
+    results = []
+    autocommit = conn.autocommit
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            plans = [(label, sql, index, plan_indexes(cur, sql)) for label, sql, index in queries]
+            cur.execute("SET LOCAL enable_seqscan = off")
+            for label, sql, index, used in plans:
+                if index in used:
+                    status = "used"
+                else:
+                    status = "forced" if index in plan_indexes(cur, sql) else "missing"
+                results.append((label, index, status, sorted(used)))
+    finally:
+        conn.rollback()
+        conn.autocommit = autocommit
+    return results
+
+def main():
+    ap = argparse.ArgumentParser(description="Apply schema migrations from migrations/")
+    ap.add_argument("--dsn", default=os.environ.get("HOTEL_DSN", DEFAULT_DSN))
+    ap.add_argument("--status", action="store_true", help="только показать состояние")
+    ap.add_argument("--verify", action="store_true", help="только проверить индексы горячих запросов")
+    args = ap.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        if args.status:
+            for version, name, done in status(conn):
+                print(f"{version:03d} {name:40} {'applied' if done else 'pending'}")
+            return 0
+        if not args.verify:
+            applied = migrate(conn, log=lambda m: print(f"apply {m}"))
+            print(f"применено миграций: {len(applied)}")
+        failed = 0
+        marks = {"used": "OK    ", "forced": "FORCED", "missing": "FAIL  "}
+        for label, index, status, used in verify(conn):
+            line = f"{marks[status]} {label}: {index}"
+            if status != "used":
+                line += f" (в обычном плане: {', '.join(used) or 'seq scan'})"
+            print(line)
+            failed += status == "missing"
+        return 1 if failed else 0
+    except MigrationError as e:
+        print(e)
+        return 1
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    raise SystemExit(main())
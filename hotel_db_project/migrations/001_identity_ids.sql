@@ -0,0 +1,35 @@
+-- 001: identity-колонки для всех первичных ключей вместо SELECT MAX(id)+1 в приложении.
+-- Для базы, созданной из актуального init.sql, ничего не меняет (колонки уже identity),
+-- только подтягивает значения последовательностей.
+
+DO $$
+DECLARE
+    t record;
+    seq text;
+BEGIN
+    FOR t IN SELECT * FROM (VALUES
+            ('booking', 'booking_id'),
+            ('bookingguest', 'client_b_id'),
+            ('bookingservice', 'service_b_id'),
+            ('client', 'client_id'),
+            ('room', 'room_id'),
+            ('roomtype', 'type_id'),
+            ('service', 'service_id')
+        ) AS v(tbl, col)
+    LOOP
+        IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_schema = 'public' AND table_name = t.tbl
+                         AND column_name = t.col AND is_identity = 'YES') THEN
+            EXECUTE format('ALTER TABLE public.%I ALTER COLUMN %I ADD GENERATED BY DEFAULT AS IDENTITY', t.tbl, t.col);
+        END IF;
+        seq := pg_get_serial_sequence(format('public.%I', t.tbl), t.col);
+        EXECUTE format('SELECT setval(%L, COALESCE((SELECT MAX(%I) FROM public.%I), 0) + 1, false)', seq, t.col, t.tbl);
+    END LOOP;
+END;
+$$;
+
+GRANT USAGE ON SEQUENCE public.booking_booking_id_seq TO manager_role, guest_role;
+GRANT USAGE ON SEQUENCE public.bookingguest_client_b_id_seq TO manager_role, guest_role;
+GRANT USAGE ON SEQUENCE public.bookingservice_service_b_id_seq TO manager_role;
+GRANT USAGE ON SEQUENCE public.client_client_id_seq TO manager_role, guest_role;
+GRANT USAGE ON SEQUENCE public.room_room_id_seq TO manager_role;
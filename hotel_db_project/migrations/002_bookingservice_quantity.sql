@@ -0,0 +1,79 @@
+-- 002: одна строка BookingService на (бронь, услуга) с количеством и ценой на момент добавления
+-- вместо отдельной строки на каждую единицу услуги.
+
+ALTER TABLE public.bookingservice ADD COLUMN IF NOT EXISTS quantity integer DEFAULT 1 NOT NULL;
+ALTER TABLE public.bookingservice ADD COLUMN IF NOT EXISTS unit_price numeric(10,2);
+
+UPDATE public.bookingservice bs
+SET unit_price = s.price
+FROM public.service s
+WHERE bs.service_id = s.service_id AND bs.unit_price IS NULL;
+
+-- схлопываем дубли: остаётся строка с минимальным service_b_id, количество суммируется
+WITH grp AS (
+    SELECT booking_id, service_id, MIN(service_b_id) AS keep_id, SUM(quantity) AS qty
+    FROM public.bookingservice
+    GROUP BY booking_id, service_id
+    HAVING COUNT(*) > 1
+), upd AS (
+    UPDATE public.bookingservice bs SET quantity = grp.qty
+    FROM grp WHERE bs.service_b_id = grp.keep_id
+)
+DELETE FROM public.bookingservice bs
+USING grp
+WHERE bs.booking_id = grp.booking_id AND bs.service_id = grp.service_id
+  AND bs.service_b_id <> grp.keep_id;
+
+ALTER TABLE public.bookingservice ALTER COLUMN unit_price SET NOT NULL;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'chk_quantity'
+                   AND conrelid = 'public.bookingservice'::regclass) THEN
+        ALTER TABLE public.bookingservice ADD CONSTRAINT chk_quantity CHECK ((quantity > 0));
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'bookingservice_booking_service_key'
+                   AND conrelid = 'public.bookingservice'::regclass) THEN
+        ALTER TABLE public.bookingservice
+            ADD CONSTRAINT bookingservice_booking_service_key UNIQUE (booking_id, service_id);
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.fn_set_service_unit_price() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    -- фиксируем цену услуги на момент добавления в бронь
+    SELECT s.price INTO NEW.unit_price FROM Service s WHERE s.service_id = NEW.service_id;
+    IF NEW.unit_price IS NULL THEN
+        RAISE EXCEPTION 'Service id % not found for price snapshot', NEW.service_id;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_set_service_unit_price ON public.bookingservice;
+CREATE TRIGGER trg_set_service_unit_price BEFORE INSERT ON public.bookingservice FOR EACH ROW WHEN ((new.unit_price IS NULL)) EXECUTE FUNCTION public.fn_set_service_unit_price();
+
+CREATE OR REPLACE FUNCTION public.calc_booking_totals(booking_id_param integer) RETURNS TABLE(nights integer, room_total numeric, services_total numeric, booking_fee numeric, prepayments_total numeric, balance numeric)
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    price DECIMAL;
+BEGIN
+    SELECT rt.price INTO price
+    FROM Booking b JOIN Room r ON b.room_id = r.room_id JOIN RoomType rt ON r.type_id = rt.type_id
+    WHERE b.booking_id = booking_id_param;
+
+    SELECT (b.end_date - b.start_date)::int, (b.end_date - b.start_date) * price,
+           COALESCE((SELECT SUM(bs.quantity * bs.unit_price) FROM BookingService bs WHERE bs.booking_id = booking_id_param),0),
+           b.booking_fee,
+           COALESCE((SELECT SUM(c.prepayment) FROM BookingGuest bg JOIN Client c ON bg.client_id = c.client_id WHERE bg.booking_id = booking_id_param),0)
+    INTO nights, room_total, services_total, booking_fee, prepayments_total
+    FROM Booking b WHERE b.booking_id = booking_id_param;
+
+    balance := prepayments_total - (room_total + COALESCE(booking_fee,0) + services_total);
+    RETURN NEXT;
+END;
+$$;
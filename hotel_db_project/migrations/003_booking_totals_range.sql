@@ -0,0 +1,40 @@
+-- 003: отчёт по оплатам одним запросом — calc_booking_totals для диапазона броней
+-- вместе со списками гостей и услуг.
+
+CREATE OR REPLACE FUNCTION public.calc_booking_totals_range(date_from date DEFAULT NULL::date, date_to date DEFAULT NULL::date) RETURNS TABLE(booking_id integer, nights integer, room_total numeric, services_total numeric, booking_fee numeric, prepayments_total numeric, balance numeric, guests json, services json)
+    LANGUAGE sql STABLE
+    AS $$
+    -- то же, что calc_booking_totals, но сразу для всех броней, пересекающих [date_from, date_to)
+    -- (NULL — без ограничения), вместе со списками гостей и услуг: один запрос на весь отчёт
+    WITH b AS (
+        SELECT b.booking_id, (b.end_date - b.start_date)::int AS nights,
+               (b.end_date - b.start_date) * rt.price AS room_total, b.booking_fee
+        FROM Booking b
+        JOIN Room r ON b.room_id = r.room_id
+        JOIN RoomType rt ON r.type_id = rt.type_id
+        WHERE (date_from IS NULL OR b.end_date > date_from)
+          AND (date_to IS NULL OR b.start_date < date_to)
+    ), g AS (
+        SELECT bg.booking_id, SUM(c.prepayment) AS prepayments_total,
+               json_agg(json_build_array(c.client_id, c.full_name, c.prepayment) ORDER BY c.client_id) AS guests
+        FROM BookingGuest bg JOIN Client c ON bg.client_id = c.client_id
+        WHERE bg.booking_id IN (SELECT booking_id FROM b)
+        GROUP BY bg.booking_id
+    ), s AS (
+        SELECT bs.booking_id, SUM(bs.quantity * bs.unit_price) AS services_total,
+               json_agg(json_build_array(sv.service_id, sv.name, bs.unit_price, bs.quantity) ORDER BY sv.service_id) AS services
+        FROM BookingService bs JOIN Service sv ON bs.service_id = sv.service_id
+        WHERE bs.booking_id IN (SELECT booking_id FROM b)
+        GROUP BY bs.booking_id
+    )
+    SELECT b.booking_id, b.nights, b.room_total,
+           COALESCE(s.services_total, 0), b.booking_fee, COALESCE(g.prepayments_total, 0),
+           COALESCE(g.prepayments_total, 0) - (b.room_total + COALESCE(b.booking_fee, 0) + COALESCE(s.services_total, 0)),
+           COALESCE(g.guests, '[]'::json), COALESCE(s.services, '[]'::json)
+    FROM b
+    LEFT JOIN g ON g.booking_id = b.booking_id
+    LEFT JOIN s ON s.booking_id = b.booking_id
+    ORDER BY b.booking_id;
+$$;
+
+GRANT ALL ON FUNCTION public.calc_booking_totals_range(date_from date, date_to date) TO manager_role;
@@ -0,0 +1,39 @@
+-- 004: уведомления об изменениях для живого обновления интерфейса.
+-- Каждая изменённая строка брони/гостей/услуг/номера/клиента шлёт в канал hotel_changes
+-- компактный JSON {"table", "op", "id"}; приложение слушает канал и перечитывает только эти строки.
+
+CREATE OR REPLACE FUNCTION public.fn_notify_change() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    new_id text;
+    old_id text;
+BEGIN
+    -- TG_ARGV[0] — столбец, id из которого уходит в уведомление
+    -- (для гостей и услуг брони — booking_id: в интерфейсе меняется строка брони)
+    IF TG_OP <> 'DELETE' THEN
+        new_id := to_jsonb(NEW) ->> TG_ARGV[0];
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        old_id := to_jsonb(OLD) ->> TG_ARGV[0];
+    END IF;
+    IF new_id IS NOT NULL THEN
+        PERFORM pg_notify('hotel_changes', jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', new_id::int)::text);
+    END IF;
+    IF old_id IS NOT NULL AND old_id IS DISTINCT FROM new_id THEN
+        PERFORM pg_notify('hotel_changes', jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', old_id::int)::text);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_notify_change ON public.booking;
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.booking FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('booking_id');
+DROP TRIGGER IF EXISTS trg_notify_change ON public.bookingguest;
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.bookingguest FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('booking_id');
+DROP TRIGGER IF EXISTS trg_notify_change ON public.bookingservice;
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.bookingservice FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('booking_id');
+DROP TRIGGER IF EXISTS trg_notify_change ON public.client;
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.client FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('client_id');
+DROP TRIGGER IF EXISTS trg_notify_change ON public.room;
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.room FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('room_id');
@@ -0,0 +1,7 @@
+-- 005: уведомления об изменении справочников RoomType и Service —
+-- по ним приложение сбрасывает свою копию справочника.
+
+DROP TRIGGER IF EXISTS trg_notify_change ON public.roomtype;
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.roomtype FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('type_id');
+DROP TRIGGER IF EXISTS trg_notify_change ON public.service;
+CREATE TRIGGER trg_notify_change AFTER INSERT OR DELETE OR UPDATE ON public.service FOR EACH ROW EXECUTE FUNCTION public.fn_notify_change('service_id');
@@ -0,0 +1,29 @@
+-- 006: поиск свободных номеров на весь период с учётом вместимости.
+-- Пересечение периодов проверяется по GiST-индексу на daterange(start_date, end_date).
+
+CREATE INDEX IF NOT EXISTS idx_booking_period ON public.booking USING gist (daterange(start_date, end_date));
+
+CREATE OR REPLACE FUNCTION public.find_available_rooms(p_start date, p_end date, p_guests integer DEFAULT 1) RETURNS TABLE(room_id integer, room_number character varying, type_name character varying, price numeric, capacity integer, status character varying)
+    LANGUAGE sql STABLE SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+    -- номера, свободные на весь период [p_start, p_end) и вмещающие p_guests гостей;
+    -- пересечение периодов ищется по GiST-индексу idx_booking_period.
+    -- SECURITY DEFINER: гость видит занятость, не имея доступа к таблице Booking
+    SELECT r.room_id, r.room_number, rt.name, rt.price, rt.capacity, r.status
+    FROM Room r
+    JOIN RoomType rt ON r.type_id = rt.type_id
+    WHERE rt.capacity >= p_guests
+      AND NOT EXISTS (
+          SELECT 1 FROM Booking b
+          WHERE b.room_id = r.room_id
+            AND daterange(b.start_date, b.end_date) && daterange(p_start, p_end)
+      )
+    ORDER BY r.room_id
+$$;
+
+ALTER FUNCTION public.find_available_rooms(p_start date, p_end date, p_guests integer) OWNER TO postgres;
+
+GRANT ALL ON FUNCTION public.find_available_rooms(p_start date, p_end date, p_guests integer) TO admin_role;
+GRANT ALL ON FUNCTION public.find_available_rooms(p_start date, p_end date, p_guests integer) TO manager_role;
+GRANT ALL ON FUNCTION public.find_available_rooms(p_start date, p_end date, p_guests integer) TO guest_role;
@@ -0,0 +1,54 @@
+-- 007: запрет пересекающихся броней одного номера — ограничением EXCLUDE вместо
+-- триггера fn_check_booking_overlap (COUNT(*) без индекса на каждую вставку, и без
+-- защиты от одновременных вставок). Индекс ограничения заодно обслуживает
+-- find_available_rooms, поэтому отдельный idx_booking_period больше не нужен.
+
+CREATE EXTENSION IF NOT EXISTS btree_gist WITH SCHEMA public;
+
+DO $$
+DECLARE
+    removed text;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_constraint
+               WHERE conname = 'booking_no_overlap' AND conrelid = 'public.booking'::regclass) THEN
+        RETURN;
+    END IF;
+
+    -- пустые брони (без гостей и услуг), пересекающиеся с другой бронью того же номера, —
+    -- дубли, оставшиеся с тех пор, когда проверки не было; их удаляем. Из двух пустых
+    -- пересекающихся остаётся более ранняя, бронь с гостями или услугами не удаляется никогда
+    WITH del AS (
+        DELETE FROM public.booking b
+        WHERE NOT EXISTS (SELECT 1 FROM public.bookingguest bg WHERE bg.booking_id = b.booking_id)
+          AND NOT EXISTS (SELECT 1 FROM public.bookingservice bs WHERE bs.booking_id = b.booking_id)
+          AND EXISTS (SELECT 1 FROM public.booking o
+                      WHERE o.room_id = b.room_id AND o.booking_id <> b.booking_id
+                        AND daterange(o.start_date, o.end_date) && daterange(b.start_date, b.end_date)
+                        AND (o.booking_id < b.booking_id
+                             OR EXISTS (SELECT 1 FROM public.bookingguest og WHERE og.booking_id = o.booking_id)
+                             OR EXISTS (SELECT 1 FROM public.bookingservice os WHERE os.booking_id = o.booking_id)))
+        RETURNING b.booking_id
+    )
+    SELECT string_agg(booking_id::text, ', ' ORDER BY booking_id) INTO removed FROM del;
+    IF removed IS NOT NULL THEN
+        RAISE NOTICE 'Удалены пустые брони-дубли: %', removed;
+    END IF;
+
+    -- остальные пересечения автоматически не разрешить — останавливаемся со списком
+    IF EXISTS (SELECT 1 FROM public.booking a JOIN public.booking o
+               ON o.room_id = a.room_id AND o.booking_id > a.booking_id
+              AND daterange(o.start_date, o.end_date) && daterange(a.start_date, a.end_date)) THEN
+        RAISE EXCEPTION 'Пересекающиеся брони: %', (
+            SELECT string_agg(a.booking_id || '/' || o.booking_id, ', ')
+            FROM public.booking a JOIN public.booking o
+              ON o.room_id = a.room_id AND o.booking_id > a.booking_id
+             AND daterange(o.start_date, o.end_date) && daterange(a.start_date, a.end_date));
+    END IF;
+
+    ALTER TABLE public.booking
+        ADD CONSTRAINT booking_no_overlap EXCLUDE USING gist (room_id WITH =, daterange(start_date, end_date) WITH &&);
+END $$;
+
+DROP TRIGGER IF EXISTS trg_check_overlap ON public.booking;
+DROP FUNCTION IF EXISTS public.fn_check_booking_overlap();
+DROP INDEX IF EXISTS public.idx_booking_period;
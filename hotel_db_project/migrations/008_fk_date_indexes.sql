@@ -0,0 +1,12 @@
+-- 008: индексы под внешние ключи и даты броней.
+-- migrate: no-transaction
+-- CONCURRENTLY не блокирует запись в таблицы, пока индекс строится, но не работает
+-- внутри транзакции — поэтому файл выполняется по одному оператору.
+-- booking.room_id отдельного индекса не требует: его покрывает GiST-индекс ограничения
+-- booking_no_overlap, bookingservice.booking_id — уникальный ключ (booking_id, service_id).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bookingguest_booking ON public.bookingguest USING btree (booking_id, client_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bookingguest_client ON public.bookingguest USING btree (client_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bookingservice_service ON public.bookingservice USING btree (service_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_room_type ON public.room USING btree (type_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_booking_dates ON public.booking USING btree (start_date, end_date);
@@ -0,0 +1,196 @@
+-- 009: итоги броней в таблице booking_totals, которую триггеры обновляют при изменении
+-- брони, её гостей и услуг, предоплаты клиента, типа номера и цены типа.
+-- calc_booking_totals и calc_booking_totals_range читают готовые итоги.
+
+CREATE TABLE IF NOT EXISTS public.booking_totals (
+    booking_id integer NOT NULL,
+    nights integer NOT NULL,
+    room_total numeric(12,2) NOT NULL,
+    services_total numeric(12,2) DEFAULT 0 NOT NULL,
+    booking_fee numeric(10,2) NOT NULL,
+    prepayments_total numeric(12,2) DEFAULT 0 NOT NULL,
+    balance numeric(12,2) GENERATED ALWAYS AS ((prepayments_total - ((room_total + booking_fee) + services_total))) STORED
+);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'booking_totals_pkey') THEN
+        ALTER TABLE public.booking_totals ADD CONSTRAINT booking_totals_pkey PRIMARY KEY (booking_id);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'booking_totals_booking_id_fkey') THEN
+        ALTER TABLE public.booking_totals ADD CONSTRAINT booking_totals_booking_id_fkey FOREIGN KEY (booking_id) REFERENCES public.booking(booking_id) ON UPDATE CASCADE ON DELETE CASCADE;
+    END IF;
+END $$;
+
+CREATE OR REPLACE FUNCTION public.fn_totals_on_booking() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+BEGIN
+    -- ночи, проживание и сбор брони; суммы услуг и предоплат ведут триггеры
+    -- bookingservice и bookingguest
+    INSERT INTO booking_totals (booking_id, nights, room_total, booking_fee)
+    SELECT NEW.booking_id, NEW.end_date - NEW.start_date, (NEW.end_date - NEW.start_date) * rt.price, NEW.booking_fee
+    FROM Room r JOIN RoomType rt ON rt.type_id = r.type_id
+    WHERE r.room_id = NEW.room_id
+    ON CONFLICT (booking_id) DO UPDATE
+        SET nights = EXCLUDED.nights, room_total = EXCLUDED.room_total, booking_fee = EXCLUDED.booking_fee;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.fn_totals_on_bookingguest() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+BEGIN
+    -- предоплаты гостей брони пересчитываются по её составу: при каскадном удалении
+    -- клиента его строка в Client уже недоступна, разницу не вычислить
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE booking_totals
+        SET prepayments_total = COALESCE((SELECT SUM(c.prepayment) FROM BookingGuest bg
+                                          JOIN Client c ON c.client_id = bg.client_id
+                                          WHERE bg.booking_id = OLD.booking_id), 0)
+        WHERE booking_id = OLD.booking_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE booking_totals
+        SET prepayments_total = COALESCE((SELECT SUM(c.prepayment) FROM BookingGuest bg
+                                          JOIN Client c ON c.client_id = bg.client_id
+                                          WHERE bg.booking_id = NEW.booking_id), 0)
+        WHERE booking_id = NEW.booking_id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.fn_totals_on_bookingservice() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE booking_totals SET services_total = services_total - OLD.quantity * OLD.unit_price
+        WHERE booking_id = OLD.booking_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE booking_totals SET services_total = services_total + NEW.quantity * NEW.unit_price
+        WHERE booking_id = NEW.booking_id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.fn_totals_on_client() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+BEGIN
+    -- изменилась предоплата — сдвигаем итоги всех броней клиента на разницу
+    IF NEW.prepayment IS DISTINCT FROM OLD.prepayment THEN
+        UPDATE booking_totals t
+        SET prepayments_total = t.prepayments_total + (COALESCE(NEW.prepayment, 0) - COALESCE(OLD.prepayment, 0)) * g.n
+        FROM (SELECT booking_id, COUNT(*) AS n FROM BookingGuest WHERE client_id = NEW.client_id GROUP BY booking_id) g
+        WHERE t.booking_id = g.booking_id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.fn_totals_on_room() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+BEGIN
+    -- номер сменил тип — проживание по его броням считается по новой цене
+    UPDATE booking_totals t
+    SET room_total = t.nights * rt.price
+    FROM Booking b, RoomType rt
+    WHERE b.room_id = NEW.room_id AND t.booking_id = b.booking_id AND rt.type_id = NEW.type_id;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.fn_totals_on_roomtype() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+BEGIN
+    UPDATE booking_totals t
+    SET room_total = t.nights * NEW.price
+    FROM Booking b JOIN Room r ON r.room_id = b.room_id
+    WHERE r.type_id = NEW.type_id AND t.booking_id = b.booking_id;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_booking_totals ON public.booking;
+CREATE TRIGGER trg_booking_totals AFTER INSERT OR UPDATE OF room_id, start_date, end_date, booking_fee ON public.booking FOR EACH ROW EXECUTE FUNCTION public.fn_totals_on_booking();
+DROP TRIGGER IF EXISTS trg_booking_totals ON public.bookingguest;
+CREATE TRIGGER trg_booking_totals AFTER INSERT OR DELETE OR UPDATE OF booking_id, client_id ON public.bookingguest FOR EACH ROW EXECUTE FUNCTION public.fn_totals_on_bookingguest();
+DROP TRIGGER IF EXISTS trg_booking_totals ON public.bookingservice;
+CREATE TRIGGER trg_booking_totals AFTER INSERT OR DELETE OR UPDATE OF booking_id, quantity, unit_price ON public.bookingservice FOR EACH ROW EXECUTE FUNCTION public.fn_totals_on_bookingservice();
+DROP TRIGGER IF EXISTS trg_booking_totals ON public.client;
+CREATE TRIGGER trg_booking_totals AFTER UPDATE OF prepayment ON public.client FOR EACH ROW EXECUTE FUNCTION public.fn_totals_on_client();
+DROP TRIGGER IF EXISTS trg_booking_totals ON public.room;
+CREATE TRIGGER trg_booking_totals AFTER UPDATE OF type_id ON public.room FOR EACH ROW EXECUTE FUNCTION public.fn_totals_on_room();
+DROP TRIGGER IF EXISTS trg_booking_totals ON public.roomtype;
+CREATE TRIGGER trg_booking_totals AFTER UPDATE OF price ON public.roomtype FOR EACH ROW EXECUTE FUNCTION public.fn_totals_on_roomtype();
+
+-- первичное заполнение (и пересчёт, если таблица уже была)
+INSERT INTO public.booking_totals (booking_id, nights, room_total, services_total, booking_fee, prepayments_total)
+SELECT b.booking_id, b.end_date - b.start_date, (b.end_date - b.start_date) * rt.price,
+       COALESCE((SELECT SUM(bs.quantity * bs.unit_price) FROM public.bookingservice bs WHERE bs.booking_id = b.booking_id), 0),
+       b.booking_fee,
+       COALESCE((SELECT SUM(c.prepayment) FROM public.bookingguest bg JOIN public.client c ON c.client_id = bg.client_id
+                 WHERE bg.booking_id = b.booking_id), 0)
+FROM public.booking b
+JOIN public.room r ON r.room_id = b.room_id
+JOIN public.roomtype rt ON rt.type_id = r.type_id
+ON CONFLICT (booking_id) DO UPDATE
+    SET nights = EXCLUDED.nights, room_total = EXCLUDED.room_total, services_total = EXCLUDED.services_total,
+        booking_fee = EXCLUDED.booking_fee, prepayments_total = EXCLUDED.prepayments_total;
+
+CREATE OR REPLACE FUNCTION public.calc_booking_totals(booking_id_param integer) RETURNS TABLE(nights integer, room_total numeric, services_total numeric, booking_fee numeric, prepayments_total numeric, balance numeric)
+    LANGUAGE sql STABLE
+    AS $$
+    -- итоги ведутся триггерами в booking_totals — здесь только чтение по ключу
+    SELECT t.nights, t.room_total, t.services_total, t.booking_fee, t.prepayments_total, t.balance
+    FROM booking_totals t
+    WHERE t.booking_id = booking_id_param;
+$$;
+
+CREATE OR REPLACE FUNCTION public.calc_booking_totals_range(date_from date DEFAULT NULL::date, date_to date DEFAULT NULL::date) RETURNS TABLE(booking_id integer, nights integer, room_total numeric, services_total numeric, booking_fee numeric, prepayments_total numeric, balance numeric, guests json, services json)
+    LANGUAGE sql STABLE
+    AS $$
+    -- итоги всех броней, пересекающих [date_from, date_to) (NULL — без ограничения), из booking_totals
+    -- вместе со списками гостей и услуг: один запрос на весь отчёт
+    WITH b AS (
+        SELECT t.booking_id, t.nights, t.room_total, t.services_total, t.booking_fee, t.prepayments_total, t.balance
+        FROM Booking b
+        JOIN booking_totals t ON t.booking_id = b.booking_id
+        WHERE (date_from IS NULL OR b.end_date > date_from)
+          AND (date_to IS NULL OR b.start_date < date_to)
+    ), g AS (
+        SELECT bg.booking_id,
+               json_agg(json_build_array(c.client_id, c.full_name, c.prepayment) ORDER BY c.client_id) AS guests
+        FROM BookingGuest bg JOIN Client c ON bg.client_id = c.client_id
+        WHERE bg.booking_id IN (SELECT booking_id FROM b)
+        GROUP BY bg.booking_id
+    ), s AS (
+        SELECT bs.booking_id,
+               json_agg(json_build_array(sv.service_id, sv.name, bs.unit_price, bs.quantity) ORDER BY sv.service_id) AS services
+        FROM BookingService bs JOIN Service sv ON bs.service_id = sv.service_id
+        WHERE bs.booking_id IN (SELECT booking_id FROM b)
+        GROUP BY bs.booking_id
+    )
+    SELECT b.booking_id, b.nights, b.room_total, b.services_total, b.booking_fee, b.prepayments_total, b.balance,
+           COALESCE(g.guests, '[]'::json), COALESCE(s.services, '[]'::json)
+    FROM b
+    LEFT JOIN g ON g.booking_id = b.booking_id
+    LEFT JOIN s ON s.booking_id = b.booking_id
+    ORDER BY b.booking_id;
+$$;
+
+GRANT ALL ON TABLE public.booking_totals TO admin_role;
+GRANT SELECT ON TABLE public.booking_totals TO manager_role;
@@ -0,0 +1,49 @@
+-- 010: счётчик гостей booking.guest_count, который ведёт один триггер на BookingGuest.
+-- Им же проверяется вместимость номера — вместо двух триггеров, считавших COUNT(*)
+-- гостей брони на каждой вставке.
+
+ALTER TABLE public.booking ADD COLUMN IF NOT EXISTS guest_count integer DEFAULT 0 NOT NULL;
+
+UPDATE public.booking b
+SET guest_count = g.n
+FROM (SELECT bk.booking_id, COUNT(bg.client_id) AS n
+      FROM public.booking bk LEFT JOIN public.bookingguest bg ON bg.booking_id = bk.booking_id
+      GROUP BY bk.booking_id) g
+WHERE g.booking_id = b.booking_id AND b.guest_count IS DISTINCT FROM g.n;
+
+CREATE OR REPLACE FUNCTION public.fn_booking_guest_count() RETURNS trigger
+    LANGUAGE plpgsql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+DECLARE
+    cnt INT;
+    room_cap INT;
+BEGIN
+    -- счётчик гостей брони; UPDATE блокирует строку брони, так что параллельные
+    -- вставки гостей в одну бронь не обойдут проверку вместимости
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE Booking SET guest_count = guest_count - 1 WHERE booking_id = OLD.booking_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE Booking SET guest_count = guest_count + 1 WHERE booking_id = NEW.booking_id
+        RETURNING guest_count, (SELECT rt.capacity FROM Room r JOIN RoomType rt ON r.type_id = rt.type_id
+                                WHERE r.room_id = Booking.room_id)
+        INTO cnt, room_cap;
+        IF room_cap IS NULL THEN
+            RAISE EXCEPTION 'Не найдена броь или номер для booking_id=%', NEW.booking_id;
+        END IF;
+        IF cnt > room_cap THEN
+            RAISE EXCEPTION 'Превышена вместимость номера: гостей=% (вместимость=%)', cnt, room_cap;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_check_capacity ON public.bookingguest;
+DROP TRIGGER IF EXISTS trg_check_room_capacity ON public.bookingguest;
+DROP FUNCTION IF EXISTS public.fn_check_room_capacity();
+DROP FUNCTION IF EXISTS public.check_room_capacity();
+
+DROP TRIGGER IF EXISTS trg_guest_count ON public.bookingguest;
+CREATE TRIGGER trg_guest_count AFTER INSERT OR DELETE OR UPDATE OF booking_id ON public.bookingguest FOR EACH ROW EXECUTE FUNCTION public.fn_booking_guest_count();
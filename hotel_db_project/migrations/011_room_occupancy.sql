@@ -0,0 +1,72 @@
+-- 011: занятость номера считается при чтении — представление room_occupancy по
+-- индексу booking_no_overlap (бронь, чей период содержит сегодняшний день).
+-- Триггер trg_update_room_status больше не пишет в Room при каждой брони: Room.status
+-- остаётся снимком на начало дня, его обновляет refresh_room_status() при смене дня.
+
+CREATE OR REPLACE VIEW public.room_occupancy AS
+ SELECT r.room_id,
+    r.room_number,
+    r.type_id,
+        CASE
+            WHEN (EXISTS ( SELECT 1
+               FROM public.booking b
+              WHERE ((b.room_id = r.room_id) AND (daterange(b.start_date, b.end_date) @> CURRENT_DATE)))) THEN 'занят'::character varying
+            ELSE 'свободен'::character varying
+        END AS status
+   FROM public.room r;
+
+CREATE OR REPLACE FUNCTION public.refresh_room_status() RETURNS integer
+    LANGUAGE sql SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+    -- снимок занятости на сегодня в Room.status; запускается при смене дня
+    -- (pg_cron или приложение) и трогает только изменившиеся строки
+    WITH upd AS (
+        UPDATE Room r SET status = o.status
+        FROM room_occupancy o
+        WHERE o.room_id = r.room_id AND r.status IS DISTINCT FROM o.status
+        RETURNING 1
+    )
+    SELECT COUNT(*)::integer FROM upd;
+$$;
+
+CREATE OR REPLACE FUNCTION public.find_available_rooms(p_start date, p_end date, p_guests integer DEFAULT 1) RETURNS TABLE(room_id integer, room_number character varying, type_name character varying, price numeric, capacity integer, status character varying)
+    LANGUAGE sql STABLE SECURITY DEFINER
+    SET search_path TO 'public'
+    AS $$
+    -- номера, свободные на весь период [p_start, p_end) и вмещающие p_guests гостей;
+    -- пересечение периодов ищется по GiST-индексу ограничения booking_no_overlap.
+    -- SECURITY DEFINER: гость видит занятость, не имея доступа к таблице Booking
+    SELECT r.room_id, r.room_number, rt.name, rt.price, rt.capacity, r.status
+    FROM room_occupancy r
+    JOIN RoomType rt ON r.type_id = rt.type_id
+    WHERE rt.capacity >= p_guests
+      AND NOT EXISTS (
+          SELECT 1 FROM Booking b
+          WHERE b.room_id = r.room_id
+            AND daterange(b.start_date, b.end_date) && daterange(p_start, p_end)
+      )
+    ORDER BY r.room_id
+$$;
+
+DROP TRIGGER IF EXISTS trg_update_room_status ON public.booking;
+DROP FUNCTION IF EXISTS public.update_room_status_on_booking();
+DROP FUNCTION IF EXISTS public.tg_update_room_status_on_booking();
+DROP FUNCTION IF EXISTS public.fn_update_room_status(integer);
+
+GRANT ALL ON TABLE public.room_occupancy TO admin_role;
+GRANT SELECT ON TABLE public.room_occupancy TO manager_role;
+GRANT SELECT ON TABLE public.room_occupancy TO guest_role;
+GRANT ALL ON FUNCTION public.refresh_room_status() TO admin_role;
+GRANT ALL ON FUNCTION public.refresh_room_status() TO manager_role;
+
+SELECT public.refresh_room_status();
+
+-- если на сервере есть pg_cron, снимок обновляется им в начале каждого дня;
+-- иначе это делает приложение (MainApp) при запуске и в полночь
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('room-status-rollover', '1 0 * * *', 'SELECT public.refresh_room_status()');
+    END IF;
+END $$;
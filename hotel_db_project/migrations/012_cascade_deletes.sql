@@ -0,0 +1,22 @@
+-- 012: внешние ключи с ON DELETE CASCADE — удаление номера, типа, клиента, услуги или брони
+-- одной командой убирает зависимые строки (брони номера, гостей и услуги брони и т.д.),
+-- приложение больше не удаляет их по отдельности.
+
+ALTER TABLE public.booking
+    DROP CONSTRAINT IF EXISTS booking_room_id_fkey,
+    ADD CONSTRAINT booking_room_id_fkey FOREIGN KEY (room_id) REFERENCES public.room(room_id) ON DELETE CASCADE;
+ALTER TABLE public.bookingguest
+    DROP CONSTRAINT IF EXISTS bookingguest_booking_id_fkey,
+    ADD CONSTRAINT bookingguest_booking_id_fkey FOREIGN KEY (booking_id) REFERENCES public.booking(booking_id) ON DELETE CASCADE;
+ALTER TABLE public.bookingguest
+    DROP CONSTRAINT IF EXISTS bookingguest_client_id_fkey,
+    ADD CONSTRAINT bookingguest_client_id_fkey FOREIGN KEY (client_id) REFERENCES public.client(client_id) ON DELETE CASCADE;
+ALTER TABLE public.bookingservice
+    DROP CONSTRAINT IF EXISTS bookingservice_booking_id_fkey,
+    ADD CONSTRAINT bookingservice_booking_id_fkey FOREIGN KEY (booking_id) REFERENCES public.booking(booking_id) ON DELETE CASCADE;
+ALTER TABLE public.bookingservice
+    DROP CONSTRAINT IF EXISTS bookingservice_service_id_fkey,
+    ADD CONSTRAINT bookingservice_service_id_fkey FOREIGN KEY (service_id) REFERENCES public.service(service_id) ON DELETE CASCADE;
+ALTER TABLE public.room
+    DROP CONSTRAINT IF EXISTS room_type_id_fkey,
+    ADD CONSTRAINT room_type_id_fkey FOREIGN KEY (type_id) REFERENCES public.roomtype(type_id) ON DELETE CASCADE;
@@ -0,0 +1,9 @@
+-- 013: поиск клиентов по мере ввода (мастер брони, вкладка «Клиенты»).
+-- migrate: no-transaction
+-- ФИО — триграммный GiST-индекс: ILIKE '%...%' и сортировка по расстоянию <-> с LIMIT
+-- обходят индекс сразу в порядке сходства. Паспорт — btree с text_pattern_ops для
+-- LIKE 'префикс%' (обычный индекс client_passport_number_key в не-C локали для этого не годится).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_client_full_name_trgm ON public.client USING gist (full_name public.gist_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_client_passport_prefix ON public.client USING btree (passport_number text_pattern_ops);
@@ -0,0 +1,172 @@
+# querylog.py — замеры запросов приложения.
+# Соединения приложения создаются с connection_factory=InstrumentedConnection: каждый
+# execute / executemany / copy_expert их курсоров записывает в STATS время, число строк
+# и экран, из которого пришёл запрос. Запросы дольше порога пишутся в журнал медленных
+# запросов, по всем копятся перцентили для окна «Диагностика запросов».
+#
+# Экран — имя функции, отправившей запрос (ModalBookingWizard.create_booking,
+# ModalReportPayments.fill, bookings_grid.reload ...). Фоновые запросы QueryExecutor
+# выполняются под именем, заданным при submit, через screen(). Подготовленные запросы
+# (statements.py) записываются под своим исходным текстом, а не как EXECUTE имя(...).
+#
+# Журнал медленных запросов ведётся, только если задан HOTEL_SLOW_QUERY_LOG:
+#
+#   HOTEL_SLOW_QUERY_MS=100 HOTEL_SLOW_QUERY_LOG=/tmp/slow.log python app.py
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from psycopg2 import extensions
+
+SLOW_QUERY_MS = float(os.environ.get("HOTEL_SLOW_QUERY_MS", 200))   # порог журнала медленных запросов
+SLOW_QUERY_LOG = os.environ.get("HOTEL_SLOW_QUERY_LOG") or None   # файл журнала; не задан — не пишется
+STATS_WINDOW = 1000   # последних замеров на пару (экран, запрос), по которым считаются перцентили
+
+# кадры этих модулей — обвязка, экраном не считаются
+_INTERNAL = {__name__, "statements", "contextlib"}
+
+_local = threading.local()
+
+@contextmanager
+def screen(name):
+    """Attribute every statement run by this thread inside the block to screen name."""
+    prev = getattr(_local, "screen", None)
+    _local.screen = name
+    try:
+        yield
+    finally:
+        _local.screen = prev
+
+@contextmanager
+def statement(text):
+    """Record statements run by this thread inside the block under text instead of their own SQL."""
+    prev = getattr(_local, "statement", None)
+    _local.statement = statement_text(text)
+    try:
+        yield
+    finally:
+        _local.statement = prev
+
+def screen_of(fn):
+    """Screen name of a callable: its qualified name without the nested-function tail."""
+    name = getattr(fn, "__qualname__", None) or type(fn).__name__
+    return name.split(".<locals>")[0]
+
+def current_screen():
+    name = getattr(_local, "screen", None)
+    if name:
+        return name
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_globals.get("__name__") in _INTERNAL:
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    code = frame.f_code
+    return getattr(code, "co_qualname", code.co_name).split(".<locals>")[0]
+
+def statement_text(query, conn=None):
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        # psycopg2.sql.Composed и т.п.
+        query = query.as_string(conn) if conn is not None and hasattr(query, "as_string") else str(query)
+    return " ".join(query.split())
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+class QueryStats:
+    """Thread-safe per (screen, statement) latency samples and the slow-query log."""
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, log_path=SLOW_QUERY_LOG, window=STATS_WINDOW):
+        self.threshold_ms = threshold_ms
+        self.log_path = log_path
+        self.window = window
+        self._entries = {}   # (экран, запрос) -> [вызовов, строк, ошибок, всего мс, deque(мс)]
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+
+    def record(self, screen, statement, ms, rows, error=None):
+        with self._lock:
+            e = self._entries.get((screen, statement))
+            if e is None:
+                e = self._entries[(screen, statement)] = [0, 0, 0, 0.0, deque(maxlen=self.window)]
+            e[0] += 1
+            e[1] += rows
+            e[2] += error is not None
+            e[3] += ms
+            e[4].append(ms)
+        if self.log_path and ms >= self.threshold_ms:
+            self._log_slow(screen, statement, ms, rows, error)
+
+    def _log_slow(self, screen, statement, ms, rows, error):
+        # параметры запроса в журнал не пишем: в них паспортные данные гостей
+        line = f"{datetime.now():%Y-%m-%d %H:%M:%S}\t{ms:.1f} ms\t{rows} rows\t{screen}\t{statement}"
+        if error is not None:
+            line += f"\tERROR: {' '.join(str(error).split())}"
+        with self._log_lock:
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError:
+                pass   # журнал не должен мешать работе с базой
+
+    def snapshot(self):
+        """[{screen, statement, calls, rows, errors, total_ms, p50, p95, p99, max}], slowest total first."""
+        with self._lock:
+            entries = [(k, e[0], e[1], e[2], e[3], sorted(e[4])) for k, e in self._entries.items()]
+        result = []
+        for (scr, statement), calls, rows, errors, total, samples in entries:
+            result.append({
+                "screen": scr, "statement": statement, "calls": calls, "rows": rows, "errors": errors,
+                "total_ms": round(total, 1),
+                "p50": round(percentile(samples, 50), 1),
+                "p95": round(percentile(samples, 95), 1),
+                "p99": round(percentile(samples, 99), 1),
+                "max": round(samples[-1], 1) if samples else 0.0,
+            })
+        return sorted(result, key=lambda r: r["total_ms"], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._entries = {}
+
+STATS = QueryStats()
+
+class InstrumentedCursor(extensions.cursor):
+    """Cursor that reports every statement it runs to STATS."""
+    def execute(self, query, vars=None):
+        return self._timed(query, super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._timed(query, super().executemany, query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(sql, super().copy_expert, sql, file, size)
+
+    def _timed(self, query, fn, *args):
+        started = time.perf_counter()
+        error = None
+        try:
+            return fn(*args)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            rows = max(self.rowcount, 0) if error is None else 0
+            text = getattr(_local, "statement", None) or statement_text(query, self.connection)
+            STATS.record(current_screen(), text, ms, rows, error)
+
+class InstrumentedConnection(extensions.connection):
+    """Connection whose cursors are InstrumentedCursor by default."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = InstrumentedCursor
@@ -0,0 +1,184 @@
+# statements.py — именованные горячие запросы приложения.
+# Каждый запрос готовится (PREPARE) на соединении пула один раз, при первом использовании,
+# и дальше выполняется через EXECUTE по имени: сервер не разбирает и не планирует заново
+# один и тот же текст на каждом вызове. Тексты пишутся с %s, как для cursor.execute,
+# в PREPARE они уходят с $1..$n.
+#
+# Выигрыш на отчёте по оплатам и деталях брони меряет bench/prepared_statements.py,
+# bench/suite.py гоняет по этим же текстам замеры всех экранов.
+import re
+import threading
+import weakref
+
+from psycopg2 import errors
+
+import querylog
+
+GRID_PAGE_SIZE = 200           # строк за одну подгрузку в таблицах клиентов/номеров/броней
+CLIENT_SEARCH_LIMIT = 20       # сколько клиентов показывать в подсказке поиска
+
+HOT_STATEMENTS = {
+    # свободные на весь период номера, вмещающие всех гостей (мастер брони)
+    "free_rooms": """
+        SELECT room_id, room_number, type_name, price, capacity
+        FROM find_available_rooms(%s, %s, %s)
+    """,
+    # детали брони
+    "booking_head": """
+        SELECT b.booking_id, r.room_number, b.start_date, b.end_date,
+               t.nights, t.room_total, t.services_total, t.booking_fee, t.prepayments_total, t.balance
+        FROM Booking b JOIN Room r ON b.room_id=r.room_id JOIN booking_totals t ON t.booking_id=b.booking_id
+        WHERE b.booking_id=%s
+    """,
+    "booking_guests": """
+        SELECT c.client_id, c.full_name, c.passport_number, c.prepayment
+        FROM BookingGuest bg JOIN Client c ON bg.client_id=c.client_id
+        WHERE bg.booking_id=%s
+        ORDER BY c.client_id
+    """,
+    "booking_services": """
+        SELECT s.service_id, s.name, bs.unit_price, bs.quantity
+        FROM BookingService bs JOIN Service s ON bs.service_id = s.service_id
+        WHERE bs.booking_id=%s
+        ORDER BY s.service_id
+    """,
+    # отчёт по оплатам: итоги, гости и услуги всех броней периода
+    "payments_report": """
+        SELECT booking_id, nights, room_total, services_total, booking_fee, prepayments_total, balance, guests, services
+        FROM calc_booking_totals_range(%s, %s)
+        ORDER BY booking_id
+    """,
+    # создание брони мастером: бронь, затем все гости одним INSERT в порядке слотов
+    "create_booking": """
+        INSERT INTO Booking (room_id, start_date, end_date, booking_fee) VALUES (%s, %s, %s, %s)
+        RETURNING booking_id
+    """,
+    "add_booking_guests": """
+        INSERT INTO BookingGuest (booking_id, client_id)
+        SELECT %s::int, g.client_id FROM unnest(%s::int[]) WITH ORDINALITY AS g(client_id, ord)
+        ORDER BY g.ord
+    """,
+}
+
+# таблицы главного окна: (SELECT без ORDER BY, ключ); запросы страниц строит grid_statements
+GRIDS = {
+    "rooms_grid": ("SELECT r.room_id, r.room_number, r.type_id, r.status FROM room_occupancy r", "r.room_id"),
+    "clients_grid": ("SELECT client_id, full_name, passport_number, prepayment FROM Client", "client_id"),
+    "bookings_grid": ("""
+        SELECT b.booking_id, r.room_number, b.start_date, b.end_date, b.booking_fee, b.guest_count
+        FROM Booking b JOIN Room r ON b.room_id = r.room_id
+    """, "b.booking_id"),
+}
+
+# поиск клиента по вводу не готовится: префикс в LIKE превращается в диапазон по
+# idx_client_passport_prefix только при известном на планировании значении
+CLIENT_SEARCH = {
+    "first": "SELECT client_id, full_name, passport_number, prepayment FROM Client ORDER BY client_id LIMIT %s",
+    # префикс паспорта — диапазон по idx_client_passport_prefix, в порядке индекса
+    "passport": "SELECT client_id, full_name, passport_number, prepayment FROM Client WHERE passport_number LIKE %s LIMIT %s",
+    # idx_client_full_name_trgm (GiST) отдаёт строки сразу по возрастанию расстояния <->,
+    # так что LIMIT останавливает обход на первых совпадениях
+    "name": """
+        SELECT client_id, full_name, passport_number, prepayment FROM Client
+        WHERE full_name ILIKE %s
+        ORDER BY full_name <-> %s
+        LIMIT %s
+    """,
+}
+
+def grid_statements(select_sql, key):
+    """{kind: sql} of the keyset queries a grid runs over select_sql."""
+    return {
+        "first": f"{select_sql} ORDER BY {key} LIMIT %s",
+        "next": f"{select_sql} WHERE {key} > %s ORDER BY {key} LIMIT %s",
+        "keys": f"{select_sql} WHERE {key} = ANY(%s)",
+        "upto": f"{select_sql} WHERE {key} <= %s ORDER BY {key}",
+        "all": f"{select_sql} ORDER BY {key}",
+    }
+
+def search_params(text, limit):
+    """(CLIENT_SEARCH kind, params) for the text typed into a client search box."""
+    text = (text or "").strip()
+    esc = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    if not text:
+        return "first", (limit,)
+    if text.replace(" ", "").isdigit():
+        return "passport", (esc + "%", limit)
+    return "name", ("%" + esc + "%", text, limit)
+
+class PreparedStatements:
+    """Registry of named statements, PREPAREd lazily once per connection and run with EXECUTE."""
+    def __init__(self, statements=None):
+        self._text = {}       # имя -> исходный текст с %s
+        self._sql = {}        # имя -> текст с $1..$n
+        self._calls = {}      # имя -> "EXECUTE имя(%s, ...)"
+        self._prepared = weakref.WeakKeyDictionary()   # соединение -> {подготовленные имена}
+        self._lock = threading.Lock()
+        for name, sql in (statements or {}).items():
+            self.add(name, sql)
+
+    def add(self, name, sql):
+        if not re.fullmatch(r"[a-z_][a-z0-9_]*", name):
+            raise ValueError(f"Недопустимое имя запроса: {name}")
+        count = 0
+
+        def number(m):
+            nonlocal count
+            if m.group(0) == "%%":
+                return "%"
+            count += 1
+            return f"${count}"
+        text = re.sub(r"%%|%s", number, sql.strip())
+        with self._lock:
+            # на соединениях уже может быть подготовлен прежний текст
+            if self._sql.get(name, text) != text:
+                raise ValueError(f"Запрос {name} уже зарегистрирован с другим текстом")
+            self._sql[name] = text
+            self._text[name] = sql
+            self._calls[name] = f"EXECUTE {name}" + (f"({', '.join(['%s'] * count)})" if count else "")
+
+    def prepare(self, cur, name):
+        """Make sure name is prepared on cur's connection; returns its EXECUTE text."""
+        conn = cur.connection
+        with self._lock:
+            done = self._prepared.setdefault(conn, set())
+        # соединение в каждый момент у одного потока — множество без блокировки
+        if name not in done:
+            cur.execute(f"PREPARE {name} AS {self._sql[name]}")
+            done.add(name)
+        return self._calls[name]
+
+    def execute(self, cur, name, params=()):
+        """Run the named statement on cur, preparing it on cur's connection first if needed."""
+        conn = cur.connection
+        call = self.prepare(cur, name)
+        try:
+            # в замерах — текст запроса, а не EXECUTE имя(...)
+            with querylog.statement(self._text[name]):
+                cur.execute(call, params)
+        except errors.InvalidSqlStatementName:
+            # подготовленные запросы сброшены на сервере (DISCARD ALL) — готовим заново;
+            # внутри транзакции повторять нельзя, она уже прервана
+            self.forget(conn)
+            if not conn.autocommit:
+                raise
+            call = self.prepare(cur, name)
+            with querylog.statement(self._text[name]):
+                cur.execute(call, params)
+
+    def execute_plain(self, cur, name, params=()):
+        """Run the same statement as an ordinary query, without preparing it (for comparisons)."""
+        cur.execute(self._text[name], params)
+
+    def names(self):
+        return sorted(self._sql)
+
+    def forget(self, conn):
+        with self._lock:
+            self._prepared.pop(conn, None)
+
+STATEMENTS = PreparedStatements(dict(HOT_STATEMENTS, **{
+    f"{grid}_{kind}": sql
+    for grid, (select_sql, key) in GRIDS.items()
+    for kind, sql in grid_statements(select_sql, key).items()
+}))
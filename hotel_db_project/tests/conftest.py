@@ -0,0 +1,9 @@
+# Тесты помощников, которым не нужны ни база, ни дисплей:
+#
+#   cd hotel_db_project && python -m pytest tests
+#
+# Модули приложения импортируют psycopg2, без него тесты пропускаются.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
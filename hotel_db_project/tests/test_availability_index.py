@@ -0,0 +1,109 @@
+from datetime import date
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("tkinter")
+
+from app import AvailabilityIndex
+
+ROOMS = [(1, "101", 1), (2, "102", 1), (3, "201", 2)]
+
+def d(day):
+    return date(2025, 1, day)
+
+class FakeExecutor:
+    """Keeps submitted tasks; a test finishes them by handing over the rows."""
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, fn, on_done=None, on_error=None, **kw):
+        self.tasks.append((fn, on_done))
+
+    def finish(self, result, i=0):
+        _, on_done = self.tasks.pop(i)
+        on_done(result)
+
+def loaded(bookings):
+    ex = FakeExecutor()
+    idx = AvailabilityIndex(ex)
+    idx.load()
+    ex.finish((ROOMS, bookings))
+    return idx, ex
+
+def test_not_ready_until_loaded():
+    idx = AvailabilityIndex(FakeExecutor())
+    assert not idx.ready
+    idx.load()
+    assert not idx.ready
+
+@pytest.mark.parametrize("start, end, free", [
+    (d(1), d(10), True),     # выезд предыдущего гостя в день заезда — не пересечение
+    (d(12), d(15), True),
+    (d(9), d(11), False),
+    (d(11), d(13), False),
+    (d(10), d(12), False),
+    (d(1), d(20), False),
+    (d(14), d(16), True),    # между двумя бронями
+    (d(14), d(17), False),
+])
+def test_is_free_half_open_ranges(start, end, free):
+    idx, _ = loaded([(1, 1, d(10), d(12)), (2, 1, d(16), d(18))])
+    assert idx.is_free(1, start, end) is free
+
+def test_room_without_bookings_is_free():
+    idx, _ = loaded([(1, 1, d(10), d(12))])
+    assert idx.is_free(2, d(10), d(12))
+
+def test_free_rooms_sorted_with_numbers():
+    idx, _ = loaded([(1, 2, d(10), d(12))])
+    assert idx.free_rooms(d(11), d(13)) == [(1, "101", 1), (3, "201", 2)]
+
+def test_refresh_moves_booking_and_reports_rooms():
+    idx, ex = loaded([(1, 1, d(10), d(12))])
+    seen = []
+    idx.refresh_bookings([1], on_rooms=seen.append)
+    ex.finish([(1, 2, d(10), d(12))])
+    assert idx.is_free(1, d(10), d(12))
+    assert not idx.is_free(2, d(10), d(12))
+    assert seen == [{1, 2}]
+
+def test_refresh_of_deleted_booking_frees_room():
+    idx, ex = loaded([(1, 1, d(10), d(12))])
+    idx.refresh_bookings([1])
+    ex.finish([])
+    assert idx.is_free(1, d(10), d(12))
+
+def test_changes_during_load_are_applied_after_it():
+    ex = FakeExecutor()
+    idx = AvailabilityIndex(ex)
+    idx.load()
+    idx.refresh_bookings([5])
+    assert len(ex.tasks) == 1                 # пока не загружен, ничего не перечитывается
+    ex.finish((ROOMS, []))
+    assert len(ex.tasks) == 1                 # отложенная бронь 5
+    ex.finish([(5, 3, d(1), d(3))])
+    assert not idx.is_free(3, d(2), d(4))
+
+def test_reload_replaces_index_and_drops_older_refresh():
+    idx, ex = loaded([(1, 1, d(10), d(12))])
+    idx.refresh_bookings([1])
+    idx.load()
+    assert not idx.ready
+    ex.finish((ROOMS, [(2, 2, d(10), d(12))]), i=1)
+    ex.finish([(1, 1, d(10), d(12))])         # ответ на запрос до перезагрузки не применяется
+    assert idx.ready
+    assert idx.is_free(1, d(10), d(12))
+    assert not idx.is_free(2, d(10), d(12))
+
+def test_subscribers_hear_about_changes():
+    idx, ex = loaded([])
+    calls = []
+    idx.subscribe(lambda: calls.append(1))
+    idx.refresh_bookings([1])
+    assert calls == [1]
+    ex.finish([(1, 1, d(10), d(12))])
+    assert calls == [1, 1]
+    idx.load()
+    ex.finish((ROOMS, []))
+    assert calls == [1, 1, 1]
@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+
+import migrate
+
+def test_statements_split_at_line_end_semicolons():
+    sql = ("-- migrate: no-transaction\n"
+           "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_a ON public.a USING btree (x);\n"
+           "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_b\n"
+           "    ON public.b USING btree (y, z);\n")
+    assert migrate.split_statements(sql) == [
+        "-- migrate: no-transaction\nCREATE INDEX CONCURRENTLY IF NOT EXISTS idx_a ON public.a USING btree (x);",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_b\n    ON public.b USING btree (y, z);",
+    ]
+
+def test_semicolon_inside_line_does_not_split():
+    assert migrate.split_statements("SELECT ';' AS a, 1;\n") == ["SELECT ';' AS a, 1;"]
+
+def test_crlf_and_trailing_spaces():
+    assert migrate.split_statements("SELECT 1;  \r\nSELECT 2;\r\n") == ["SELECT 1;", "SELECT 2;"]
+
+def test_comment_only_tail_is_dropped():
+    assert migrate.split_statements("SELECT 1;\n\n-- конец\n") == ["SELECT 1;"]
+
+def test_unterminated_last_statement_is_kept():
+    assert migrate.split_statements("SELECT 1;\nSELECT 2\n") == ["SELECT 1;", "SELECT 2"]
+
+def test_concurrent_index_names_of_migrations():
+    found = set()
+    for _, _, path in migrate.discover():
+        with open(path, encoding="utf-8") as f:
+            found.update(migrate.CONCURRENT_INDEX_RE.findall(f.read()))
+    assert {"idx_bookingguest_booking", "idx_client_passport_prefix"} <= found
+
+def test_concurrent_index_name_drops_schema_and_skips_plain_index():
+    sql = "create unique index concurrently public.idx_x on t (a);\nCREATE INDEX idx_plain ON t (b);"
+    assert migrate.CONCURRENT_INDEX_RE.findall(sql) == ["idx_x"]
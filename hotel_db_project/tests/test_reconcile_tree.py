@@ -0,0 +1,75 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("tkinter")
+
+from app import reconcile_tree
+
+class FakeTree:
+    """Flat ttk.Treeview stand-in that records which calls reconcile_tree made."""
+    def __init__(self, rows=()):
+        self.order = [str(r[0]) for r in rows]
+        self.values = {str(r[0]): tuple(str(v) for v in r) for r in rows}
+        self.calls = []
+
+    def get_children(self, item=""):
+        return tuple(self.order)
+
+    def delete(self, *iids):
+        self.calls.append(("delete",) + iids)
+        for iid in iids:
+            self.order.remove(iid)
+            del self.values[iid]
+
+    def insert(self, parent, index, iid, values):
+        self.calls.append(("insert", iid))
+        self.order.insert(index, iid)
+        self.values[iid] = tuple(str(v) for v in values)
+
+    def item(self, iid, option=None, values=None):
+        if values is None:
+            return self.values[iid]
+        self.calls.append(("item", iid))
+        self.values[iid] = tuple(str(v) for v in values)
+
+    def move(self, iid, parent, index):
+        self.calls.append(("move", iid))
+        self.order.remove(iid)
+        self.order.insert(index, iid)
+
+    def rows(self):
+        return [self.values[iid] for iid in self.order]
+
+def shown(rows):
+    return [tuple(str(v) for v in r) for r in rows]
+
+def test_unchanged_rows_are_not_touched():
+    rows = [(1, "a"), (2, "b"), (3, "c")]
+    tree = FakeTree(rows)
+    reconcile_tree(tree, rows)
+    assert tree.calls == []
+
+def test_only_changed_row_is_updated():
+    tree = FakeTree([(1, "a"), (2, "b"), (3, "c")])
+    reconcile_tree(tree, [(1, "a"), (2, "B"), (3, "c")])
+    assert tree.calls == [("item", "2")]
+    assert tree.rows() == shown([(1, "a"), (2, "B"), (3, "c")])
+
+def test_insert_and_delete_in_place():
+    tree = FakeTree([(1, "a"), (2, "b"), (4, "d")])
+    rows = [(1, "a"), (3, "c"), (4, "d"), (5, "e")]
+    reconcile_tree(tree, rows)
+    assert tree.rows() == shown(rows)
+    assert ("move", "1") not in tree.calls and ("move", "4") not in tree.calls
+    assert sorted(c for c in tree.calls if c[0] != "delete") == [("insert", "3"), ("insert", "5")]
+
+def test_reordered_rows_are_moved():
+    tree = FakeTree([(1, "a"), (2, "b"), (3, "c")])
+    rows = [(3, "c"), (1, "a"), (2, "b")]
+    reconcile_tree(tree, rows)
+    assert tree.rows() == shown(rows)
+
+def test_empty_result_clears_tree():
+    tree = FakeTree([(1, "a"), (2, "b")])
+    reconcile_tree(tree, [])
+    assert tree.rows() == []
@@ -0,0 +1,108 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from psycopg2 import errors
+
+from statements import CLIENT_SEARCH, PreparedStatements, search_params
+
+class FakeConnection:
+    autocommit = True
+
+class FakeCursor:
+    """Records executed statements; fail_on makes the next matching execute raise once."""
+    def __init__(self, conn=None):
+        self.connection = conn or FakeConnection()
+        self.executed = []
+        self.fail_on = None
+
+    def execute(self, sql, params=None):
+        if self.fail_on and sql.startswith(self.fail_on):
+            self.fail_on = None
+            raise errors.InvalidSqlStatementName("prepared statement does not exist")
+        self.executed.append((sql, params))
+
+@pytest.mark.parametrize("text", [None, "", "   "])
+def test_empty_text_shows_first_clients(text):
+    assert search_params(text, 20) == ("first", (20,))
+
+def test_digits_search_passport_prefix():
+    assert search_params(" 1234 ", 20) == ("passport", ("1234%", 20))
+    assert search_params("12 34", 20) == ("passport", ("12 34%", 20))
+
+def test_name_search_by_fragment_and_distance():
+    assert search_params(" Иван ", 5) == ("name", ("%Иван%", "Иван", 5))
+
+def test_like_wildcards_are_escaped():
+    kind, (pattern, text, _) = search_params(r"50%_a\b", 20)
+    assert kind == "name"
+    assert pattern == r"%50\%\_a\\b%"
+    assert text == r"50%_a\b"
+
+def test_every_kind_has_a_query():
+    for text in ("", "123", "abc"):
+        kind, params = search_params(text, 20)
+        assert CLIENT_SEARCH[kind].count("%s") == len(params)
+
+def test_placeholders_become_numbered_parameters():
+    reg = PreparedStatements({"q": "SELECT * FROM t WHERE a = %s AND b LIKE 'x%%' AND c = %s"})
+    cur = FakeCursor()
+    reg.execute(cur, "q", (1, 2))
+    assert cur.executed == [
+        ("PREPARE q AS SELECT * FROM t WHERE a = $1 AND b LIKE 'x%' AND c = $2", None),
+        ("EXECUTE q(%s, %s)", (1, 2)),
+    ]
+
+def test_statement_without_parameters():
+    reg = PreparedStatements({"q": "SELECT 1"})
+    cur = FakeCursor()
+    reg.execute(cur, "q")
+    assert cur.executed[-1] == ("EXECUTE q", ())
+
+def test_prepared_once_per_connection():
+    reg = PreparedStatements({"q": "SELECT %s"})
+    conn = FakeConnection()
+    first, second, other = FakeCursor(conn), FakeCursor(conn), FakeCursor()
+    reg.execute(first, "q", (1,))
+    reg.execute(second, "q", (2,))
+    reg.execute(other, "q", (3,))
+    assert [s for s, _ in second.executed] == ["EXECUTE q(%s)"]
+    assert [s for s, _ in other.executed] == ["PREPARE q AS SELECT $1", "EXECUTE q(%s)"]
+
+def test_reprepares_after_server_discard():
+    reg = PreparedStatements({"q": "SELECT %s"})
+    cur = FakeCursor()
+    reg.execute(cur, "q", (1,))
+    cur.fail_on = "EXECUTE"
+    reg.execute(cur, "q", (2,))
+    assert [s for s, _ in cur.executed] == ["PREPARE q AS SELECT $1", "EXECUTE q(%s)",
+                                            "PREPARE q AS SELECT $1", "EXECUTE q(%s)"]
+
+def test_no_retry_inside_transaction():
+    reg = PreparedStatements({"q": "SELECT %s"})
+    conn = FakeConnection()
+    conn.autocommit = False
+    cur = FakeCursor(conn)
+    reg.execute(cur, "q", (1,))
+    cur.fail_on = "EXECUTE"
+    with pytest.raises(errors.InvalidSqlStatementName):
+        reg.execute(cur, "q", (2,))
+    reg.execute(cur, "q", (3,))      # следующий вызов снова готовит запрос
+    assert cur.executed[-2][0] == "PREPARE q AS SELECT $1"
+
+def test_execute_plain_runs_original_text():
+    reg = PreparedStatements({"q": "SELECT %s"})
+    cur = FakeCursor()
+    reg.execute_plain(cur, "q", (1,))
+    assert cur.executed == [("SELECT %s", (1,))]
+
+@pytest.mark.parametrize("name", ["Q", "1q", "q;drop", ""])
+def test_invalid_names_rejected(name):
+    with pytest.raises(ValueError):
+        PreparedStatements().add(name, "SELECT 1")
+
+def test_same_name_needs_same_text():
+    reg = PreparedStatements({"q": "SELECT %s"})
+    reg.add("q", "SELECT %s")
+    with pytest.raises(ValueError):
+        reg.add("q", "SELECT %s + 1")